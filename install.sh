@@ -20,6 +20,9 @@ fi
 TOOLING_ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 SKELETON_GM="$TOOLING_ROOT/skeleton-gm"
 SKELETON_PUBLIC="$TOOLING_ROOT/skeleton-public"
+# Modules both skeletons ship under scripts/. The copies must stay byte-identical;
+# install refuses to run if they have drifted.
+SHARED_SCRIPTS=(related_pages.py)
 
 require_cmd() {
   command -v "$1" >/dev/null 2>&1 || {
@@ -28,6 +31,17 @@ require_cmd() {
   }
 }
 
+check_shared_scripts() {
+  local script
+  for script in "${SHARED_SCRIPTS[@]}"; do
+    if ! cmp -s "$SKELETON_GM/scripts/$script" "$SKELETON_PUBLIC/scripts/$script"; then
+      echo "ERROR: skeleton-gm/scripts/$script and skeleton-public/scripts/$script differ." >&2
+      echo "Copy one over the other so both repos run the same code." >&2
+      exit 1
+    fi
+  done
+}
+
 ensure_gh_auth() {
   if gh auth status >/dev/null 2>&1; then
     echo "GitHub CLI already authenticated."
@@ -80,6 +94,7 @@ main() {
   require_cmd git
   require_cmd python3
   require_cmd gh
+  check_shared_scripts
 
   ensure_gh_auth
 
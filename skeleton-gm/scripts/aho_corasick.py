@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Generic, Iterator, TypeVar
+
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class Match(Generic[T]):
+    start: int
+    end: int
+    value: T
+
+
+def fold(text: str) -> str:
+    # Lowercase without changing length, so match offsets index the original text.
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+# Multi-pattern matcher (Aho-Corasick): one pass over the text finds every
+# occurrence of every pattern, so scan time does not grow with the number of terms.
+# Patterns are matched case-insensitively.
+class Automaton(Generic[T]):
+    def __init__(self) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # Nearest state on the fail chain that ends a pattern (0 = none), so matching
+        # only walks states that actually produce output.
+        self._out_link: list[int] = [0]
+        self._outputs: list[list[tuple[int, T]]] = [[]]
+        self._built = False
+
+    def __len__(self) -> int:
+        return sum(len(out) for out in self._outputs)
+
+    def add(self, pattern: str, value: T) -> None:
+        if self._built:
+            raise RuntimeError("Automaton.add() after build()")
+        key = fold(pattern)
+        if not key:
+            return
+        state = 0
+        for ch in key:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out_link.append(0)
+                self._outputs.append([])
+            state = nxt
+        self._outputs[state].append((len(key), value))
+
+    def build(self) -> "Automaton[T]":
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                fail = self._fail[nxt]
+                self._out_link[nxt] = fail if self._outputs[fail] else self._out_link[fail]
+        self._built = True
+        return self
+
+    def iter(self, text: str, *, whole_words: bool = True) -> Iterator[Match[T]]:
+        if not self._built:
+            self.build()
+        goto, fail, out_link, outputs = self._goto, self._fail, self._out_link, self._outputs
+        folded = fold(text)
+        state = 0
+        for i, ch in enumerate(folded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            s = state if outputs[state] else out_link[state]
+            while s:
+                end = i + 1
+                for length, value in outputs[s]:
+                    start = end - length
+                    if whole_words and (
+                        (start > 0 and _is_word(text[start - 1]) and _is_word(text[start]))
+                        or (end < len(text) and _is_word(text[end]) and _is_word(text[end - 1]))
+                    ):
+                        continue
+                    yield Match(start, end, value)
+                s = out_link[s]
@@ -6,18 +6,90 @@ ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 OUT_SRC_DIR="${OUT_SRC_DIR:-$ROOT_DIR/.mdbook-src}"
 OUT_SITE_DIR="${OUT_SITE_DIR:-$ROOT_DIR/site}"
 
+# MDBOOK_SHARDS=1 builds one book per items/<section>/ plus a hub book, in parallel,
+# skipping shards whose generated sources are unchanged since the last build.
+MDBOOK_SHARDS="${MDBOOK_SHARDS:-0}"
+MDBOOK_JOBS="${MDBOOK_JOBS:-$(getconf _NPROCESSORS_ONLN 2>/dev/null || echo 4)}"
+
+# Section index pages: entries per page before splitting, and title|type pagination.
+MDBOOK_INDEX_PAGE_SIZE="${MDBOOK_INDEX_PAGE_SIZE:-200}"
+MDBOOK_INDEX_GROUP_BY="${MDBOOK_INDEX_GROUP_BY:-title}"
+
+shard_args=()
+if [[ "$MDBOOK_SHARDS" == "1" ]]; then
+  shard_args+=(--shard-by-section)
+fi
+
 python3 "$ROOT_DIR/scripts/generate_mdbook.py" \
   --root "$ROOT_DIR" \
   --items-dir "$ROOT_DIR/items" \
   --out-src "$OUT_SRC_DIR" \
-  --title "GM Compendium"
+  --title "GM Compendium" \
+  --index-page-size "$MDBOOK_INDEX_PAGE_SIZE" \
+  --index-group-by "$MDBOOK_INDEX_GROUP_BY" \
+  ${shard_args[@]+"${shard_args[@]}"}
 
-if command -v mdbook >/dev/null 2>&1; then
+if ! command -v mdbook >/dev/null 2>&1; then
+  echo "mdbook is not installed; generated sources only: $OUT_SRC_DIR"
+  echo "Install: https://rust-lang.github.io/mdBook/ (or via your package manager)"
+  exit 0
+fi
+
+if [[ "$MDBOOK_SHARDS" != "1" ]]; then
   rm -rf "$OUT_SITE_DIR"
   mdbook build "$OUT_SRC_DIR" -d "$OUT_SITE_DIR"
   echo "Wrote site: $OUT_SITE_DIR/index.html"
-else
-  echo "mdbook is not installed; generated sources only: $OUT_SRC_DIR"
-  echo "Install: https://rust-lang.github.io/mdBook/ (or via your package manager)"
+  exit 0
+fi
+
+mkdir -p "$OUT_SITE_DIR"
+
+shards=()
+while IFS= read -r shard; do
+  [[ -n "$shard" ]] && shards+=("$shard")
+done < "$OUT_SRC_DIR/shards.txt"
+
+# Drop anything in the site that is not a current shard (removed sections, or a
+# previous monolithic build).
+for entry in "$OUT_SITE_DIR"/* "$OUT_SITE_DIR"/.[!.]*; do
+  [[ -e "$entry" ]] || continue
+  name="$(basename "$entry")"
+  [[ "$name" == "index.html" ]] && continue
+  keep="false"
+  for shard in "${shards[@]}"; do
+    [[ "$name" == "$shard" ]] && keep="true"
+  done
+  [[ "$keep" == "true" ]] || rm -rf "$entry"
+done
+
+stale=()
+for shard in "${shards[@]}"; do
+  if cmp -s "$OUT_SRC_DIR/$shard/.digest" "$OUT_SITE_DIR/$shard/.digest"; then
+    echo "Unchanged shard: $shard"
+    continue
+  fi
+  stale+=("$shard")
+done
+
+if [[ ${#stale[@]} -gt 0 ]]; then
+  echo "Building ${#stale[@]} shard(s) with up to $MDBOOK_JOBS job(s): ${stale[*]}"
+  # The digest is copied only after a successful build, so a failed shard is retried next time.
+  printf "%s\n" "${stale[@]}" | xargs -P "$MDBOOK_JOBS" -I {} sh -c '
+    rm -f "$2/$3/.digest"
+    mdbook build "$1/$3" -d "$2/$3" && cp "$1/$3/.digest" "$2/$3/.digest"
+  ' _ "$OUT_SRC_DIR" "$OUT_SITE_DIR" {}
 fi
 
+cat > "$OUT_SITE_DIR/index.html" <<'HTML'
+<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta http-equiv="refresh" content="0; url=hub/index.html">
+<title>GM Compendium</title>
+</head>
+<body><a href="hub/index.html">GM Compendium</a></body>
+</html>
+HTML
+
+echo "Wrote site: $OUT_SITE_DIR/index.html"
@@ -2,24 +2,31 @@
 from __future__ import annotations
 
 import argparse
-import os
+import posixpath
 import re
-import shutil
 from dataclasses import dataclass
 from pathlib import Path
 
+import corpus
+from daemon_client import forward
+from index_pages import DEFAULT_PAGE_SIZE, GROUP_BY, IndexPages, build_tree
+from stable_output import OutputTree
+from visibility import Block, line_offset_of, public_body
+
 
 FRONT_MATTER_RE = re.compile(r"^---\s*\n(.*?)\n---\s*\n(.*)$", re.S)
 STATUS_RE = re.compile(r"^status:\s*(.+)\s*$", re.M)
 
-PUBLIC_START_RE = re.compile(r"<!--\s*PUBLIC_START\s*-->")
-PUBLIC_END_RE = re.compile(r"<!--\s*PUBLIC_END\s*-->")
-
-PRIVATE_START_RE = re.compile(r"<!--\s*PRIVATE_START\s*-->")
-PRIVATE_END_RE = re.compile(r"<!--\s*PRIVATE_END\s*-->")
-
 LINK_RE = re.compile(r"\[[^\]]*\]\((?P<href>[^)]+)\)")
 
+INDEX_NAME = "_INDEX"
+# Per-folder index pages sit next to items, so their name must not match any item
+# (`_index.md` exists in several folders, and vaults are opened on case-insensitive
+# filesystems). Matched case-insensitively for the same reason.
+FOLDER_INDEX_NAME = "_folder-index"
+FOLDER_INDEX_RE = re.compile(rf"^{re.escape(FOLDER_INDEX_NAME)}(?:\.[\w-]+)?\.md$", re.I)
+INDEX_CACHE_DIR = Path(".cache/index-pages")
+
 
 @dataclass(frozen=True)
 class ParsedMarkdown:
@@ -39,91 +46,85 @@ def get_status(front_matter: str) -> str:
     return (m.group(1).strip() if m else "").lower()
 
 
-def validate_markers(path: Path, text: str) -> None:
-    def count(pattern: re.Pattern[str]) -> int:
-        return len(pattern.findall(text))
-
-    for start, end in [
-        (PUBLIC_START_RE, PUBLIC_END_RE),
-        (PRIVATE_START_RE, PRIVATE_END_RE),
-    ]:
-        if count(start) != count(end):
-            raise ValueError(
-                f"Unbalanced visibility markers in {path.as_posix()}: {start.pattern} != {end.pattern}"
-            )
-
-
-def extract_public(text: str) -> str:
+def tokenize_markdown(path: Path, text: str) -> tuple[ParsedMarkdown, list[Block]]:
     parsed = parse_markdown(text)
-    body = parsed.body
+    offset = line_offset_of(text, parsed.body)
+    return parsed, corpus.tokenize(parsed.body, source=path.as_posix(), line_offset=offset)
 
-    in_pub = False
-    out_lines: list[str] = []
-    for line in body.splitlines():
-        if PUBLIC_START_RE.search(line):
-            in_pub = True
-            continue
-        if PUBLIC_END_RE.search(line):
-            in_pub = False
-            continue
-        if in_pub:
-            out_lines.append(line)
 
-    public_body = "\n".join(out_lines).strip()
+def validate_markers(path: Path, text: str) -> None:
+    tokenize_markdown(path, text)
+
 
+def render_public(front_matter: str, blocks: list[Block]) -> str:
+    body = public_body(blocks)
     out = ""
-    if parsed.front_matter.strip():
-        out += "---\n" + parsed.front_matter.strip() + "\n---\n\n"
-    out += public_body + ("\n" if public_body else "")
+    if front_matter.strip():
+        out += "---\n" + front_matter.strip() + "\n---\n\n"
+    out += body + ("\n" if body else "")
     return out
 
 
-def safe_clean_dir(out_dir: Path) -> None:
-    if not out_dir.exists():
-        return
-    # Guardrail: only allow cleaning under dist/
-    if "dist" not in out_dir.parts:
-        raise SystemExit(f"Refusing to delete non-dist directory: {out_dir.as_posix()}")
-    shutil.rmtree(out_dir)
+def extract_public(text: str, path: Path = Path("<text>")) -> str:
+    parsed, blocks = tokenize_markdown(path, text)
+    return render_public(parsed.front_matter, blocks)
 
 
-def write_text(path: Path, text: str) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(text, encoding="utf-8")
+def safe_prune(tree: OutputTree) -> None:
+    # Guardrail: only allow deleting stale files under dist/
+    if "dist" not in tree.root.parts:
+        raise SystemExit(f"Refusing to delete from non-dist directory: {tree.root.as_posix()}")
+    tree.prune()
 
 
-def copy_tree_filtered(src: Path, dst: Path, *, ignore_exts: set[str]) -> None:
-    for path in src.rglob("*"):
+def copy_tree_filtered(tree: OutputTree, src: Path, dst: Path, *, ignore_exts: set[str]) -> None:
+    for path in sorted(src.rglob("*")):
         if path.is_dir():
             continue
         if path.name in {".DS_Store", "Thumbs.db"}:
             continue
         if path.suffix.lower() in ignore_exts:
             continue
-        rel = path.relative_to(src)
-        out_path = dst / rel
-        out_path.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(path, out_path)
+        tree.copy(path, dst / path.relative_to(src))
 
 
-def build_index(vault_root: Path, title: str, md_files: list[Path]) -> None:
-    lines: list[str] = []
-    lines.append(f"# {title}")
-    lines.append("")
-    lines.append("Open this vault in Obsidian, then start here.")
-    lines.append("")
-    lines.append("## Files")
-    lines.append("")
+def _index_page(path: str, key: str) -> str:
+    name = FOLDER_INDEX_NAME if path else INDEX_NAME
+    return posixpath.join(path, f"{name}.{key}.md" if key else f"{name}.md")
 
-    for p in sorted(md_files):
-        rel = p.relative_to(vault_root).as_posix()
-        lines.append(f"- [[{rel}]]")
 
-    write_text(vault_root / "_INDEX.md", "\n".join(lines) + "\n")
+def _wikilink(from_rel: str, target: str, label: str) -> str:
+    return f"[[{target}|{label.replace('|', '-')}]]"
 
 
-def find_markdown_files(root: Path) -> list[Path]:
-    return [p for p in root.rglob("*.md") if p.is_file()]
+@dataclass(frozen=True)
+class IndexOptions:
+    page_size: int = DEFAULT_PAGE_SIZE
+    group_by: str = "title"
+
+
+# Indexes the Markdown files written this run, so leftovers of earlier runs never
+# appear. `_INDEX.md` at the root only lists the top-level folders with counts; each
+# folder has its own `_folder-index.md` (plus `_folder-index.<page>.md` continuation
+# pages).
+def build_index(tree: OutputTree, title: str, options: IndexOptions = IndexOptions()) -> None:
+    vault_root = tree.root.resolve()
+    pages = IndexPages(
+        tree,
+        page_path=_index_page,
+        link=_wikilink,
+        page_size=options.page_size,
+        group_by=options.group_by,
+        cache_dir=INDEX_CACHE_DIR,
+    )
+    entries = [
+        pages.entry(p, p.relative_to(vault_root).as_posix())
+        for p in tree.files()
+        if p.suffix == ".md" and p.parent != vault_root and not FOLDER_INDEX_RE.match(p.name)
+    ]
+    intro = ("Open this vault in Obsidian, then start here.", "")
+    pages.write(build_tree(entries), tree.root, title=title, intro=intro)
+    pages.save()
 
 
 def is_relative_md_link(href: str) -> bool:
@@ -141,16 +142,18 @@ def resolve_link(from_file: Path, href: str) -> Path:
     return (from_file.parent / href).resolve()
 
 
-def write_missing_link_report(vault_root: Path) -> None:
+def write_missing_link_report(tree: OutputTree) -> None:
+    vault_root = tree.root.resolve()
+    written = set(tree.files())
     report: dict[str, set[str]] = {}
-    for md in vault_root.rglob("*.md"):
+    for md in [p for p in written if p.suffix == ".md"]:
         text = md.read_text(encoding="utf-8")
         for m in LINK_RE.finditer(text):
             href = m.group("href").strip()
             if not is_relative_md_link(href):
                 continue
             target = resolve_link(md, href)
-            if not target.exists():
+            if target not in written:
                 rel_src = md.relative_to(vault_root).as_posix()
                 report.setdefault(rel_src, set()).add(href)
 
@@ -170,47 +173,54 @@ def write_missing_link_report(vault_root: Path) -> None:
             lines.append(f"- `{href}`")
         lines.append("")
 
-    write_text(vault_root / "_MISSING_LINKS.md", "\n".join(lines))
+    tree.write_text(tree.root / "_MISSING_LINKS.md", "\n".join(lines))
 
 
-def build_gm_vault(*, out_dir: Path, clean: bool) -> None:
-    if clean:
-        safe_clean_dir(out_dir)
-    (out_dir / "items").mkdir(parents=True, exist_ok=True)
+# Vaults are updated in place: files are rewritten only when their bytes change, and
+# (unless --no-clean) files a previous run wrote that this one did not are removed.
+def build_gm_vault(*, out_dir: Path, clean: bool, index: IndexOptions = IndexOptions()) -> None:
+    existed = out_dir.exists()
+    tree = OutputTree(out_dir)
 
     # Copy items verbatim
-    copy_tree_filtered(Path("items"), out_dir / "items", ignore_exts=set())
+    copy_tree_filtered(tree, Path("items"), out_dir / "items", ignore_exts=set())
 
     # Copy references (markdown + assets), but skip PDFs by default to keep it light.
-    copy_tree_filtered(Path("references"), out_dir / "references", ignore_exts={".pdf"})
+    copy_tree_filtered(tree, Path("references"), out_dir / "references", ignore_exts={".pdf"})
 
-    md_files = find_markdown_files(out_dir)
-    build_index(out_dir, "GM Vault", md_files)
+    build_index(tree, "GM Vault", index)
+    if clean and existed:
+        safe_prune(tree)
 
 
-def build_player_preview_vault(*, out_dir: Path, clean: bool, include_all_statuses: bool) -> None:
-    if clean:
-        safe_clean_dir(out_dir)
-    (out_dir / "items").mkdir(parents=True, exist_ok=True)
+def build_player_preview_vault(
+    *, out_dir: Path, clean: bool, include_all_statuses: bool, index: IndexOptions = IndexOptions()
+) -> None:
+    existed = out_dir.exists()
+    tree = OutputTree(out_dir)
 
-    for src in Path("items").rglob("*.md"):
-        text = src.read_text(encoding="utf-8")
-        validate_markers(src, text)
-        parsed = parse_markdown(text)
+    for src in corpus.markdown_files(Path("items")):
+        text = corpus.read_text(src)
+        parsed, blocks = tokenize_markdown(src, text)
         status = get_status(parsed.front_matter)
         if not include_all_statuses and status != "published":
             continue
 
         rel = src.relative_to(Path("items"))
         out_path = out_dir / "items" / rel
-        write_text(out_path, extract_public(text))
+        tree.write_text(out_path, render_public(parsed.front_matter, blocks))
 
-    md_files = find_markdown_files(out_dir)
-    build_index(out_dir, "Player Preview (PUBLIC Blocks)", md_files)
-    write_missing_link_report(out_dir)
+    build_index(tree, "Player Preview (PUBLIC Blocks)", index)
+    write_missing_link_report(tree)
+    if clean and existed:
+        safe_prune(tree)
 
 
 def main() -> int:
+    forwarded = forward("build_obsidian_vault")
+    if forwarded is not None:
+        return forwarded
+
     parser = argparse.ArgumentParser(description="Build Obsidian vaults for GM browsing and player-safe preview.")
     parser.add_argument(
         "--out-root",
@@ -220,26 +230,40 @@ def main() -> int:
     parser.add_argument(
         "--no-clean",
         action="store_true",
-        help="Do not delete existing output dirs before writing.",
+        help="Keep files from earlier runs that this run no longer produces.",
     )
     parser.add_argument(
         "--player-include-drafts",
         action="store_true",
         help="Include all item statuses in the player preview (still PUBLIC-only).",
     )
+    parser.add_argument(
+        "--index-page-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help=f"Entries per index page before it is split (default: {DEFAULT_PAGE_SIZE}).",
+    )
+    parser.add_argument(
+        "--index-group-by",
+        choices=GROUP_BY,
+        default="title",
+        help="Paginate folder indexes alphabetically by title, or one page per `type:` (default: title).",
+    )
 
     args = parser.parse_args()
     out_root = Path(args.out_root)
     clean = not args.no_clean
+    index = IndexOptions(page_size=args.index_page_size, group_by=args.index_group_by)
 
     gm_out = out_root / "obsidian-gm"
     player_out = out_root / "obsidian-player-preview"
 
-    build_gm_vault(out_dir=gm_out, clean=clean)
+    build_gm_vault(out_dir=gm_out, clean=clean, index=index)
     build_player_preview_vault(
         out_dir=player_out,
         clean=clean,
         include_all_statuses=bool(args.player_include_drafts),
+        index=index,
     )
 
     print(gm_out.as_posix())
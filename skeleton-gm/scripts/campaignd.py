@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import importlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+import corpus
+import daemon_client
+from daemon_client import REPO_ROOT, socket_path
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional: without it, directory listings are re-walked per request
+    FileSystemEventHandler = object  # type: ignore[assignment,misc]
+    Observer = None
+
+
+# Tools that may run inside the daemon (module names under scripts/).
+TOOLS = {
+    "generate_mdbook",
+    "build_obsidian_vault",
+    "catalogue_idea_box",
+    "export_public",
+    "check_public_leaks",
+    "query_items",
+    "lint_campaign",
+    "linkify_item_references",
+    "linkify_entities",
+    "linkify_reference_sources",
+}
+WATCH_DIRS = ("items", "references", "templates")
+
+
+def _script_stamp() -> dict[str, int]:
+    scripts = Path(__file__).resolve().parent
+    return {p.name: p.stat().st_mtime_ns for p in scripts.glob("*.py")}
+
+
+class _Invalidate(FileSystemEventHandler):
+    def __init__(self, corpus_: corpus.Corpus) -> None:
+        self.corpus = corpus_
+
+    def on_any_event(self, event) -> None:  # noqa: ANN001
+        self.corpus.invalidate(os.path.abspath(event.src_path))
+        dest = getattr(event, "dest_path", None)
+        if dest:
+            self.corpus.invalidate(os.path.abspath(dest))
+
+
+class CampaignDaemon:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.corpus = corpus.Corpus(watched=Observer is not None)
+        self.observer = None
+        if Observer is not None:
+            self.observer = Observer()
+            handler = _Invalidate(self.corpus)
+            for name in WATCH_DIRS:
+                if (root / name).is_dir():
+                    self.observer.schedule(handler, (root / name).as_posix(), recursive=True)
+        self.stamp = _script_stamp()
+        self.started = time.time()
+        self.requests = 0
+        # Tools chdir, swap sys.argv and redirect stdout, so runs are serialized.
+        self.run_lock = threading.Lock()
+        self.server: socketserver.UnixStreamServer | None = None
+
+    def dispatch(self, req: dict) -> dict:
+        cmd = req.get("cmd")
+        if cmd == "status":
+            return {
+                "pid": os.getpid(),
+                "root": self.root.as_posix(),
+                "uptime": round(time.time() - self.started, 1),
+                "requests": self.requests,
+                "cached_files": len(self.corpus.files),
+                "watching": self.observer is not None,
+            }
+        if cmd == "shutdown":
+            self._shutdown()
+            return {"ok": True}
+
+        tool = req.get("tool")
+        if tool not in TOOLS:
+            return {"rc": 2, "stdout": "", "stderr": f"campaignd: unknown tool: {tool}\n"}
+        if _script_stamp() != self.stamp:
+            # Scripts were edited since start: let the caller run standalone and exit,
+            # rather than serve results from stale code.
+            self._shutdown()
+            return {"stale": True}
+        return self.run_tool(tool, list(req.get("argv", [])), str(req.get("cwd") or self.root))
+
+    def run_tool(self, tool: str, argv: list[str], cwd: str) -> dict:
+        out, err = io.StringIO(), io.StringIO()
+        with self.run_lock:
+            self.requests += 1
+            old_argv, old_cwd = sys.argv, os.getcwd()
+            sys.argv = [f"{tool}.py", *argv]
+            daemon_client.serving = True
+            corpus.activate(self.corpus)
+            try:
+                os.chdir(cwd)
+                with redirect_stdout(out), redirect_stderr(err):
+                    try:
+                        rc = importlib.import_module(tool).main() or 0
+                    except SystemExit as exc:
+                        if isinstance(exc.code, int) or exc.code is None:
+                            rc = exc.code or 0
+                        else:
+                            print(exc.code, file=sys.stderr)
+                            rc = 1
+                    except Exception:
+                        traceback.print_exc()
+                        rc = 1
+            finally:
+                corpus.activate(None)
+                daemon_client.serving = False
+                sys.argv = old_argv
+                os.chdir(old_cwd)
+        return {"rc": rc, "stdout": out.getvalue(), "stderr": err.getvalue()}
+
+    def _shutdown(self) -> None:
+        if self.server is not None:
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def serve(self, path: str) -> None:
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                try:
+                    req = json.loads(line)
+                except ValueError:
+                    return
+                self.wfile.write(json.dumps(daemon.dispatch(req)).encode("utf-8"))
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        old_umask = os.umask(0o077)
+        try:
+            self.server = Server(path, Handler)
+        finally:
+            os.umask(old_umask)
+
+        signal.signal(signal.SIGTERM, lambda *_: self._shutdown())
+        if self.observer is not None:
+            self.observer.start()
+        print(f"campaignd serving {self.root.as_posix()} on {path} (pid {os.getpid()})", flush=True)
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if self.observer is not None:
+                self.observer.stop()
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+def _running(path: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+        return True
+    except OSError:
+        return False
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    path = socket_path()
+    if _running(path):
+        raise SystemExit(f"campaignd already running on {path}")
+    if os.path.exists(path):
+        os.unlink(path)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    CampaignDaemon(REPO_ROOT).serve(path)
+    return 0
+
+
+def cmd_start(args: argparse.Namespace) -> int:
+    path = socket_path()
+    if _running(path):
+        print(f"campaignd already running on {path}")
+        return 0
+    log_path = REPO_ROOT / ".cache" / "campaignd.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with log_path.open("ab") as log:
+        subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "serve"],
+            cwd=REPO_ROOT,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        if _running(path):
+            print(f"campaignd started on {path}")
+            return 0
+        time.sleep(0.05)
+    raise SystemExit(f"campaignd did not start; see {log_path.as_posix()}")
+
+
+def cmd_stop(args: argparse.Namespace) -> int:
+    if not _running(socket_path()):
+        print("campaignd is not running")
+        return 0
+    daemon_client.request({"cmd": "shutdown"}, timeout=5)
+    print("campaignd stopped")
+    return 0
+
+
+def cmd_status(args: argparse.Namespace) -> int:
+    if not _running(socket_path()):
+        print("campaignd is not running")
+        return 1
+    print(json.dumps(daemon_client.request({"cmd": "status"}, timeout=5), indent=2))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Optional background daemon: keeps the item/reference corpus in memory and runs "
+        "build, export, query and validate tools in-process."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("start", help="Start in the background (log: .cache/campaignd.log).").set_defaults(func=cmd_start)
+    sub.add_parser("serve", help="Run in the foreground.").set_defaults(func=cmd_serve)
+    sub.add_parser("stop", help="Stop a running daemon.").set_defaults(func=cmd_stop)
+    sub.add_parser("status", help="Show daemon status.").set_defaults(func=cmd_status)
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import hashlib
+import os
+import pickle
+import posixpath
+import re
+import sys
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Callable, TypeVar
+
+import corpus
+from aho_corasick import Automaton, fold
+from daemon_client import forward
+from dedupe_references import Sketch, SketchIndex, sketch_text
+from frontmatter import Value, parse_front_matter, split_front_matter
+from ingest_ledger import DEFAULT_CACHE as LEDGER_CACHE
+from ingest_ledger import DEFAULT_LEDGER, PRIVATE_END, Ledger
+from linkify_entities import entity_names, is_entity_file
+from visibility import MARKER_RE
+
+
+CACHE_VERSION = 1
+DEFAULT_CACHE = ".cache/idea-box-catalogue.pickle"
+CATALOGUE_HEADING = "## Catalogue"
+PREVIEW_LENGTH = 100
+# Fragments are short, so "already merged" uses smaller shingles and denser sampling
+# than the reference dedupe. A fragment counts as merged when this share of its
+# sampled shingles is found in one item; below MIN_SAMPLES the estimate is noise.
+SHINGLE_SIZE = 4
+SAMPLE_RATE = 4
+MERGED_THRESHOLD = 0.8
+MIN_SAMPLES = 3
+
+H1_RE = re.compile(r"^#\s+(?P<value>.+?)\s*$", re.M)
+REFERENCE_RE = re.compile(r"(?<![\w/])references/[^\s`)\]>\"'|]+")
+LINK_RE = re.compile(r"\]\((?P<href>[^)\s#]+\.md)(?:#[^)\s]*)?\)")
+LINK_TEXT_RE = re.compile(r"!?\[(?P<text>[^\]\n]*)\]\([^)\n]*\)")
+LIST_PREFIX_RE = re.compile(r"^(?:[-*+]|\d+[.)])\s+")
+COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+
+R = TypeVar("R")
+
+
+@dataclass(frozen=True)
+class ItemRecord:
+    stat: tuple[int, int]
+    sha: str
+    title: str
+    type: str
+    names: tuple[str, ...]
+    sketch: Sketch
+
+
+@dataclass(frozen=True)
+class Fragment:
+    stat: tuple[int, int]
+    sha: str
+    title: str
+    preview: str
+    sources: tuple[str, ...]  # front matter `source(s):`, then `references/...` mentions
+    tags: tuple[str, ...]  # front matter `tags:` / `themes:`
+    merged_into: tuple[str, ...]  # front matter `merged_into:`
+    date: str  # front matter `created:` / `date:`
+    links: tuple[str, ...]  # Markdown links to other files, relative to the campaign root
+    sketch: Sketch
+
+
+def _values(value: Value) -> list[str]:
+    if isinstance(value, list):
+        return [" ".join(str(v).split()) for v in value if v not in (None, "")]
+    return [] if value in (None, "") else [" ".join(str(value).split())]
+
+
+def _clean(body: str) -> str:
+    return COMMENT_RE.sub("", MARKER_RE.sub("", body))
+
+
+def _preview(body: str) -> str:
+    for line in body.splitlines():
+        line = LIST_PREFIX_RE.sub("", line.strip())
+        if not line or line.startswith(("#", "---", "```")):
+            continue
+        # Link text only: targets are relative to the fragment, not to the catalogue.
+        line = " ".join(LINK_TEXT_RE.sub(r"\g<text>", line).split())
+        return line if len(line) <= PREVIEW_LENGTH else line[: PREVIEW_LENGTH - 1].rstrip() + "…"
+    return ""
+
+
+def _links(rel: str, body: str) -> tuple[str, ...]:
+    base = posixpath.dirname(rel)
+    found = []
+    for m in LINK_RE.finditer(body):
+        href = m.group("href")
+        if "://" not in href:
+            found.append(posixpath.normpath(posixpath.join(base, href)))
+    return tuple(dict.fromkeys(found))
+
+
+def load_item(rel: str, text: str, stat: tuple[int, int], sha: str) -> ItemRecord:
+    front, body = split_front_matter(text)
+    meta = parse_front_matter(front, source=rel) if front.strip() else {}
+    title = meta.get("title")
+    return ItemRecord(
+        stat=stat,
+        sha=sha,
+        title=title if isinstance(title, str) and title else posixpath.basename(rel)[:-3],
+        type=str(meta.get("type") or ""),
+        names=tuple(entity_names(meta)),
+        sketch=sketch_text(rel, _clean(body), shingle_size=SHINGLE_SIZE, sample_rate=SAMPLE_RATE),
+    )
+
+
+def load_fragment(rel: str, text: str, stat: tuple[int, int], sha: str) -> Fragment:
+    front, body = split_front_matter(text)
+    meta = parse_front_matter(front, source=rel) if front.strip() else {}
+    body = _clean(body)
+    title = meta.get("title")
+    if not isinstance(title, str) or not title:
+        m_h1 = H1_RE.search(body)
+        title = m_h1.group("value") if m_h1 else posixpath.basename(rel)[:-3].replace("-", " ").capitalize()
+    sources = _values(meta.get("source")) + _values(meta.get("sources"))
+    sources += [m.group(0).rstrip(".,;:") for m in REFERENCE_RE.finditer(body)]
+    return Fragment(
+        stat=stat,
+        sha=sha,
+        title=title,
+        preview=_preview(body),
+        sources=tuple(dict.fromkeys(s.strip("`") for s in sources)),
+        tags=tuple(dict.fromkeys(_values(meta.get("tags")) + _values(meta.get("themes")))),
+        merged_into=tuple(_values(meta.get("merged_into"))),
+        date=str(meta.get("created") or meta.get("date") or ""),
+        links=_links(rel, body),
+        sketch=sketch_text(rel, body, shingle_size=SHINGLE_SIZE, sample_rate=SAMPLE_RATE),
+    )
+
+
+def _scan(root: Path, paths: list[Path]) -> dict[str, tuple[Path, tuple[int, int]]]:
+    stats = {}
+    for path in paths:
+        st = path.stat()
+        stats[path.relative_to(root).as_posix()] = (path, (st.st_mtime_ns, st.st_size))
+    return stats
+
+
+# Records for the scanned files, reusing cached ones. A file is only read when its
+# (mtime, size) changed, and only re-parsed when its content hash changed too, so a
+# run after a large ingest costs time in proportion to the new or edited files.
+def refresh(
+    stats: dict[str, tuple[Path, tuple[int, int]]],
+    old: dict[str, R],
+    load: Callable[[str, str, tuple[int, int], str], R],
+    errors: list[str],
+) -> tuple[dict[str, R], int]:
+    records: dict[str, R] = {}
+    read = 0
+    for rel, (path, stat) in stats.items():
+        hit = old.get(rel)
+        if hit is not None and hit.stat == stat:
+            records[rel] = hit
+            continue
+        data = corpus.read_bytes(path)
+        sha = hashlib.sha1(data).hexdigest()
+        read += 1
+        if hit is not None and hit.sha == sha:
+            records[rel] = replace(hit, stat=stat)
+            continue
+        try:
+            records[rel] = load(rel, data.decode("utf-8", errors="replace"), stat, sha)
+        except ValueError as exc:
+            errors.append(str(exc))
+    return records, read
+
+
+# Folded title/alias -> item, for names that belong to exactly one item.
+def entity_index(items: dict[str, ItemRecord], min_length: int) -> dict[str, str]:
+    owners: dict[str, list[str]] = {}
+    for rel, item in items.items():
+        for name in item.names:
+            if len(name) >= min_length:
+                claimed = owners.setdefault(fold(name), [])
+                if rel not in claimed:
+                    claimed.append(rel)
+    return {name: found[0] for name, found in owners.items() if len(found) == 1}
+
+
+def build_automaton(entities: dict[str, str]) -> Automaton[str]:
+    automaton: Automaton[str] = Automaton()
+    for name in sorted(entities):
+        automaton.add(name, entities[name])
+    return automaton.build()
+
+
+def _digest(value: object) -> str:
+    return hashlib.sha1(repr(value).encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class Flag:
+    rel: str
+    reason: str
+
+
+class Catalogue:
+    def __init__(self, idea_dir: str, fragments: dict[str, Fragment], items: dict[str, ItemRecord]) -> None:
+        self.idea_dir = idea_dir
+        self.fragments = fragments
+        self.items = items
+        self.sources: dict[str, list[str]] = {rel: list(f.sources) for rel, f in fragments.items()}
+        self.dates: dict[str, str] = {rel: f.date for rel, f in fragments.items()}
+        self.mentions: dict[str, tuple[str, ...]] = {}
+        self.merges: dict[str, tuple[tuple[str, float], ...]] = {}
+
+    def _link(self, rel: str, label: str) -> str:
+        label = label.replace("[", "(").replace("]", ")")
+        return f"[{label}]({posixpath.relpath(rel, self.idea_dir)})"
+
+    def _entry(self, rel: str, *, preview: bool) -> str:
+        fragment = self.fragments[rel]
+        line = f"- {self._link(rel, fragment.title)}"
+        return line + (f" — {fragment.preview}" if preview and fragment.preview else "")
+
+    def _order(self, rels: list[str]) -> list[str]:
+        return sorted(rels, key=lambda r: (self.fragments[r].title.casefold(), r))
+
+    def flags(self, root: Path, today: dt.date, stale_days: int) -> list[Flag]:
+        flags: list[Flag] = []
+        for rel in self._order(list(self.fragments)):
+            fragment = self.fragments[rel]
+            if fragment.merged_into:
+                targets = ", ".join(f"`{t}`" for t in fragment.merged_into)
+                flags.append(Flag(rel, f"marked merged into {targets}"))
+                continue
+            for item, share in self.merges.get(rel, ()):
+                flags.append(Flag(rel, f"looks merged into `{item}` ({share:.0%} of its text)"))
+            for source in self.sources[rel]:
+                if source.startswith("references/") and not (root / source).exists():
+                    flags.append(Flag(rel, f"source `{source}` no longer exists"))
+            since = self.dates[rel]
+            try:
+                age = (today - dt.date.fromisoformat(since[:10])).days if since else None
+            except ValueError:
+                age = None
+            if stale_days > 0 and age is not None and age > stale_days and not self.merges.get(rel):
+                flags.append(Flag(rel, f"unplaced for {age} days (since {since[:10]})"))
+        return flags
+
+    def render(self, flags: list[Flag]) -> list[str]:
+        lines = [
+            CATALOGUE_HEADING,
+            "",
+            f"Generated by `scripts/catalogue_idea_box.py` from {len(self.fragments)} fragment(s);"
+            " edits below this heading are overwritten.",
+            "",
+        ]
+        if not self.fragments:
+            return lines + ["No fragments yet.", ""]
+
+        lines += ["### Needs attention", ""]
+        if flags:
+            lines += [f"- {self._link(f.rel, self.fragments[f.rel].title)}: {f.reason}" for f in flags]
+        else:
+            lines.append("Nothing flagged.")
+        lines.append("")
+
+        by_source: dict[str, list[str]] = {}
+        for rel in self.fragments:
+            for source in self.sources[rel] or [""]:
+                by_source.setdefault(source, []).append(rel)
+        lines += ["### By source", ""]
+        for source in sorted(by_source, key=lambda s: (s == "", s)):
+            rels = self._order(by_source[source])
+            label = f"`{source}`" if source else "No recorded source"
+            lines += [f"#### {label} ({len(rels)})", ""]
+            lines += [self._entry(rel, preview=True) for rel in rels]
+            lines.append("")
+
+        by_item: dict[str, list[str]] = {}
+        by_tag: dict[str, list[str]] = {}
+        unthemed: list[str] = []
+        for rel, fragment in self.fragments.items():
+            for item in self.mentions.get(rel, ()):
+                by_item.setdefault(item, []).append(rel)
+            for tag in fragment.tags:
+                by_tag.setdefault(tag, []).append(rel)
+            if not self.mentions.get(rel) and not fragment.tags:
+                unthemed.append(rel)
+        lines += ["### By faction and theme", ""]
+        for item in sorted(by_item, key=lambda i: (self.items[i].title.casefold(), i)):
+            record = self.items[item]
+            kind = f"{record.type}, " if record.type else ""
+            lines += [f"#### {self._link(item, record.title)} ({kind}{len(by_item[item])})", ""]
+            lines += [self._entry(rel, preview=False) for rel in self._order(by_item[item])]
+            lines.append("")
+        for tag in sorted(by_tag, key=str.casefold):
+            lines += [f"#### Tag: {tag} ({len(by_tag[tag])})", ""]
+            lines += [self._entry(rel, preview=False) for rel in self._order(by_tag[tag])]
+            lines.append("")
+        if unthemed:
+            lines += [f"#### No detected theme ({len(unthemed)})", ""]
+            lines += [self._entry(rel, preview=False) for rel in self._order(unthemed)]
+            lines.append("")
+        return lines
+
+
+# Keeps the hand-written part of `_index.md` (everything above the catalogue heading,
+# or above PRIVATE_END the first time) and replaces the rest.
+def render_index(existing: str, catalogue: list[str]) -> str:
+    lines = existing.splitlines()
+    cut = next((i for i, line in enumerate(lines) if line.strip() == CATALOGUE_HEADING), None)
+    if cut is None:
+        cut = next((i for i, line in enumerate(lines) if line.strip() == PRIVATE_END), len(lines))
+    preamble = lines[:cut]
+    while preamble and not preamble[-1].strip():
+        preamble.pop()
+    while catalogue and not catalogue[-1].strip():
+        catalogue = catalogue[:-1]
+    return "\n".join([*preamble, "", *catalogue, PRIVATE_END]) + "\n"
+
+
+def _load_cache(cache_path: Path, idea_dir: str) -> dict:
+    if not cache_path.exists():
+        return {}
+    try:
+        with cache_path.open("rb") as fh:
+            cached = pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return {}
+    if cached.get("version") != CACHE_VERSION or cached.get("idea_dir") != idea_dir:
+        return {}
+    return cached
+
+
+def _save_cache(cache_path: Path, state: dict) -> None:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp.open("wb") as fh:
+        pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(cache_path)
+
+
+def main() -> int:
+    forwarded = forward("catalogue_idea_box")
+    if forwarded is not None:
+        return forwarded
+
+    parser = argparse.ArgumentParser(
+        description="Regenerate the idea-box catalogue (items/meta/idea-box/_index.md) from its fragment files."
+    )
+    parser.add_argument("--items-dir", default="items", help="GM items directory (default: items).")
+    parser.add_argument(
+        "--idea-box",
+        default="items/meta/idea-box",
+        help="Fragment directory; its _index.md holds the catalogue (default: items/meta/idea-box).",
+    )
+    parser.add_argument("--ledger", default=DEFAULT_LEDGER, help=f"Ingest ledger (default: {DEFAULT_LEDGER}).")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help=f"Record cache (default: {DEFAULT_CACHE}).")
+    parser.add_argument(
+        "--stale-days",
+        type=int,
+        default=180,
+        help="Flag unplaced fragments older than this many days; 0 disables (default: 180).",
+    )
+    parser.add_argument(
+        "--min-length",
+        type=int,
+        default=4,
+        help="Ignore item titles/aliases shorter than this many characters (default: 4).",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Report without writing the catalogue.")
+    args = parser.parse_args()
+
+    items_dir = Path(args.items_dir).resolve()
+    idea_dir = Path(args.idea_box).resolve()
+    if not idea_dir.is_dir():
+        raise SystemExit(f"Idea box not found: {args.idea_box}")
+    root = items_dir.parent
+    idea_rel = idea_dir.relative_to(root).as_posix()
+    index_path = idea_dir / "_index.md"
+    cache_path = Path(args.cache)
+    cached = _load_cache(cache_path, idea_rel)
+    errors: list[str] = []
+
+    item_paths = [p for p in corpus.markdown_files(items_dir) if is_entity_file(p, items_dir)]
+    items, items_read = refresh(_scan(root, item_paths), cached.get("items", {}), load_item, errors)
+    fragment_paths = [p for p in corpus.markdown_files(idea_dir) if not p.name.startswith("_")]
+    fragments, fragments_read = refresh(
+        _scan(root, fragment_paths), cached.get("fragments", {}), load_fragment, errors
+    )
+    for err in errors:
+        print(f"ERROR: {err}", file=sys.stderr)
+
+    catalogue = Catalogue(idea_rel, fragments, items)
+
+    # Entity mentions are kept per fragment with the name set they were found with;
+    # fragments are only re-scanned when they changed or an item title/alias did.
+    entities = entity_index(items, args.min_length)
+    entities_key = _digest(sorted(entities.items()))
+    old_mentions: dict[str, tuple[str, tuple[str, ...]]] = cached.get("mentions", {})
+    mentions: dict[str, tuple[str, tuple[str, ...]]] = {}
+    automaton: Automaton[str] | None = None
+    for rel, fragment in fragments.items():
+        hit = old_mentions.get(rel)
+        if hit is None or hit[0] != f"{entities_key}:{fragment.sha}":
+            if automaton is None:
+                automaton = corpus.remember("idea-box-entities", entities_key, lambda: build_automaton(entities))
+            text = split_front_matter(corpus.read_text(root / rel))[1]
+            found = [m.value for m in automaton.iter(_clean(text))]
+            hit = (f"{entities_key}:{fragment.sha}", tuple(dict.fromkeys(found)))
+        mentions[rel] = hit
+        linked = [link for link in fragment.links if link in items]
+        catalogue.mentions[rel] = tuple(dict.fromkeys([*hit[1], *linked]))
+
+    # Likewise merge checks, keyed by the item contents they were checked against.
+    items_key = _digest(sorted((rel, item.sha) for rel, item in items.items()))
+    old_merges: dict[str, tuple[str, tuple[tuple[str, float], ...]]] = cached.get("merges", {})
+    merges: dict[str, tuple[str, tuple[tuple[str, float], ...]]] = {}
+    index: SketchIndex | None = None
+    for rel, fragment in fragments.items():
+        hit = old_merges.get(rel)
+        if hit is None or hit[0] != f"{items_key}:{fragment.sha}":
+            found: list[tuple[str, float]] = []
+            if len(fragment.sketch.samples) >= MIN_SAMPLES:
+                if index is None:
+                    index = SketchIndex()
+                    for item in items.values():
+                        index.add(item.sketch)
+                for pair in index.query(fragment.sketch, MERGED_THRESHOLD):
+                    if pair.containment_a_in_b >= MERGED_THRESHOLD:
+                        found.append((pair.b, round(pair.containment_a_in_b, 2)))
+            hit = (f"{items_key}:{fragment.sha}", tuple(found))
+        merges[rel] = hit
+        catalogue.merges[rel] = hit[1]
+
+    # Ledger events add the reference a fragment was filed from and when.
+    ledger = Ledger(Path(args.ledger), cache_path=Path(LEDGER_CACHE))
+    for rel, events in ledger.for_items(sorted(fragments)).items():
+        refs = [e["reference"] for e in events if rel in e.get("idea_box", [])]
+        dates = sorted(e["date"] for e in events if e.get("date"))
+        catalogue.sources[rel] = list(dict.fromkeys([*catalogue.sources[rel], *refs]))
+        if dates and not catalogue.dates[rel]:
+            catalogue.dates[rel] = dates[0]
+
+    flags = catalogue.flags(root, dt.date.today(), args.stale_days)
+    existing = index_path.read_text(encoding="utf-8") if index_path.exists() else ""
+    text = render_index(existing, catalogue.render(flags))
+    changed = text != existing
+    if changed and not args.dry_run:
+        index_path.write_text(text, encoding="utf-8")
+
+    state = {
+        "version": CACHE_VERSION,
+        "idea_dir": idea_rel,
+        "items": items,
+        "fragments": fragments,
+        "mentions": mentions,
+        "merges": merges,
+    }
+    if items_read or fragments_read or state != cached:
+        _save_cache(cache_path, state)
+
+    status = "would update" if changed and args.dry_run else "updated" if changed else "unchanged"
+    print(
+        f"Idea box: {len(fragments)} fragment(s), {fragments_read} read, {len(flags)} flag(s); "
+        f"{index_path.relative_to(root).as_posix()} {status}."
+    )
+    return 2 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
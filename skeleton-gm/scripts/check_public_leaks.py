@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import bisect
+import re
+import sys
+from pathlib import Path
+
+import corpus
+from aho_corasick import Automaton, fold
+from daemon_client import forward
+from frontmatter import parse_front_matter, split_front_matter
+from visibility import PRIVATE, MarkerError, line_offset_of
+
+
+HEADING_RE = re.compile(r"^\s*#{1,6}\s+(?P<text>.+?)\s*#*\s*$")
+LIST_ITEM_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(?P<text>.+?)\s*$")
+BOLD_RE = re.compile(r"\*\*(?P<text>[^*]+)\*\*|__(?P<alt>[^_]+)__")
+SECRETS_HEADING_RE = re.compile(r"secret", re.I)
+NEWLINE_RE = re.compile(r"\n")
+SCAN_SUFFIXES = {".md", ".txt", ".html"}
+
+
+def _normalize(term: str) -> str:
+    return " ".join(term.split()).strip(" .,;:")
+
+
+# Secret terms of one item: its `secrets:` front matter, plus list items under any
+# PRIVATE heading that mentions "secret" (the template's `### Secrets`). A list item
+# contributes its **bold** spans when it has them, otherwise its whole text.
+def item_terms(rel: str, text: str) -> list[str]:
+    front, body = split_front_matter(text)
+    terms: list[str] = []
+    meta = parse_front_matter(front, source=rel) if front.strip() else {}
+    declared = meta.get("secrets")
+    if isinstance(declared, list):
+        terms += [str(v) for v in declared if v not in (None, "")]
+    elif declared not in (None, ""):
+        terms.append(str(declared))
+
+    blocks = corpus.tokenize(body, source=rel, line_offset=line_offset_of(text, body))
+    for block in blocks:
+        if block.kind != PRIVATE:
+            continue
+        in_secrets = False
+        for line in block.lines:
+            m_heading = HEADING_RE.match(line)
+            if m_heading:
+                in_secrets = bool(SECRETS_HEADING_RE.search(m_heading.group("text")))
+                continue
+            m_item = LIST_ITEM_RE.match(line) if in_secrets else None
+            if not m_item:
+                continue
+            bold = [m.group("text") or m.group("alt") for m in BOLD_RE.finditer(m_item.group("text"))]
+            terms += bold or [m_item.group("text")]
+    return [t for t in (_normalize(t) for t in terms) if t]
+
+
+def collect_terms(items_dir: Path, min_length: int) -> tuple[dict[str, list[str]], list[str]]:
+    terms: dict[str, list[str]] = {}
+    errors: list[str] = []
+    for path in corpus.markdown_files(items_dir):
+        rel = path.relative_to(items_dir.parent).as_posix()
+        try:
+            found = item_terms(rel, corpus.read_text(path))
+        except (MarkerError, ValueError) as exc:
+            errors.append(str(exc))
+            continue
+        for term in found:
+            if len(term) >= min_length:
+                # Matching is case-insensitive, so terms differing only in case are one term.
+                sources = terms.setdefault(fold(term), [])
+                if rel not in sources:
+                    sources.append(rel)
+    return terms, errors
+
+
+def build_automaton(terms: dict[str, list[str]]) -> Automaton[str]:
+    automaton: Automaton[str] = Automaton()
+    for term in sorted(terms):
+        automaton.add(term, term)
+    return automaton.build()
+
+
+# Returns (line, term, text as written) per term and line.
+def scan_file(path: Path, automaton: Automaton[str]) -> list[tuple[int, str, str]]:
+    text = path.read_text(encoding="utf-8", errors="replace")
+    newlines = [m.start() for m in NEWLINE_RE.finditer(text)]
+    hits: list[tuple[int, str, str]] = []
+    seen: set[tuple[int, str]] = set()
+    for match in automaton.iter(text):
+        line = bisect.bisect_left(newlines, match.start) + 1
+        if (line, match.value) not in seen:
+            seen.add((line, match.value))
+            hits.append((line, match.value, text[match.start : match.end]))
+    return hits
+
+
+def main() -> int:
+    forwarded = forward("check_public_leaks")
+    if forwarded is not None:
+        return forwarded
+
+    parser = argparse.ArgumentParser(
+        description="Fail if secret terms (PRIVATE `Secrets` lists, `secrets:` front matter) appear in public output."
+    )
+    parser.add_argument("public_repo", help="Public repo path; its content/ and docs/ are scanned.")
+    parser.add_argument("--items-dir", default="items", help="GM items directory (default: items).")
+    parser.add_argument(
+        "--min-length",
+        type=int,
+        default=4,
+        help="Ignore terms shorter than this many characters (default: 4).",
+    )
+    args = parser.parse_args()
+
+    public = Path(args.public_repo)
+    items_dir = Path(args.items_dir).resolve()
+    terms, errors = collect_terms(items_dir, args.min_length)
+    for err in errors:
+        print(f"ERROR: {err}", file=sys.stderr)
+    if errors:
+        return 2
+
+    key = tuple(sorted(terms))
+    automaton = corpus.remember("leak-automaton", key, lambda: build_automaton(terms))
+
+    roots = [public / "content", public / "docs"]
+    files = sorted(p for root in roots if root.is_dir() for p in root.rglob("*") if p.suffix in SCAN_SUFFIXES)
+    leaks = 0
+    for path in files:
+        for line, term, written in scan_file(path, automaton):
+            sources = terms[term]
+            origin = sources[0] + (f" and {len(sources) - 1} more" if len(sources) > 1 else "")
+            print(f"{path.relative_to(public).as_posix()}:{line}: secret \"{written}\" (from {origin})")
+            leaks += 1
+
+    if leaks:
+        print(f"Leak check: {leaks} hit(s) in public output; nothing should be released.", file=sys.stderr)
+        return 1
+    print(f"Leak check: {len(terms)} secret term(s), {len(files)} public file(s), no hits.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
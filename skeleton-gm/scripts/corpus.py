@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import Callable, TypeVar
+
+from visibility import Block, tokenize as _tokenize
+
+
+T = TypeVar("T")
+
+
+# File reads and parse results shared across tool runs inside campaignd. Standalone
+# runs never set an active corpus, so every helper here falls through to the plain
+# filesystem call and nothing is kept between invocations.
+class Corpus:
+    def __init__(self, *, watched: bool) -> None:
+        # Reads are always revalidated against (mtime_ns, size) -- a stat is cheap and
+        # avoids racing events for files a tool has just written. Filesystem events
+        # (when available) let directory listings be reused instead of re-walked.
+        self.watched = watched
+        self.files: dict[str, tuple[int, int, bytes]] = {}
+        self.texts: dict[str, str] = {}
+        self.listings: dict[str, list[Path]] = {}
+        self.memo: dict[str, tuple[object, object]] = {}
+        self.lock = threading.Lock()
+
+    def invalidate(self, path: str) -> None:
+        with self.lock:
+            self.files.pop(path, None)
+            self.texts.pop(path, None)
+            # Creates, deletes and renames change directory listings above the path.
+            for key in [k for k in self.listings if path == k or path.startswith(k + os.sep)]:
+                del self.listings[key]
+
+    def read_bytes(self, path: Path) -> bytes:
+        key = os.path.abspath(path)
+        cached = self.files.get(key)
+        st = os.stat(key)
+        if cached is not None and (cached[0], cached[1]) == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+        data = Path(key).read_bytes()
+        with self.lock:
+            self.files[key] = (st.st_mtime_ns, st.st_size, data)
+            self.texts.pop(key, None)
+        return data
+
+    def read_text(self, path: Path) -> str:
+        data = self.read_bytes(path)
+        key = os.path.abspath(path)
+        text = self.texts.get(key)
+        if text is None:
+            text = data.decode("utf-8")
+            self.texts[key] = text
+        return text
+
+    def markdown_files(self, root: Path) -> list[Path]:
+        key = os.path.abspath(root)
+        listing = self.listings.get(key) if self.watched else None
+        if listing is None:
+            listing = sorted(p for p in root.rglob("*.md") if p.is_file())
+            with self.lock:
+                self.listings[key] = listing
+        return list(listing)
+
+
+_active: Corpus | None = None
+
+
+def activate(corpus: Corpus | None) -> None:
+    global _active
+    _active = corpus
+
+
+def read_text(path: Path) -> str:
+    if _active is None:
+        return path.read_text(encoding="utf-8")
+    return _active.read_text(path)
+
+
+def read_bytes(path: Path) -> bytes:
+    if _active is None:
+        return path.read_bytes()
+    return _active.read_bytes(path)
+
+
+def markdown_files(root: Path) -> list[Path]:
+    if _active is None:
+        return sorted(p for p in root.rglob("*.md") if p.is_file())
+    return _active.markdown_files(root)
+
+
+# Keeps the last value built for `namespace` while `key` compares equal.
+def remember(namespace: str, key: object, build: Callable[[], T]) -> T:
+    if _active is None:
+        return build()
+    slot = _active.memo.get(namespace)
+    if slot is not None and slot[0] == key:
+        return slot[1]  # type: ignore[return-value]
+    value = build()
+    _active.memo[namespace] = (key, value)
+    return value
+
+
+def tokenize(body: str, *, source: str, line_offset: int) -> list[Block]:
+    # Text from the corpus is the same object until the file changes, so the key
+    # comparison is usually an identity check.
+    return remember(
+        f"tokenize:{source}",
+        (body, line_offset),
+        lambda: _tokenize(body, source=source, line_offset=line_offset),
+    )
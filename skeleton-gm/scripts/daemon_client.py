@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import socket
+import sys
+import tempfile
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Set by campaignd while it runs a tool in-process, so the tool doesn't forward to itself.
+serving = False
+
+
+def socket_path(root: Path = REPO_ROOT) -> str:
+    path = (root / ".cache" / "campaignd.sock").as_posix()
+    # AF_UNIX paths are limited to ~104 bytes; deep checkouts use a per-repo temp name.
+    if len(path.encode("utf-8")) < 100:
+        return path
+    digest = hashlib.sha1(root.as_posix().encode("utf-8")).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"campaignd-{digest}.sock")
+
+
+def _exchange(sock: socket.socket, payload: dict) -> dict:
+    sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+    sock.shutdown(socket.SHUT_WR)
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return json.loads(b"".join(chunks).decode("utf-8"))
+
+
+def request(payload: dict, *, timeout: float | None = None) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path())
+        return _exchange(sock, payload)
+
+
+# Runs the calling CLI inside campaignd when one is serving this repo and returns its
+# exit code; returns None (run standalone) when there is no daemon. CAMPAIGND=0 opts out.
+def forward(tool: str) -> int | None:
+    if serving or os.environ.get("CAMPAIGND") == "0":
+        return None
+    path = socket_path()
+    if not os.path.exists(path):
+        return None
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            # Stale socket from a daemon that didn't shut down cleanly.
+            return None
+        try:
+            response = _exchange(sock, {"tool": tool, "argv": sys.argv[1:], "cwd": os.getcwd()})
+        except (OSError, ValueError) as exc:
+            print(f"campaignd: request failed ({exc}); run with CAMPAIGND=0 to bypass.", file=sys.stderr)
+            return 1
+    if response.get("stale"):
+        # The daemon saw edited scripts and is exiting; run this invocation standalone.
+        return None
+    sys.stdout.write(response.get("stdout", ""))
+    sys.stderr.write(response.get("stderr", ""))
+    return int(response.get("rc", 1))
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Lines that parse_references.py adds around the extracted text. They are identical
+# across exports and would otherwise inflate similarity between unrelated documents.
+PARSED_NOISE_RE = re.compile(
+    r"^(?:#\s.*"
+    r"|##\s+Page\s+\d+\s*"
+    r"|<!--\s*(?:PUBLIC|PRIVATE)_(?:START|END)\s*-->\s*"
+    r"|Source:\s*`.*`\s*"
+    r"|Pages:\s*\d+\s*"
+    r"|Converted \(UTC\):.*"
+    r"|Possible duplicate of:.*"
+    r"|Split into \d+ file\(s\); see .*"
+    r"|\[Index\]\(index\.md\)\s*"
+    r"|_No extractable text on this page\._\s*"
+    r"|!\[[^\]]*\]\([^)]*\)\s*)$",
+    re.M,
+)
+
+DEFAULT_SHINGLE_SIZE = 5
+DEFAULT_SAMPLE_RATE = 8
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_MAX_POSTINGS = 50
+
+
+# Mod-sampled shingle hashes (Broder): keeping every hash with `h % rate == 0` is
+# consistent across documents, so the samples estimate both resemblance and
+# containment without keeping full shingle sets around.
+@dataclass(frozen=True)
+class Sketch:
+    name: str
+    samples: frozenset[int]
+    shingle_count: int
+
+
+@dataclass(frozen=True)
+class DuplicatePair:
+    a: str
+    b: str
+    resemblance: float
+    containment_a_in_b: float
+    containment_b_in_a: float
+
+    @property
+    def kind(self) -> str:
+        if self.resemblance >= max(self.containment_a_in_b, self.containment_b_in_a) - 0.05:
+            return "duplicate"
+        return "containment"
+
+    @property
+    def score(self) -> float:
+        return max(self.resemblance, self.containment_a_in_b, self.containment_b_in_a)
+
+
+def normalize_parsed_markdown(md: str) -> str:
+    return PARSED_NOISE_RE.sub("", md)
+
+
+def shingle_hashes(text: str, size: int = DEFAULT_SHINGLE_SIZE) -> set[int]:
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return set()
+    if len(words) < size:
+        size = len(words)
+    hashes: set[int] = set()
+    for i in range(len(words) - size + 1):
+        shingle = " ".join(words[i : i + size]).encode("utf-8")
+        hashes.add(int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), "big"))
+    return hashes
+
+
+def sketch_text(
+    name: str,
+    text: str,
+    *,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+    sample_rate: int = DEFAULT_SAMPLE_RATE,
+) -> Sketch:
+    hashes = shingle_hashes(text, shingle_size)
+    samples = frozenset(h for h in hashes if h % sample_rate == 0)
+    return Sketch(name=name, samples=samples, shingle_count=len(hashes))
+
+
+def _compare(a: Sketch, b: Sketch, shared: int) -> DuplicatePair:
+    union = len(a.samples) + len(b.samples) - shared
+    return DuplicatePair(
+        a=a.name,
+        b=b.name,
+        resemblance=shared / union if union else 0.0,
+        containment_a_in_b=shared / len(a.samples) if a.samples else 0.0,
+        containment_b_in_a=shared / len(b.samples) if b.samples else 0.0,
+    )
+
+
+# Inverted index from sampled hash to sketches. Candidates come from walking posting
+# lists, so only documents sharing at least one sample are ever compared. Posting
+# lists longer than `max_postings` are boilerplate and are ignored.
+class SketchIndex:
+    def __init__(self, *, max_postings: int = DEFAULT_MAX_POSTINGS) -> None:
+        self.max_postings = max_postings
+        self.sketches: list[Sketch] = []
+        self.postings: dict[int, list[int]] = {}
+
+    def add(self, sketch: Sketch) -> None:
+        doc_id = len(self.sketches)
+        self.sketches.append(sketch)
+        for h in sketch.samples:
+            self.postings.setdefault(h, []).append(doc_id)
+
+    def _shared_counts(self, samples: frozenset[int], *, skip: int | None = None) -> dict[int, int]:
+        counts: dict[int, int] = {}
+        for h in samples:
+            docs = self.postings.get(h)
+            if not docs or len(docs) > self.max_postings:
+                continue
+            for doc_id in docs:
+                if doc_id != skip:
+                    counts[doc_id] = counts.get(doc_id, 0) + 1
+        return counts
+
+    def query(self, sketch: Sketch, threshold: float) -> list[DuplicatePair]:
+        matches: list[DuplicatePair] = []
+        for doc_id, shared in self._shared_counts(sketch.samples).items():
+            other = self.sketches[doc_id]
+            if other.name == sketch.name:
+                continue
+            pair = _compare(sketch, other, shared)
+            if pair.score >= threshold:
+                matches.append(pair)
+        return sorted(matches, key=lambda p: (-p.score, p.b))
+
+    def pairs(self, threshold: float) -> list[DuplicatePair]:
+        found: list[DuplicatePair] = []
+        for doc_id, sketch in enumerate(self.sketches):
+            for other_id, shared in self._shared_counts(sketch.samples, skip=doc_id).items():
+                if other_id < doc_id:
+                    continue
+                pair = _compare(sketch, self.sketches[other_id], shared)
+                if pair.score >= threshold:
+                    found.append(pair)
+        return sorted(found, key=lambda p: (-p.score, p.a, p.b))
+
+
+# Text of a parsed reference, including its page chunks when parse_references.py
+# split it into `<stem>/` (the `index.md` there only repeats previews).
+def read_parsed_markdown(md: Path) -> str:
+    text = md.read_text(encoding="utf-8")
+    chunk_dir = md.with_suffix("")
+    if (chunk_dir / "index.md").is_file():
+        chunks = sorted(p for p in chunk_dir.glob("p*.md"))
+        text = "\n".join([text, *(p.read_text(encoding="utf-8") for p in chunks)])
+    return text
+
+
+def build_index(
+    parsed_dir: Path,
+    *,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+    sample_rate: int = DEFAULT_SAMPLE_RATE,
+    max_postings: int = DEFAULT_MAX_POSTINGS,
+    exclude: set[Path] | None = None,
+) -> SketchIndex:
+    exclude = {p.resolve() for p in (exclude or set())}
+    index = SketchIndex(max_postings=max_postings)
+    for md in sorted(parsed_dir.glob("*.md")):
+        if md.resolve() in exclude:
+            continue
+        text = normalize_parsed_markdown(read_parsed_markdown(md))
+        index.add(sketch_text(md.as_posix(), text, shingle_size=shingle_size, sample_rate=sample_rate))
+    return index
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Report near-duplicate and contained documents under references/parsed/."
+    )
+    parser.add_argument(
+        "--dir",
+        default="references/parsed",
+        help="Directory of parsed reference markdown (default: references/parsed).",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"Minimum resemblance or containment to report (default: {DEFAULT_THRESHOLD}).",
+    )
+    parser.add_argument(
+        "--shingle-size",
+        type=int,
+        default=DEFAULT_SHINGLE_SIZE,
+        help=f"Words per shingle (default: {DEFAULT_SHINGLE_SIZE}).",
+    )
+    parser.add_argument(
+        "--sample-rate",
+        type=int,
+        default=DEFAULT_SAMPLE_RATE,
+        help=f"Keep one in N shingle hashes (default: {DEFAULT_SAMPLE_RATE}; 1 = exact).",
+    )
+    parser.add_argument(
+        "--jsonl",
+        action="store_true",
+        help="Print one JSON object per pair instead of a text report.",
+    )
+    args = parser.parse_args()
+
+    parsed_dir = Path(args.dir)
+    if not parsed_dir.exists():
+        raise SystemExit(f"Directory not found: {parsed_dir.as_posix()}")
+
+    index = build_index(parsed_dir, shingle_size=args.shingle_size, sample_rate=max(1, args.sample_rate))
+    pairs = index.pairs(args.threshold)
+
+    for pair in pairs:
+        if args.jsonl:
+            print(
+                json.dumps(
+                    {
+                        "kind": pair.kind,
+                        "a": pair.a,
+                        "b": pair.b,
+                        "resemblance": round(pair.resemblance, 3),
+                        "containment_a_in_b": round(pair.containment_a_in_b, 3),
+                        "containment_b_in_a": round(pair.containment_b_in_a, 3),
+                    }
+                )
+            )
+            continue
+        print(
+            f"{pair.kind}\t{pair.score:.2f}\t{pair.a}\t{pair.b}"
+            f"\t(resemblance {pair.resemblance:.2f}, a-in-b {pair.containment_a_in_b:.2f},"
+            f" b-in-a {pair.containment_b_in_a:.2f})"
+        )
+
+    if not args.jsonl:
+        print(f"{len(pairs)} pair(s) at or above {args.threshold:.2f} across {len(index.sketches)} document(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
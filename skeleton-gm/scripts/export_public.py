@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+
+import corpus
+from daemon_client import forward
+from frontmatter import Value, parse_front_matter, split_front_matter
+from stable_output import write_bytes_if_changed, write_text_if_changed
+from visibility import MarkerError, line_offset_of, public_body
+
+
+BUNDLE_FORMAT = 1
+
+HEADING_RE = re.compile(r"^(?P<hashes>#{1,6})\s+(?P<text>.+?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+# Front matter keys that are GM-only and never leave the GM repo.
+PRIVATE_KEYS = {"secrets"}
+
+
+# Drops PRIVATE_KEYS (and their indented list items) from raw front matter.
+def _public_front(front: str) -> str:
+    kept: list[str] = []
+    skipping = False
+    for line in front.splitlines():
+        if skipping and (line.startswith((" ", "\t")) or not line.strip()):
+            continue
+        skipping = line.split(":", 1)[0].strip() in PRIVATE_KEYS and ":" in line
+        if not skipping:
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def _status(front: str) -> str:
+    for line in front.splitlines():
+        if line.startswith("status:"):
+            return line.split(":", 1)[1].strip()
+    return ""
+
+
+def _title(meta: dict[str, Value], body: str, fallback: str) -> str:
+    title = meta.get("title")
+    if isinstance(title, str) and title.strip():
+        return title.strip()
+    for section in _sections(body):
+        if section["level"] == 1:
+            return str(section["heading"])
+    return fallback
+
+
+# mdBook-style heading anchors, so a viewer can deep-link into the published site.
+def _anchor(heading: str, seen: dict[str, int]) -> str:
+    base = re.sub(r"[^\w\- ]", "", heading.strip().lower()).replace(" ", "-")
+    count = seen.get(base, 0)
+    seen[base] = count + 1
+    return base if count == 0 else f"{base}-{count}"
+
+
+def _sections(body: str) -> list[dict[str, Value]]:
+    sections: list[dict[str, Value]] = []
+    seen: dict[str, int] = {}
+    in_fence = False
+    for line in body.splitlines():
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+            continue
+        m = HEADING_RE.match(line) if not in_fence else None
+        if m:
+            text = m.group("text")
+            sections.append({"level": len(m.group("hashes")), "heading": text, "anchor": _anchor(text, seen)})
+    return sections
+
+
+# One JSON document holding every exported item, for viewers that want the whole
+# player-safe corpus in a single request. `version` hashes the items only, so it is
+# stable across runs and changes exactly when exported content does.
+def build_bundle(entries: list[dict]) -> dict:
+    items = sorted(entries, key=lambda e: e["path"])
+    canonical = json.dumps(items, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    titles = sorted(
+        ([str(e["title"]).casefold(), e["id"]] for e in items),
+        key=lambda pair: (pair[0], pair[1]),
+    )
+    sections = [
+        [str(s["heading"]).casefold(), e["id"], s["anchor"]]
+        for e in items
+        for s in e["sections"]
+        if s["level"] > 1
+    ]
+    sections.sort(key=lambda row: (row[0], row[1], row[2]))
+    return {
+        "format": BUNDLE_FORMAT,
+        "version": hashlib.sha256(canonical.encode("utf-8")).hexdigest(),
+        "items": items,
+        "index": {"titles": titles, "sections": sections},
+    }
+
+
+def write_bundle(path: Path, bundle: dict) -> None:
+    data = json.dumps(bundle, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    if path.suffix == ".gz":
+        # mtime=0 keeps the archive byte-identical when the content is.
+        data = gzip.compress(data, compresslevel=9, mtime=0)
+    write_bytes_if_changed(path, data)
+
+
+# Each file is tokenized once, and the same block spans drive validation and PUBLIC
+# extraction. Nothing is written if any published entry has malformed markers.
+def export(items_dir: Path, out_dir: Path, bundle_path: Path | None = None) -> list[str]:
+    exports: list[tuple[Path, str | None]] = []
+    entries: list[dict] = []
+    errors: list[str] = []
+    for src in corpus.markdown_files(items_dir):
+        rel = src.relative_to(items_dir)
+        out_file = out_dir / rel
+        text = corpus.read_text(src)
+        front, body = split_front_matter(text)
+        if _status(front) != "published":
+            exports.append((out_file, None))
+            continue
+        front = _public_front(front)
+
+        try:
+            source = src.relative_to(items_dir.parent).as_posix()
+            blocks = corpus.tokenize(body, source=source, line_offset=line_offset_of(text, body))
+        except MarkerError as exc:
+            errors.append(str(exc))
+            continue
+
+        pub = public_body(blocks)
+        # The bundle holds exactly the items written to out_dir.
+        if bundle_path is not None and (front.strip() or pub.strip()):
+            try:
+                meta = parse_front_matter(front, source=source)
+            except ValueError as exc:
+                errors.append(str(exc))
+                continue
+            body = pub + "\n" if pub else ""
+            entries.append(
+                {
+                    "id": str(meta.get("id") or rel.with_suffix("").as_posix()),
+                    "type": str(meta.get("type") or ""),
+                    "title": _title(meta, body, rel.stem),
+                    "path": rel.as_posix(),
+                    "front_matter": meta,
+                    "body": body,
+                    "sections": _sections(body),
+                }
+            )
+
+        out = ""
+        if front.strip():
+            out += "---\n" + front.strip() + "\n---\n\n"
+        out += pub
+        exports.append((out_file, out.rstrip("\n") + "\n" if out.strip() else None))
+
+    if errors:
+        return errors
+
+    for out_file, content in exports:
+        if content is None:
+            out_file.unlink(missing_ok=True)
+            continue
+        # Unchanged entries are left alone so git and the guide compiler see no churn.
+        write_text_if_changed(out_file, content)
+    if bundle_path is not None:
+        write_bundle(bundle_path, build_bundle(entries))
+    return []
+
+
+def main() -> int:
+    forwarded = forward("export_public")
+    if forwarded is not None:
+        return forwarded
+
+    parser = argparse.ArgumentParser(description="Write PUBLIC blocks of published items to the public repo.")
+    parser.add_argument("items_dir", help="GM items directory.")
+    parser.add_argument("out_dir", help="Public repo content directory.")
+    parser.add_argument(
+        "--bundle",
+        default="",
+        help="Also write every exported item to this single JSON file (gzip-compressed if it ends in .gz).",
+    )
+    args = parser.parse_args()
+
+    bundle = Path(args.bundle).resolve() if args.bundle else None
+    errors = export(Path(args.items_dir).resolve(), Path(args.out_dir).resolve(), bundle)
+    for err in errors:
+        print(f"ERROR: {err}", file=sys.stderr)
+    return 2 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
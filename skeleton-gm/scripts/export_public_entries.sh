@@ -6,6 +6,8 @@ PUBLIC_REPO_PATH="${PUBLIC_REPO_PATH:-../__PUBLIC_REPO_NAME__}"
 ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 ITEMS_DIR="$ROOT_DIR/items"
 OUT_DIR="$PUBLIC_REPO_PATH/content"
+# Single-file copy of the export for viewers; a `.gz` name compresses it, empty disables it.
+EXPORT_BUNDLE="${EXPORT_BUNDLE-$PUBLIC_REPO_PATH/content.json}"
 
 if [[ ! -d "$PUBLIC_REPO_PATH" ]]; then
   echo "ERROR: PUBLIC_REPO_PATH does not exist: $PUBLIC_REPO_PATH" >&2
@@ -20,102 +22,14 @@ fi
 
 mkdir -p "$OUT_DIR"
 
-is_published() {
-  local file="$1"
-  python3 - <<PY
-from pathlib import Path
-import re, sys
-
-text = Path("$file").read_text(encoding="utf-8")
-m = re.match(r"^---\\s*\\n(.*?)\\n---\\s*\\n", text, re.S)
-if not m:
-    sys.exit(1)
-front = m.group(1)
-m_status = re.search(r"^status:\\s*(.+)\\s*$", front, re.M)
-status = m_status.group(1).strip() if m_status else ""
-sys.exit(0 if status == "published" else 1)
-PY
-}
-
-validate_markers() {
-  local file="$1"
-  python3 - <<PY
-from pathlib import Path
-import re, sys
-
-text = Path("$file").read_text(encoding="utf-8")
-
-def count(tag):
-    return len(re.findall(rf"<!--\s*{tag}\s*-->", text))
-
-for start, end in [("PUBLIC_START","PUBLIC_END"), ("PRIVATE_START","PRIVATE_END")]:
-    cs, ce = count(start), count(end)
-    if cs != ce:
-        print(f"ERROR: Unbalanced markers in {Path('$file').name}: {start}={cs}, {end}={ce}", file=sys.stderr)
-        sys.exit(2)
-PY
-}
-
-render_export() {
-  local file="$1"
-  python3 - <<PY
-from pathlib import Path
-import re
-
-p = Path("$file")
-text = p.read_text(encoding="utf-8")
-
-fm = ""
-body = text
-m = re.match(r"^---\\s*\\n(.*?)\\n---\\s*\\n(.*)$", text, re.S)
-if m:
-    fm = m.group(1).strip()
-    body = m.group(2)
-
-pub_lines = []
-in_pub = False
-for line in body.splitlines():
-    if re.search(r"<!--\\s*PUBLIC_START\\s*-->", line):
-        in_pub = True
-        continue
-    if re.search(r"<!--\\s*PUBLIC_END\\s*-->", line):
-        in_pub = False
-        continue
-    if in_pub:
-        pub_lines.append(line)
-
-pub = "\\n".join(pub_lines).strip()
-
-out = ""
-if fm:
-    out += "---\\n" + fm + "\\n---\\n\\n"
-out += pub + ("\\n" if pub else "")
-
-print(out)
-PY
-}
-
-while IFS= read -r -d '' file; do
-  rel="${file#$ITEMS_DIR/}"
-  out_file="$OUT_DIR/$rel"
-  mkdir -p "$(dirname "$out_file")"
-
-  if ! is_published "$file"; then
-    rm -f "$out_file"
-    continue
-  fi
-
-  validate_markers "$file"
-
-  content="$(render_export "$file")"
-  if [[ -z "${content//[[:space:]]/}" ]]; then
-    rm -f "$out_file"
-    continue
-  fi
-  printf "%s\n" "$content" > "$out_file"
-done < <(find "$ITEMS_DIR" -type f -name "*.md" -print0 | sort -z)
+# Tokenizes each item once and writes nothing if any published entry has malformed
+# markers. Runs inside campaignd when it is serving this repo.
+python3 "$ROOT_DIR/scripts/export_public.py" "$ITEMS_DIR" "$OUT_DIR" --bundle "$EXPORT_BUNDLE"
 
 echo "Export complete -> $OUT_DIR"
+if [[ -n "$EXPORT_BUNDLE" ]]; then
+  echo "Bundle -> $EXPORT_BUNDLE"
+fi
 echo
 echo "Note: Only entries with \`status: published\` in frontmatter are exported."
 echo "Public repo status:"
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Union
+
+
+FRONT_MATTER_RE = re.compile(r"^---\s*\n(.*?)\n---\s*\n(.*)$", re.S)
+
+KEY_RE = re.compile(r"^(?P<key>[A-Za-z0-9_-]+):(?:\s+(?P<value>.*?))?\s*$")
+LIST_ITEM_RE = re.compile(r"^\s+-\s*(?P<value>.*?)\s*$")
+INT_RE = re.compile(r"^[-+]?\d+$")
+FLOAT_RE = re.compile(r"^[-+]?(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?$")
+
+Scalar = Union[str, int, float, bool, None]
+Value = Union[Scalar, list[Scalar]]
+
+
+def split_front_matter(text: str) -> tuple[str, str]:
+    m = FRONT_MATTER_RE.match(text)
+    if not m:
+        return "", text
+    return m.group(1), m.group(2)
+
+
+def _strip_comment(value: str) -> str:
+    if value.startswith(("'", '"')):
+        return value
+    return re.sub(r"\s+#.*$", "", value)
+
+
+def _split_inline_list(inner: str) -> list[str]:
+    parts: list[str] = []
+    buf: list[str] = []
+    quote = ""
+    for ch in inner:
+        if quote:
+            buf.append(ch)
+            if ch == quote:
+                quote = ""
+            continue
+        if ch in "'\"":
+            quote = ch
+            buf.append(ch)
+            continue
+        if ch == ",":
+            parts.append("".join(buf).strip())
+            buf = []
+            continue
+        buf.append(ch)
+    tail = "".join(buf).strip()
+    if tail or parts:
+        parts.append(tail)
+    return [p for p in parts if p]
+
+
+def parse_scalar(raw: str) -> Scalar:
+    value = _strip_comment(raw.strip())
+    if value == "" or value in {"~", "null", "Null", "NULL"}:
+        return None
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        inner = value[1:-1]
+        if value[0] == "'":
+            return inner.replace("''", "'")
+        return inner.replace('\\"', '"').replace("\\\\", "\\")
+    lowered = value.lower()
+    if lowered in {"true", "yes"}:
+        return True
+    if lowered in {"false", "no"}:
+        return False
+    if INT_RE.match(value):
+        return int(value)
+    if FLOAT_RE.match(value):
+        return float(value)
+    return value
+
+
+def parse_value(raw: str) -> Value:
+    value = _strip_comment(raw.strip())
+    if value.startswith("[") and value.endswith("]"):
+        return [parse_scalar(part) for part in _split_inline_list(value[1:-1])]
+    return parse_scalar(value)
+
+
+# Parses the YAML subset used by item templates: `key: scalar`, inline lists
+# (`themes: [a, b]`, `factions: []`) and block lists (`key:` followed by `  - item`).
+# Anything else is a ValueError naming the offending line so callers can report it.
+def parse_front_matter(front: str, *, source: str = "<front matter>") -> dict[str, Value]:
+    data: dict[str, Value] = {}
+    current_list: str | None = None
+
+    for lineno, line in enumerate(front.splitlines(), start=2):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+
+        m_item = LIST_ITEM_RE.match(line)
+        if m_item:
+            if current_list is None:
+                raise ValueError(f"{source}:{lineno}: list item without a key")
+            items = data[current_list]
+            if not isinstance(items, list):
+                items = []
+                data[current_list] = items
+            items.append(parse_scalar(m_item.group("value")))
+            continue
+
+        m_key = KEY_RE.match(line)
+        if not m_key:
+            raise ValueError(f"{source}:{lineno}: unsupported front matter line: {line.strip()}")
+
+        key = m_key.group("key")
+        raw = m_key.group("value") or ""
+        data[key] = parse_value(raw)
+        # `key:` with nothing after it may be the start of a block list.
+        current_list = key if data[key] is None else None
+
+    return data
+
+
+def read_front_matter(path: Path) -> tuple[dict[str, Value], str]:
+    text = path.read_text(encoding="utf-8")
+    front, body = split_front_matter(text)
+    return parse_front_matter(front, source=path.as_posix()), body
@@ -2,18 +2,28 @@
 from __future__ import annotations
 
 import argparse
+import posixpath
 import re
-import shutil
+import sys
+from dataclasses import dataclass, replace
 from pathlib import Path
 
+import corpus
+from daemon_client import forward
+from index_pages import DEFAULT_PAGE_SIZE, GROUP_BY, IndexDir, IndexEntry, IndexPages, build_tree
+from related_pages import DEFAULT_RELATED, related_pages, related_section
+from stable_output import OutputTree
+from visibility import PRIVATE, PUBLIC, Block, MarkerError, line_offset_of
 
-def _read_text(path: Path) -> str:
-    return path.read_text(encoding="utf-8")
 
+HUB_SHARD = "hub"
+DIGEST_FILE = ".digest"
+
+MD_LINK_RE = re.compile(r"\[[^\]]*\]\((?P<href>[^)\s]+)\)")
 
-def _write_text(path: Path, text: str) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(text, encoding="utf-8")
+
+def _read_text(path: Path) -> str:
+    return corpus.read_text(path)
 
 
 def _strip_frontmatter(md: str) -> tuple[str, str]:
@@ -37,24 +47,19 @@ def _strip_first_h1(body: str) -> str:
     return re.sub(r"^#\s+.*\n", "", body, count=1).strip()
 
 
-def _render_gm_body(body: str) -> str:
+def _render_gm_body(blocks: list[Block]) -> str:
     lines: list[str] = []
-    for line in body.splitlines():
-        if re.search(r"<!--\s*PUBLIC_START\s*-->", line):
-            lines.append("## Player-Safe (PUBLIC)")
+    for block in blocks:
+        if block.kind == PUBLIC:
+            lines.extend(["## Player-Safe (PUBLIC)", ""])
+            lines.extend(block.lines)
             lines.append("")
-            continue
-        if re.search(r"<!--\s*PUBLIC_END\s*-->", line):
-            lines.append("")
-            continue
-        if re.search(r"<!--\s*PRIVATE_START\s*-->", line):
-            lines.append("## GM-Only (PRIVATE)")
-            lines.append("")
-            continue
-        if re.search(r"<!--\s*PRIVATE_END\s*-->", line):
+        elif block.kind == PRIVATE:
+            lines.extend(["## GM-Only (PRIVATE)", ""])
+            lines.extend(block.lines)
             lines.append("")
-            continue
-        lines.append(line)
+        else:
+            lines.extend(block.lines)
     return "\n".join(lines).strip()
 
 
@@ -62,27 +67,11 @@ def _humanize_section(section: str) -> str:
     return section.replace("-", " ").replace("_", " ").title()
 
 
-def main() -> int:
-    ap = argparse.ArgumentParser(description="Generate an mdBook source tree for the GM repo.")
-    ap.add_argument("--root", required=True, help="Repo root directory.")
-    ap.add_argument("--items-dir", required=True, help="Items directory (e.g., ./items).")
-    ap.add_argument("--out-src", required=True, help="Output directory for mdBook sources.")
-    ap.add_argument("--title", required=True, help="Book title.")
-    args = ap.parse_args()
-
-    root = Path(args.root).resolve()
-    items_dir = Path(args.items_dir).resolve()
-    out_src = Path(args.out_src).resolve()
-    src_dir = out_src / "src"
-
-    if out_src.exists():
-        shutil.rmtree(out_src)
-    src_dir.mkdir(parents=True, exist_ok=True)
-
-    book_toml = "\n".join(
+def _book_toml(title: str) -> str:
+    return "\n".join(
         [
             "[book]",
-            f'title = "{args.title}"',
+            f'title = "{title}"',
             "authors = []",
             "language = \"en\"",
             "",
@@ -91,20 +80,33 @@ def main() -> int:
             "",
         ]
     )
-    _write_text(out_src / "book.toml", book_toml)
 
-    files = sorted(items_dir.rglob("*.md"))
 
-    pages: list[tuple[str, str, str]] = []
-    for f in files:
+@dataclass(frozen=True)
+class Page:
+    rel: str
+    title: str
+    text: str
+    type: str = ""
+    plain: str = ""  # title and body without markers, for similarity
+
+
+def _render_pages(root: Path, items_dir: Path) -> list[Page]:
+    pages: list[Page] = []
+    errors: list[str] = []
+    for f in corpus.markdown_files(items_dir):
         rel = f.relative_to(root).as_posix()
-        dest = src_dir / rel
 
         raw = _read_text(f)
         front, body = _strip_frontmatter(raw)
         title = _extract_title(front, body, fallback=f.stem)
-        body = _strip_first_h1(body)
-        body = _render_gm_body(body)
+        m_type = re.search(r"^type:\s*(.+)\s*$", front, re.M)
+        try:
+            blocks = corpus.tokenize(body, source=rel, line_offset=line_offset_of(raw, body))
+        except MarkerError as exc:
+            errors.append(str(exc))
+            continue
+        body = _strip_first_h1(_render_gm_body(blocks))
 
         page = "\n".join(
             [
@@ -117,54 +119,264 @@ def main() -> int:
             ]
         ).rstrip() + "\n"
 
-        _write_text(dest, page)
+        pages.append(
+            Page(
+                rel=rel,
+                title=title,
+                text=page,
+                type=m_type.group(1).strip() if m_type else "",
+                plain="\n".join([title, *(block.text for block in blocks)]),
+            )
+        )
 
-        parts = rel.split("/")
-        section = "Misc"
-        if len(parts) >= 2 and parts[0] == "items":
-            section = parts[1]
-        pages.append((section, rel, title))
+    if errors:
+        for err in errors:
+            print(f"ERROR: {err}", file=sys.stderr)
+        raise SystemExit(f"Invalid visibility markers in {len(errors)} file(s).")
+    return pages
 
-    _write_text(
-        src_dir / "index.md",
-        "\n".join(
-            [
-                f"# {args.title}",
+
+# Appends a "Related" list (TF-IDF cosine over title and body) to every page. Cross-shard
+# links are rewritten afterwards like any other link in the page.
+def _with_related(pages: list[Page], k: int, cache_path: Path) -> list[Page]:
+    related = related_pages({p.rel: p.plain for p in pages}, k=k, cache_path=cache_path)
+    titles = {p.rel: p.title for p in pages}
+    out: list[Page] = []
+    for page in pages:
+        section = related_section(page.rel, related[page.rel], titles)
+        out.append(replace(page, text=f"{page.text}\n{section}") if section else page)
+    return out
+
+
+def _md_link(from_rel: str, target: str, label: str) -> str:
+    return f"[{label}]({posixpath.relpath(target, posixpath.dirname(from_rel) or '.')})"
+
+
+# Directory index pages live under sections/ (items/people/npcs/ -> sections/people/npcs.md,
+# continuation pages sections/people/npcs.2.md); the root index is the book's index.md.
+def _section_page(path: str, key: str) -> str:
+    if not path:
+        return f"sections/index.{key}.md" if key else "index.md"
+    return f"sections/{path}.{key}.md" if key else f"sections/{path}.md"
+
+
+@dataclass(frozen=True)
+class IndexOptions:
+    page_size: int = DEFAULT_PAGE_SIZE
+    group_by: str = "title"
+    cache_dir: Path | None = None
+
+
+def _index_pages(tree: OutputTree, options: IndexOptions, page_path=_section_page) -> IndexPages:
+    return IndexPages(
+        tree,
+        page_path=page_path,
+        link=_md_link,
+        page_size=options.page_size,
+        group_by=options.group_by,
+        cache_dir=options.cache_dir,
+    )
+
+
+def _index_tree(pages: list[Page]) -> IndexDir:
+    return build_tree([IndexEntry(rel=p.rel, title=p.title, type=p.type) for p in pages], strip="items/")
+
+
+# SUMMARY.md entries below an index page: its continuation pages, sub-directories
+# (recursively) and its own pages. mdBook only renders pages listed here.
+def _summary_children(index: IndexPages, node: IndexDir, depth: int) -> list[str]:
+    pad = "  " * depth
+    lines = [f"{pad}- [{label}]({path})" for label, path in index.parts[node.path]]
+    for child in sorted(node.dirs.values(), key=lambda d: d.name.casefold()):
+        lines.append(f"{pad}- [{_humanize_section(child.name)}]({index.page_path(child.path, '')})")
+        lines += _summary_children(index, child, depth + 1)
+    lines += [f"{pad}- [{e.title}]({e.rel})" for e in sorted(node.entries, key=lambda e: e.title.lower())]
+    return lines
+
+
+def _write_single_book(
+    tree: OutputTree, out_src: Path, title: str, pages: list[Page], options: IndexOptions = IndexOptions()
+) -> None:
+    src_dir = out_src / "src"
+    tree.write_text(out_src / "book.toml", _book_toml(title))
+
+    for page in pages:
+        tree.write_text(src_dir / page.rel, page.text)
+
+    root = _index_tree(pages)
+    index = _index_pages(tree, options)
+    intro = (
+        "This site is generated from the GM source repo.",
+        "",
+        "Visibility markers are rendered as explicit PUBLIC/PRIVATE sections.",
+        "",
+    )
+    index.write(root, src_dir, title=title, intro=intro)
+    index.save()
+
+    summary_lines: list[str] = ["# Summary", "", "- [Home](index.md)"]
+    summary_lines += [f"  - [{label}]({path})" for label, path in index.parts[root.path]]
+    for section in sorted(root.dirs.values(), key=lambda d: d.name.casefold()):
+        summary_lines.append(f"- [{_humanize_section(section.name)}]({_section_page(section.path, '')})")
+        summary_lines += _summary_children(index, section, 1)
+    summary_lines += [f"- [{e.title}]({e.rel})" for e in sorted(root.entries, key=lambda e: e.title.lower())]
+
+    tree.write_text(src_dir / "SUMMARY.md", "\n".join(summary_lines).rstrip() + "\n")
+
+
+def _shard_of(rel: str) -> str:
+    parts = rel.split("/")
+    if len(parts) > 2 and parts[0] == "items":
+        return parts[1]
+    # Top-level items (e.g. items/_world_state.md) live in the hub book.
+    return HUB_SHARD
+
+
+def _rewrite_cross_shard_links(page: Page, shard: str) -> str:
+    page_dir = posixpath.dirname(page.rel)
+
+    def repl(m: re.Match[str]) -> str:
+        href = m.group("href")
+        if href.startswith(("http://", "https://", "mailto:", "#", "/")):
+            return m.group(0)
+        path, sep, frag = href.partition("#")
+        if not path.endswith(".md"):
+            return m.group(0)
+        target = posixpath.normpath(posixpath.join(page_dir, path))
+        target_shard = _shard_of(target)
+        if target_shard == shard:
+            return m.group(0)
+        # Each shard is built to <site>/<shard>/, so hop out of this book into the other one.
+        new_href = posixpath.relpath(f"{target_shard}/{target[:-3]}.html", start=f"{shard}/{page_dir}")
+        offset = m.start("href") - m.start()
+        return m.group(0)[:offset] + new_href + sep + frag + ")"
+
+    return MD_LINK_RE.sub(repl, page.text)
+
+
+# One mdBook per top-level section plus a small hub. Books are written to
+# <out-src>/<shard>/ and are meant to be built to <site>/<shard>/; each book gets a
+# content digest so the build script can skip shards whose sources did not change.
+def _shard_page(path: str, key: str) -> str:
+    # A section's own index is its book's index.md.
+    return "index.md" if path and "/" not in path and not key else _section_page(path, key)
+
+
+def _write_sharded_books(
+    tree: OutputTree, out_src: Path, title: str, pages: list[Page], options: IndexOptions = IndexOptions()
+) -> list[str]:
+    root = _index_tree(pages)
+    index = _index_pages(tree, options, page_path=_shard_page)
+    by_shard: dict[str, list[Page]] = {}
+    for page in pages:
+        by_shard.setdefault(_shard_of(page.rel), []).append(page)
+    by_shard.setdefault(HUB_SHARD, [])
+
+    sections = sorted(s for s in by_shard if s != HUB_SHARD)
+
+    for shard, shard_pages in sorted(by_shard.items()):
+        book_dir = out_src / shard
+        src_dir = book_dir / "src"
+
+        shard_pages = sorted(shard_pages, key=lambda p: p.title.lower())
+        for page in shard_pages:
+            tree.write_text(src_dir / page.rel, _rewrite_cross_shard_links(page, shard))
+
+        summary_lines = ["# Summary", "", "- [Home](index.md)"]
+        if shard == HUB_SHARD:
+            book_title = title
+            index_lines = [
+                f"# {title}",
                 "",
                 "This site is generated from the GM source repo.",
                 "",
                 "Visibility markers are rendered as explicit PUBLIC/PRIVATE sections.",
                 "",
+                "## Sections",
+                "",
             ]
-        ),
-    )
+            index_lines += [
+                f"- [{_humanize_section(s)}](../{s}/index.html) ({len(by_shard[s])} pages)" for s in sections
+            ]
+            index_lines.append("")
+            if shard_pages:
+                index_lines += ["## Top-level pages", ""]
+                index_lines += [f"- [{p.title}]({p.rel})" for p in shard_pages]
+                index_lines.append("")
+            tree.write_text(src_dir / "index.md", "\n".join(index_lines))
+            summary_lines += [f"  - [{p.title}]({p.rel})" for p in shard_pages]
+        else:
+            book_title = f"{title}: {_humanize_section(shard)}"
+            node = root.dirs[shard]
+            index.write(node, src_dir, up=("All sections", f"../{HUB_SHARD}/index.html"))
+            summary_lines += _summary_children(index, node, 1)
 
-    summary_lines: list[str] = ["# Summary", "", "- [Home](index.md)"]
+        tree.write_text(book_dir / "book.toml", _book_toml(book_title))
+        tree.write_text(src_dir / "SUMMARY.md", "\n".join(summary_lines) + "\n")
 
-    by_section: dict[str, list[tuple[str, str]]] = {}
-    for section, rel, title in pages:
-        by_section.setdefault(section, []).append((rel, title))
+        tree.write_text(book_dir / DIGEST_FILE, tree.digest(book_dir) + "\n")
 
-    sections_dir = src_dir / "sections"
-    for section in sorted(by_section.keys()):
-        section_title = _humanize_section(section)
-        section_page = f"sections/{section}.md"
-        summary_lines.append(f"- [{section_title}]({section_page})")
+    index.save()
+    return sorted(by_shard)
 
-        items = sorted(by_section[section], key=lambda t: t[1].lower())
-        for rel, title in items:
-            summary_lines.append(f"  - [{title}]({rel})")
 
-        section_md = "\n".join(
-            [f"# {section_title}", "", "## Pages", ""]
-            + [f"- [{title}](../{rel})" for rel, title in items]
-            + [""]
-        )
-        _write_text(sections_dir / f"{section}.md", section_md)
+def main() -> int:
+    forwarded = forward("generate_mdbook")
+    if forwarded is not None:
+        return forwarded
+
+    ap = argparse.ArgumentParser(description="Generate an mdBook source tree for the GM repo.")
+    ap.add_argument("--root", required=True, help="Repo root directory.")
+    ap.add_argument("--items-dir", required=True, help="Items directory (e.g., ./items).")
+    ap.add_argument("--out-src", required=True, help="Output directory for mdBook sources.")
+    ap.add_argument("--title", required=True, help="Book title.")
+    ap.add_argument(
+        "--shard-by-section",
+        action="store_true",
+        help=f"Write one book per items/<section>/ plus a '{HUB_SHARD}' book linking them.",
+    )
+    ap.add_argument(
+        "--related",
+        type=int,
+        default=DEFAULT_RELATED,
+        help=f"Related pages listed at the end of each page (default: {DEFAULT_RELATED}; 0 disables).",
+    )
+    ap.add_argument(
+        "--index-page-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help=f"Pages listed per section index page before it is split (default: {DEFAULT_PAGE_SIZE}).",
+    )
+    ap.add_argument(
+        "--index-group-by",
+        choices=GROUP_BY,
+        default="title",
+        help="Paginate section indexes alphabetically by title, or one index page per `type:` (default: title).",
+    )
+    args = ap.parse_args()
 
-    _write_text(src_dir / "SUMMARY.md", "\n".join(summary_lines).rstrip() + "\n")
+    root = Path(args.root).resolve()
+    items_dir = Path(args.items_dir).resolve()
+    out_src = Path(args.out_src).resolve()
+
+    pages = _render_pages(root, items_dir)
+    if args.related > 0:
+        pages = _with_related(pages, args.related, root / ".cache" / "related-pages.pickle")
+    options = IndexOptions(
+        page_size=args.index_page_size, group_by=args.index_group_by, cache_dir=root / ".cache" / "index-pages"
+    )
 
-    print(f"Wrote mdBook sources: {out_src}")
+    # Updated in place: unchanged pages keep their bytes and mtime, and files from a
+    # previous run that this one did not produce are removed.
+    tree = OutputTree(out_src)
+    if args.shard_by_section:
+        shards = _write_sharded_books(tree, out_src, args.title, pages, options)
+        tree.write_text(out_src / "shards.txt", "\n".join(shards) + "\n")
+    else:
+        _write_single_book(tree, out_src, args.title, pages, options)
+    tree.prune()
+
+    print(f"Wrote mdBook sources: {out_src} ({tree.changed} file(s) changed)")
     return 0
 
 
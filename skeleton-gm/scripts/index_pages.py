@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import posixpath
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from stable_output import OutputTree
+
+
+DEFAULT_PAGE_SIZE = 200
+GROUP_BY = ("title", "type")
+# Bump when the rendered layout changes so cached signatures stop matching.
+INDEX_VERSION = 1
+
+TITLE_RE = re.compile(r"^title:\s*(?P<value>.+?)\s*$", re.M)
+TYPE_RE = re.compile(r"^type:\s*(?P<value>.+?)\s*$", re.M)
+H1_RE = re.compile(r"^#\s+(?P<value>.+?)\s*$", re.M)
+FRONT_MATTER_RE = re.compile(r"^---\s*\n(.*?)\n---\s*\n", re.S)
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    rel: str  # indexed file, relative to the output root
+    title: str
+    type: str = ""
+
+
+@dataclass
+class IndexDir:
+    path: str  # relative to the indexed root; "" for the root itself
+    dirs: dict[str, "IndexDir"] = field(default_factory=dict)
+    entries: list[IndexEntry] = field(default_factory=list)
+    count: int = 0  # entries in this directory and below
+
+    @property
+    def name(self) -> str:
+        return posixpath.basename(self.path)
+
+
+# `strip` is a leading path (e.g. "items/") that is not a directory level of its own.
+def build_tree(entries: list[IndexEntry], strip: str = "") -> IndexDir:
+    root = IndexDir("")
+    for entry in entries:
+        rel = entry.rel[len(strip) :] if strip and entry.rel.startswith(strip) else entry.rel
+        node = root
+        node.count += 1
+        parent = posixpath.dirname(rel)
+        for part in parent.split("/") if parent else []:
+            node = node.dirs.setdefault(part, IndexDir(posixpath.join(node.path, part)))
+            node.count += 1
+        node.entries.append(entry)
+    return root
+
+
+def describe(text: str, fallback: str) -> tuple[str, str]:
+    # (title, type) of a Markdown file: front matter first, then the first H1.
+    m = FRONT_MATTER_RE.match(text)
+    front = m.group(1) if m else ""
+    m_title = TITLE_RE.search(front)
+    m_type = TYPE_RE.search(front)
+    title = m_title.group("value").strip("\"'") if m_title else ""
+    if not title:
+        m_h1 = H1_RE.search(text[m.end() :] if m else text)
+        title = m_h1.group("value") if m_h1 else fallback
+    return title, m_type.group("value").strip("\"'") if m_type else ""
+
+
+def humanize(name: str) -> str:
+    return name.replace("-", " ").replace("_", " ").title()
+
+
+@dataclass(frozen=True)
+class Part:
+    key: str  # "" for a directory's first page
+    label: str
+    entries: tuple[IndexEntry, ...]
+
+
+def _guide(title: str, neighbour: str | None) -> str:
+    # Shortest prefix of `title` that `neighbour` does not share, like dictionary guide words.
+    if neighbour is None:
+        return title[:1].upper()
+    a, b = title.casefold(), neighbour.casefold()
+    n = 0
+    while n < len(a) and n < len(b) and a[n] == b[n]:
+        n += 1
+    return title[: n + 1].strip()
+
+
+def _labels(chunks: list[list[IndexEntry]]) -> list[str]:
+    labels = []
+    for n, chunk in enumerate(chunks):
+        if not chunk:
+            labels.append("")
+            continue
+        before = chunks[n - 1][-1].title if n > 0 else None
+        after = chunks[n + 1][0].title if n + 1 < len(chunks) else None
+        first, last = _guide(chunk[0].title, before), _guide(chunk[-1].title, after)
+        labels.append(first if first == last else f"{first}–{last}")
+    return labels
+
+
+def _chunks(entries: list[IndexEntry], page_size: int) -> list[list[IndexEntry]]:
+    return [entries[i : i + page_size] for i in range(0, len(entries), page_size)] or [[]]
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-") or "untyped"
+
+
+# Pages of a directory's own entries. By title: alphabetical runs of `page_size`,
+# labelled by their first and last titles. By type: the first page lists the types,
+# and each type gets its own (alphabetical, paginated) pages.
+def paginate(entries: list[IndexEntry], page_size: int, group_by: str) -> list[Part]:
+    ordered = sorted(entries, key=lambda e: (e.title.casefold(), e.rel))
+    if group_by != "type":
+        chunks = _chunks(ordered, page_size)
+        return [
+            Part(key="" if n == 0 else str(n + 1), label=label, entries=tuple(chunk))
+            for n, (chunk, label) in enumerate(zip(chunks, _labels(chunks)))
+        ]
+    by_type: dict[str, list[IndexEntry]] = {}
+    for entry in ordered:
+        by_type.setdefault(entry.type or "untyped", []).append(entry)
+    parts = [Part(key="", label="", entries=())]
+    for type_name in sorted(by_type):
+        chunks = _chunks(by_type[type_name], page_size)
+        for n, chunk in enumerate(chunks):
+            label = type_name if len(chunks) == 1 else f"{type_name} ({n + 1}/{len(chunks)})"
+            key = f"type-{_slug(type_name)}" + ("" if n == 0 else f"-{n + 1}")
+            parts.append(Part(key=key, label=label, entries=tuple(chunk)))
+    return parts
+
+
+# Writes one set of index pages per directory level: sub-directories with their
+# entry counts, then the directory's own entries, paginated. Where pages go and how
+# links are spelled (wikilinks, relative Markdown) is up to the caller.
+#
+# Each page's inputs are hashed; when the hash matches the last build and the file is
+# still there, the page is kept without being rendered, so an edit only regenerates
+# the indexes along its own directory path.
+class IndexPages:
+    def __init__(
+        self,
+        tree: OutputTree,
+        *,
+        page_path: Callable[[str, str], str],
+        link: Callable[[str, str, str], str],
+        page_size: int = DEFAULT_PAGE_SIZE,
+        group_by: str = "title",
+        cache_dir: Path | None = None,
+    ) -> None:
+        self.tree = tree
+        self.page_path = page_path
+        self.link = link
+        self.page_size = max(1, page_size)
+        self.group_by = group_by
+        self.parts: dict[str, list[tuple[str, str]]] = {}
+        self.regenerated = 0
+        self.cache_path = None
+        if cache_dir is not None:
+            key = hashlib.sha1(tree.root.resolve().as_posix().encode("utf-8")).hexdigest()[:12]
+            self.cache_path = cache_dir / f"{key}.json"
+        self.cached, self.cached_titles = self._load()
+        self.seen: dict[str, list] = {}
+        self.titles: dict[str, list[str]] = {}
+
+    def _load(self) -> tuple[dict[str, list], dict[str, list[str]]]:
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}, {}
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}, {}
+        if data.get("version") != INDEX_VERSION:
+            return {}, {}
+        return data.get("pages", {}), data.get("titles", {})
+
+    def save(self) -> None:
+        if self.cache_path is None or (self.seen == self.cached and self.titles == self.cached_titles):
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+        payload = {"version": INDEX_VERSION, "pages": self.seen, "titles": self.titles}
+        tmp.write_text(json.dumps(payload, sort_keys=True) + "\n", encoding="utf-8")
+        tmp.replace(self.cache_path)
+
+    # Entry for a file this run wrote to the tree; (title, type) is cached by content
+    # hash, so unchanged files are not read again.
+    def entry(self, path: Path, rel: str) -> IndexEntry:
+        digest = self.tree.digests.get(path.resolve())
+        known = self.cached_titles.get(digest) if digest else None
+        if known is None:
+            known = list(describe(path.read_text(encoding="utf-8", errors="replace"), path.stem))
+        if digest:
+            self.titles[digest] = known
+        return IndexEntry(rel=rel, title=known[0], type=known[1])
+
+    def _emit(self, path: Path, signature: list, render: Callable[[], list[str]]) -> None:
+        key = path.relative_to(self.tree.root).as_posix()
+        sig = hashlib.sha256(json.dumps(signature, ensure_ascii=False).encode("utf-8")).hexdigest()
+        cached = self.cached.get(key)
+        if cached and cached[0] == sig and path.is_file() and path.stat().st_size == cached[2]:
+            self.tree.keep(path, cached[1])
+            self.seen[key] = cached
+            return
+        data = ("\n".join(render()) + "\n").encode("utf-8")
+        self.tree.write_bytes(path, data)
+        self.seen[key] = [sig, hashlib.sha256(data).hexdigest(), len(data)]
+        self.regenerated += 1
+
+    # Writes the pages of `node` and everything below it under `base` (page paths and
+    # link targets are relative to it). `up` is (label, target) for the first page's
+    # parent link; `intro` lines go under the first page's heading.
+    def write(
+        self,
+        node: IndexDir,
+        base: Path,
+        *,
+        title: str | None = None,
+        up: tuple[str, str] | None = None,
+        intro: tuple[str, ...] = (),
+    ) -> None:
+        title = title or humanize(node.name)
+        first = self.page_path(node.path, "")
+        parts = paginate(node.entries, self.page_size, self.group_by)
+        folders = sorted(node.dirs.values(), key=lambda d: d.name.casefold())
+        nav = [(p.key, p.label) for p in parts if p.label] if len(parts) > 1 else []
+        self.parts[node.path] = [(p.label, self.page_path(node.path, p.key)) for p in parts if p.key]
+
+        for part in parts:
+            rel = self.page_path(node.path, part.key)
+            heading = title if not part.key else f"{title}: {part.label}"
+            back = (title, first) if part.key else up
+            signature = [
+                heading,
+                list(intro) if not part.key else [],
+                list(back) if back else None,
+                [(d.name, d.count) for d in folders] if not part.key else [],
+                nav,
+                part.key,
+                [(e.rel, e.title, e.type) for e in part.entries],
+            ]
+            if self.group_by == "type" and not part.key:
+                signature.append([(p.label, len(p.entries)) for p in parts if p.key])
+
+            def render(part: Part = part, rel: str = rel, heading: str = heading, back=back) -> list[str]:
+                return self._render(node, part, parts, rel, heading, back, intro, folders, nav)
+
+            self._emit(base / rel, signature, render)
+
+        for child in folders:
+            self.write(child, base, up=(title, first))
+
+    def _render(
+        self,
+        node: IndexDir,
+        part: Part,
+        parts: list[Part],
+        rel: str,
+        heading: str,
+        back: tuple[str, str] | None,
+        intro: tuple[str, ...],
+        folders: list[IndexDir],
+        nav: list[tuple[str, str]],
+    ) -> list[str]:
+        lines = [f"# {heading}", ""]
+        if back:
+            lines += [f"Up: {self.link(rel, back[1], back[0])}", ""]
+        if not part.key:
+            lines += list(intro)
+            if folders:
+                lines += ["## Folders", ""]
+                lines += [
+                    f"- {self.link(rel, self.page_path(d.path, ''), humanize(d.name))} ({d.count})" for d in folders
+                ]
+                lines.append("")
+            if self.group_by == "type" and len(parts) > 1:
+                lines += ["## Types", ""]
+                lines += [
+                    f"- {self.link(rel, self.page_path(node.path, p.key), p.label)} ({len(p.entries)})"
+                    for p in parts
+                    if p.key
+                ]
+                lines.append("")
+        if part.entries:
+            lines += ["## Pages", ""]
+            if nav and self.group_by == "title":
+                lines += [
+                    " · ".join(
+                        f"**{label}**" if key == part.key else self.link(rel, self.page_path(node.path, key), label)
+                        for key, label in nav
+                    ),
+                    "",
+                ]
+            lines += [f"- {self.link(rel, e.rel, e.title)}" for e in part.entries]
+            lines.append("")
+        return lines
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import io
+import json
+import os
+import re
+import sys
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import IO, Iterator
+
+from ingest_ledger import DEFAULT_CACHE, DEFAULT_LEDGER, Ledger
+from visibility import escape_markers
+
+
+CHUNK_SIZE = 1 << 20
+STATE_FILE = ".conversations.json"
+
+ROLE_HEADINGS = {"user": "User", "assistant": "Assistant", "tool": "Tool"}
+
+
+def _slugify(value: str) -> str:
+    value = value.strip().lower()
+    value = re.sub(r"[^\w\s-]", "", value, flags=re.UNICODE)
+    value = re.sub(r"[\s_-]+", "-", value)
+    return value.strip("-") or "conversation"
+
+
+def _iso(ts: object) -> str:
+    if not isinstance(ts, (int, float)):
+        return ""
+    return dt.datetime.fromtimestamp(ts, dt.timezone.utc).replace(microsecond=0).isoformat()
+
+
+# Yields the elements of a top-level JSON array one at a time, so the export is never
+# held in memory whole. Only the element being decoded (plus one chunk) is buffered.
+def iter_json_array(fh: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[object]:
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+
+    def fill(min_size: int) -> bool:
+        nonlocal buf, pos, eof
+        buf = buf[pos:]
+        pos = 0
+        while not eof and len(buf) < min_size:
+            chunk = fh.read(max(chunk_size, min_size - len(buf)))
+            if not chunk:
+                eof = True
+            buf += chunk
+        return bool(buf)
+
+    while True:
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                if buf[pos] == "," and not started:
+                    raise ValueError("Expected '[' at start of conversations export")
+                pos += 1
+            if pos < len(buf):
+                break
+            if not fill(1):
+                raise ValueError("Unexpected end of conversations export")
+
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("Expected a JSON array of conversations")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+
+        want = len(buf) - pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Grow geometrically so one huge conversation costs O(n), not O(n^2).
+                want = max(want * 2, chunk_size)
+                fill(want)
+        pos = end
+        yield value
+
+
+def active_branch(conversation: dict) -> list[dict]:
+    mapping = conversation.get("mapping") or {}
+    node_id = conversation.get("current_node")
+    if node_id not in mapping:
+        # Older exports lack current_node: follow the last child from the root.
+        roots = [k for k, n in mapping.items() if not n.get("parent")]
+        node_id = roots[0] if roots else None
+        while node_id and mapping[node_id].get("children"):
+            node_id = mapping[node_id]["children"][-1]
+
+    path: list[dict] = []
+    seen: set[str] = set()
+    while node_id and node_id in mapping and node_id not in seen:
+        seen.add(node_id)
+        node = mapping[node_id]
+        if node.get("message"):
+            path.append(node["message"])
+        node_id = node.get("parent")
+    path.reverse()
+    return path
+
+
+def message_text(message: dict) -> str:
+    content = message.get("content") or {}
+    parts: list[str] = []
+    for part in content.get("parts") or []:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict):
+            if part.get("content_type") == "image_asset_pointer":
+                parts.append(f"_[image: {part.get('asset_pointer', 'attachment')}]_")
+            elif isinstance(part.get("text"), str):
+                parts.append(part["text"])
+    if not parts and isinstance(content.get("text"), str):
+        text = content["text"]
+        parts.append(f"```\n{text}\n```" if content.get("content_type") == "code" else text)
+    return "\n\n".join(p for p in parts if p.strip()).strip()
+
+
+def render_conversation(conversation: dict, source: str) -> str:
+    # One heading line, and no marker the exporter could act on.
+    title = escape_markers(" ".join(str(conversation.get("title") or "").split()) or "Untitled conversation")
+    conv_id = conversation.get("id") or conversation.get("conversation_id") or ""
+    messages = []
+    for message in active_branch(conversation):
+        role = (message.get("author") or {}).get("role", "")
+        if role not in ROLE_HEADINGS or (message.get("metadata") or {}).get("is_visually_hidden_from_conversation"):
+            continue
+        text = message_text(message)
+        if text:
+            messages.append((role, text))
+
+    lines = [f"# {title}", "", "<!-- PRIVATE_START -->"]
+    lines.append(f"Source: `{source}`")
+    lines.append(f"Conversation: `{conv_id}`")
+    lines.append(f"Created (UTC): {_iso(conversation.get('create_time'))}")
+    lines.append(f"Updated (UTC): {_iso(conversation.get('update_time'))}")
+    lines.append(f"Messages: {len(messages)}")
+    lines.append("")
+    for role, text in messages:
+        lines.append(f"## {ROLE_HEADINGS[role]}")
+        lines.append("")
+        lines.append(escape_markers(text))
+        lines.append("")
+    lines.append("<!-- PRIVATE_END -->")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def output_name(conversation: dict) -> str:
+    conv_id = str(conversation.get("id") or conversation.get("conversation_id") or "")
+    return f"{_slugify(conversation.get('title') or '')}-{conv_id[:8] or 'noid'}.md"
+
+
+def write_conversation(conversation: dict, out_dir: str, source: str) -> str:
+    name = output_name(conversation)
+    path = Path(out_dir) / name
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(render_conversation(conversation, source), encoding="utf-8")
+    tmp.replace(path)
+    return name
+
+
+def open_export(path: Path) -> IO[str]:
+    if path.suffix.lower() == ".zip":
+        archive = zipfile.ZipFile(path)
+        member = next((n for n in archive.namelist() if n.rsplit("/", 1)[-1] == "conversations.json"), None)
+        if member is None:
+            raise SystemExit(f"No conversations.json in {path.as_posix()}")
+        return io.TextIOWrapper(archive.open(member), encoding="utf-8")
+    return path.open(encoding="utf-8")
+
+
+def load_state(out_dir: Path) -> dict[str, dict]:
+    try:
+        return json.loads((out_dir / STATE_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(out_dir: Path, state: dict[str, dict]) -> None:
+    tmp = out_dir / f"{STATE_FILE}.tmp"
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    tmp.replace(out_dir / STATE_FILE)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Convert a ChatGPT account export (conversations.json or the export .zip) to PRIVATE markdown."
+    )
+    parser.add_argument("export", help="Path to conversations.json or the account export .zip.")
+    parser.add_argument(
+        "--out-dir",
+        default="references/parsed",
+        help="Output directory (default: references/parsed).",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes (default: CPU count).",
+    )
+    parser.add_argument("--force", action="store_true", help="Rewrite conversations even if already ingested.")
+    parser.add_argument(
+        "--skip-ingested",
+        action="store_true",
+        help=f"Leave conversations alone once their file is recorded in {DEFAULT_LEDGER}, even if updated.",
+    )
+    args = parser.parse_args()
+
+    export = Path(args.export)
+    if not export.exists():
+        raise SystemExit(f"Export not found: {export.as_posix()}")
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    source = export.as_posix()
+
+    state = {} if args.force else load_state(out_dir)
+    ledger = Ledger(Path(DEFAULT_LEDGER), cache_path=Path(DEFAULT_CACHE)) if args.skip_ingested else None
+    written = skipped = recorded = 0
+    in_flight: dict[Future, tuple[str, object, str | None]] = {}
+
+    def collect(done: set[Future]) -> None:
+        nonlocal written
+        for fut in done:
+            conv_id, update_time, previous = in_flight.pop(fut)
+            name = fut.result()
+            if previous and previous != name:
+                # Renamed conversation: drop the file written under the old title.
+                (out_dir / previous).unlink(missing_ok=True)
+            if conv_id:
+                state[conv_id] = {"update_time": update_time, "file": name}
+            written += 1
+            print((out_dir / name).as_posix())
+
+    with open_export(export) as fh, ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        for conversation in iter_json_array(fh):
+            if not isinstance(conversation, dict):
+                continue
+            conv_id = str(conversation.get("id") or conversation.get("conversation_id") or "")
+            update_time = conversation.get("update_time")
+            seen = state.get(conv_id)
+            if (
+                conv_id
+                and seen
+                and seen.get("update_time") == update_time
+                and (out_dir / seen.get("file", "")).is_file()
+            ):
+                skipped += 1
+                continue
+            name = (seen or {}).get("file") or output_name(conversation)
+            if ledger is not None and ledger.is_recorded(out_dir / name):
+                recorded += 1
+                continue
+
+            # Bound the number of decoded conversations waiting on workers.
+            if len(in_flight) >= max(1, args.jobs) * 4:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            fut = pool.submit(write_conversation, conversation, out_dir.as_posix(), source)
+            in_flight[fut] = (conv_id, update_time, (seen or {}).get("file"))
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+
+    save_state(out_dir, state)
+    summary = f"Ingested {written} conversation(s), skipped {skipped} unchanged"
+    if ledger is not None:
+        summary += f" and {recorded} already in the ingest ledger"
+    print(summary + ".", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+DEFAULT_LEDGER = "items/meta/_reference_ingest_log.jsonl"
+DEFAULT_LOG = "items/meta/_reference_ingest_log.md"
+DEFAULT_CACHE = ".cache/ingest-ledger-index.json"
+INDEX_VERSION = 1
+
+# Change kinds in the order the Markdown log lists them.
+KINDS = (("created", "Created"), ("updated", "Updated"), ("idea_box", "Idea box"), ("contradictions", "Contradictions"))
+LABEL_TO_KIND = {label: kind for kind, label in KINDS}
+
+ENTRY_RE = re.compile(r"^### (?P<date>\d{4}-\d{2}-\d{2}(?:, \d{4}-\d{2}-\d{2})*) — `(?P<ref>[^`]+)`\s*$")
+CHANGE_RE = re.compile(r"^- (?P<label>Created|Updated|Idea box|Contradictions): (?P<value>.+?)\s*$")
+PRIVATE_END = "<!-- PRIVATE_END -->"
+
+
+def file_sha256(path: Path) -> str | None:
+    if not path.is_file():
+        return None
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _norm(path: str) -> str:
+    path = path.strip().strip("`")
+    while path.startswith("./"):
+        path = path[2:]
+    return path
+
+
+# --- Index --------------------------------------------------------------------------
+
+
+# Byte offsets of events, keyed by reference path, reference hash and touched item.
+# The ledger is append-only, so the cached index is extended from its last offset and
+# only rebuilt when the bytes it ends on no longer match (the file was rewritten).
+@dataclass
+class LedgerIndex:
+    offset: int = 0
+    tail: str = ""
+    references: dict[str, list[int]] = field(default_factory=dict)
+    hashes: dict[str, list[int]] = field(default_factory=dict)
+    items: dict[str, list[int]] = field(default_factory=dict)
+
+    def add(self, pos: int, event: dict) -> None:
+        self.references.setdefault(event["reference"], []).append(pos)
+        if event.get("sha256"):
+            self.hashes.setdefault(event["sha256"], []).append(pos)
+        for kind in ("created", "updated", "idea_box"):
+            for item in event.get(kind, []):
+                positions = self.items.setdefault(item, [])
+                if not positions or positions[-1] != pos:
+                    positions.append(pos)
+
+
+class Ledger:
+    def __init__(self, path: Path, *, cache_path: Path | None = None) -> None:
+        self.path = path
+        self.cache_path = cache_path
+        self.index = self._load_index()
+
+    def _load_index(self) -> LedgerIndex:
+        index = LedgerIndex()
+        if self.cache_path is not None and self.cache_path.exists():
+            try:
+                data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                data = {}
+            if data.get("version") == INDEX_VERSION and data.get("ledger") == self.path.as_posix():
+                cached = LedgerIndex(
+                    offset=data["offset"],
+                    tail=data["tail"],
+                    references=data["references"],
+                    hashes=data["hashes"],
+                    items=data["items"],
+                )
+                if self._tail_matches(cached):
+                    index = cached
+
+        if not self.path.exists():
+            return LedgerIndex()
+        start = index.offset
+        with self.path.open("rb") as fh:
+            fh.seek(start)
+            pos = start
+            for line in fh:
+                if line.endswith(b"\n") and line.strip():
+                    index.add(pos, json.loads(line))
+                    index.tail = hashlib.sha1(line).hexdigest()
+                elif not line.endswith(b"\n"):
+                    break  # partial write; picked up once the line is complete
+                pos += len(line)
+            index.offset = pos
+        if self.cache_path is not None and index.offset != start:
+            self._save_index(index)
+        return index
+
+    def _tail_matches(self, index: LedgerIndex) -> bool:
+        if index.offset == 0:
+            return True
+        try:
+            size = self.path.stat().st_size
+        except OSError:
+            return False
+        if size < index.offset:
+            return False
+        with self.path.open("rb") as fh:
+            fh.seek(max(0, index.offset - 65536))
+            window = fh.read(index.offset - max(0, index.offset - 65536))
+        last = window[window.rstrip(b"\n").rfind(b"\n") + 1 :]
+        return hashlib.sha1(last).hexdigest() == index.tail
+
+    def _save_index(self, index: LedgerIndex) -> None:
+        assert self.cache_path is not None
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "version": INDEX_VERSION,
+            "ledger": self.path.as_posix(),
+            "offset": index.offset,
+            "tail": index.tail,
+            "references": index.references,
+            "hashes": index.hashes,
+            "items": index.items,
+        }
+        tmp = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(payload), encoding="utf-8")
+        tmp.replace(self.cache_path)
+
+    def _read_at(self, positions: list[int]) -> list[dict]:
+        events = []
+        with self.path.open("rb") as fh:
+            for pos in positions:
+                fh.seek(pos)
+                events.append(json.loads(fh.readline()))
+        return events
+
+    def events(self) -> list[dict]:
+        if not self.path.exists():
+            return []
+        with self.path.open(encoding="utf-8") as fh:
+            return [json.loads(line) for line in fh if line.strip()]
+
+    def for_reference(self, reference: str) -> list[dict]:
+        return self._read_at(self.index.references.get(_norm(reference), []))
+
+    def for_item(self, item: str) -> list[dict]:
+        return self._read_at(self.index.items.get(_norm(item), []))
+
+    # Events per item for many items at once; an event shared by several of them
+    # (one ingest filing many fragments) is read once.
+    def for_items(self, items: list[str]) -> dict[str, list[dict]]:
+        wanted = {item: self.index.items.get(_norm(item), []) for item in items}
+        positions = sorted({pos for found in wanted.values() for pos in found})
+        events = dict(zip(positions, self._read_at(positions))) if positions else {}
+        return {item: [events[pos] for pos in found] for item, found in wanted.items()}
+
+    # A reference counts as ingested when its path was recorded, or when its current
+    # content was recorded under another name.
+    def is_recorded(self, reference: Path) -> bool:
+        if _norm(reference.as_posix()) in self.index.references:
+            return True
+        sha = file_sha256(reference) if self.index.hashes else None
+        return sha is not None and sha in self.index.hashes
+
+    def append(self, event: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(event, ensure_ascii=False, sort_keys=True) + "\n"
+        with self.path.open("a", encoding="utf-8") as fh:
+            fh.write(line)
+        self.index = self._load_index()
+
+
+def make_event(
+    reference: str,
+    *,
+    date: str,
+    sha256: str | None,
+    created: list[str],
+    updated: list[str],
+    idea_box: list[str],
+    contradictions: list[str],
+) -> dict:
+    return {
+        "date": date,
+        "reference": _norm(reference),
+        "sha256": sha256,
+        "created": [_norm(p) for p in created],
+        "updated": [_norm(p) for p in updated],
+        "idea_box": [_norm(p) for p in idea_box],
+        "contradictions": [c.strip() for c in contradictions],
+    }
+
+
+# --- Markdown log ---------------------------------------------------------------------
+
+
+def _dedupe(values: list[str]) -> list[str]:
+    return list(dict.fromkeys(values))
+
+
+# One section per reference (in order of first ingest), so a reference processed
+# several times reads as a single entry. Per-event dates stay in the ledger.
+def render_entries(events: list[dict]) -> list[str]:
+    grouped: dict[str, list[dict]] = {}
+    for event in events:
+        grouped.setdefault(event["reference"], []).append(event)
+
+    lines: list[str] = []
+    for reference, group in grouped.items():
+        dates = ", ".join(_dedupe([e["date"] for e in group]))
+        lines.append(f"### {dates} — `{reference}`")
+        for kind, label in KINDS:
+            for value in _dedupe([v for e in group for v in e.get(kind, [])]):
+                lines.append(f"- {label}: {value}" if kind == "contradictions" else f"- {label}: `{value}`")
+        lines.append("")
+    return lines
+
+
+# Keeps the hand-written preamble (front matter, rules, format example) and replaces
+# everything from the first dated entry down to the closing PRIVATE marker.
+def render_log(existing: str, events: list[dict]) -> str:
+    lines = existing.splitlines()
+    cut = next((i for i, line in enumerate(lines) if ENTRY_RE.match(line)), None)
+    if cut is None:
+        cut = next((i for i, line in enumerate(lines) if line.strip() == PRIVATE_END), len(lines))
+    preamble = lines[:cut]
+    while preamble and not preamble[-1].strip():
+        preamble.pop()
+    entries = render_entries(events)
+    while entries and not entries[-1].strip():
+        entries.pop()
+    return "\n".join([*preamble, "", *entries, PRIVATE_END]) + "\n"
+
+
+def write_log(log_path: Path, events: list[dict]) -> bool:
+    existing = log_path.read_text(encoding="utf-8") if log_path.exists() else ""
+    text = render_log(existing, events)
+    if text == existing:
+        return False
+    log_path.write_text(text, encoding="utf-8")
+    return True
+
+
+# Reads entries from a hand-maintained log, for seeding the ledger once.
+def parse_log(text: str) -> list[dict]:
+    events: list[dict] = []
+    current: dict | None = None
+    for line in text.splitlines():
+        m_entry = ENTRY_RE.match(line)
+        if m_entry:
+            current = make_event(
+                m_entry.group("ref"),
+                date=m_entry.group("date").split(", ")[-1],
+                sha256=None,
+                created=[],
+                updated=[],
+                idea_box=[],
+                contradictions=[],
+            )
+            events.append(current)
+            continue
+        m_change = CHANGE_RE.match(line)
+        if m_change and current is not None:
+            kind = LABEL_TO_KIND[m_change.group("label")]
+            value = m_change.group("value")
+            current[kind].append(value.strip() if kind == "contradictions" else _norm(value))
+        elif line.startswith("#") or line.strip() == PRIVATE_END:
+            current = None
+    return events
+
+
+# --- CLI ------------------------------------------------------------------------------
+
+
+def _print_events(events: list[dict], as_json: bool) -> None:
+    for event in events:
+        if as_json:
+            print(json.dumps(event, ensure_ascii=False, sort_keys=True))
+            continue
+        changes = [f"{label.lower()} {v}" for kind, label in KINDS for v in event.get(kind, [])]
+        print(f"{event['date']}  {event['reference']}: {'; '.join(changes) or '(no changes)'}")
+
+
+def cmd_record(args: argparse.Namespace, ledger: Ledger) -> int:
+    reference = Path(_norm(args.reference))
+    missing = [p for p in [*args.created, *args.updated, *args.idea_box] if not Path(_norm(p)).is_file()]
+    if missing and not args.allow_missing:
+        for path in missing:
+            print(f"ERROR: no such item: {path}", file=sys.stderr)
+        return 2
+    event = make_event(
+        reference.as_posix(),
+        date=args.date or dt.date.today().isoformat(),
+        sha256=file_sha256(reference),
+        created=args.created,
+        updated=args.updated,
+        idea_box=args.idea_box,
+        contradictions=args.contradiction,
+    )
+    if not any(event[kind] for kind, _ in KINDS):
+        print("ERROR: nothing to record (pass --created/--updated/--idea-box/--contradiction)", file=sys.stderr)
+        return 2
+    ledger.append(event)
+    if not args.no_render:
+        write_log(Path(args.log), ledger.events())
+    return 0
+
+
+def cmd_query(args: argparse.Namespace, ledger: Ledger) -> int:
+    if args.reference:
+        events = ledger.for_reference(args.reference)
+    else:
+        events = ledger.for_item(args.item)
+    if not events:
+        print("Not recorded.", file=sys.stderr)
+        return 1
+    if args.item and not args.json and not args.events:
+        for reference in _dedupe([e["reference"] for e in events]):
+            print(reference)
+        return 0
+    _print_events(events, args.json)
+    return 0
+
+
+def cmd_pending(args: argparse.Namespace, ledger: Ledger) -> int:
+    roots = [Path(p) for p in args.paths] or [Path("references")]
+    pending = 0
+    for root in roots:
+        files = [root] if root.is_file() else sorted(p for p in root.rglob("*") if p.suffix in {".md", ".pdf"})
+        for path in files:
+            if not ledger.is_recorded(path):
+                print(path.as_posix())
+                pending += 1
+    return 1 if pending else 0
+
+
+def cmd_render(args: argparse.Namespace, ledger: Ledger) -> int:
+    changed = write_log(Path(args.log), ledger.events())
+    print(f"{args.log}: {'updated' if changed else 'unchanged'}", file=sys.stderr)
+    return 0
+
+
+def cmd_import(args: argparse.Namespace, ledger: Ledger) -> int:
+    if ledger.path.exists() and ledger.path.stat().st_size and not args.force:
+        raise SystemExit(f"{ledger.path.as_posix()} already has events; pass --force to replace it")
+    events = parse_log(Path(args.log).read_text(encoding="utf-8"))
+    ledger.path.parent.mkdir(parents=True, exist_ok=True)
+    ledger.path.write_text(
+        "".join(json.dumps(e, ensure_ascii=False, sort_keys=True) + "\n" for e in events), encoding="utf-8"
+    )
+    print(f"Imported {len(events)} event(s) into {ledger.path.as_posix()}", file=sys.stderr)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Append-only ledger of reference ingest events, with provenance lookups and the Markdown log."
+    )
+    parser.add_argument("--ledger", default=DEFAULT_LEDGER, help=f"Ledger path (default: {DEFAULT_LEDGER}).")
+    parser.add_argument("--log", default=DEFAULT_LOG, help=f"Markdown log path (default: {DEFAULT_LOG}).")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help=f"Index cache (default: {DEFAULT_CACHE}).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_record = sub.add_parser("record", help="Append an ingest event and regenerate the Markdown log.")
+    p_record.add_argument("reference", help="Reference file that was processed (e.g. references/parsed/x.md).")
+    p_record.add_argument("--created", action="append", default=[], metavar="ITEM")
+    p_record.add_argument("--updated", action="append", default=[], metavar="ITEM")
+    p_record.add_argument("--idea-box", action="append", default=[], metavar="FILE")
+    p_record.add_argument("--contradiction", action="append", default=[], metavar="TEXT")
+    p_record.add_argument("--date", default="", help="Event date, YYYY-MM-DD (default: today).")
+    p_record.add_argument("--allow-missing", action="store_true", help="Record item paths that don't exist yet.")
+    p_record.add_argument("--no-render", action="store_true", help="Don't regenerate the Markdown log.")
+    p_record.set_defaults(func=cmd_record)
+
+    p_query = sub.add_parser("query", help="Show provenance for a reference or an item.")
+    target = p_query.add_mutually_exclusive_group(required=True)
+    target.add_argument("--reference", help="List what this reference fed.")
+    target.add_argument("--item", help="List the references that fed this item.")
+    p_query.add_argument("--events", action="store_true", help="With --item, print full events.")
+    p_query.add_argument("--json", action="store_true", help="Print events as JSON lines.")
+    p_query.set_defaults(func=cmd_query)
+
+    p_pending = sub.add_parser("pending", help="List reference files (.md/.pdf) not yet recorded.")
+    p_pending.add_argument("paths", nargs="*", help="Files or directories (default: references/).")
+    p_pending.set_defaults(func=cmd_pending)
+
+    sub.add_parser("render", help="Regenerate the Markdown log from the ledger.").set_defaults(func=cmd_render)
+
+    p_import = sub.add_parser("import", help="Seed the ledger from the existing Markdown log.")
+    p_import.add_argument("--force", action="store_true", help="Replace a non-empty ledger.")
+    p_import.set_defaults(func=cmd_import)
+
+    args = parser.parse_args()
+    ledger = Ledger(Path(args.ledger), cache_path=Path(args.cache) if args.cache else None)
+    return args.func(args, ledger)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
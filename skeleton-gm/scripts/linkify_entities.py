@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import bisect
+import os
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import corpus
+from aho_corasick import Automaton, fold
+from daemon_client import forward
+from frontmatter import parse_front_matter, split_front_matter
+from visibility import MARKER_RE, PLAIN, PUBLIC, MarkerError, line_offset_of
+
+
+# Spans never rewritten: fenced code, inline code, existing links/images, autolinks,
+# HTML comments (markers) and heading lines. One alternation, so one scan per file.
+SKIP_RE = re.compile(
+    r"(?P<fence>^[ \t]*(?P<fmark>```|~~~)[^\n]*\n.*?(?:^[ \t]*(?P=fmark)[^\n]*$|\Z))"
+    r"|(?P<code>`+)[^`\n]+?(?P=code)"
+    r"|(?P<link>!?\[[^\]\n]*\]\((?P<href>[^)\s]*)[^)\n]*\))"
+    r"|<[a-z][a-z0-9+.-]*:[^>\s]*>"
+    r"|<!--.*?-->"
+    r"|(?P<heading>^[ \t]{0,3}#{1,6}[ \t][^\n]*$)",
+    re.M | re.S | re.I,
+)
+# Directories under items/ that are tooling notes, not campaign entities.
+SKIP_DIRS = {"meta"}
+
+
+@dataclass(frozen=True)
+class Entity:
+    path: Path  # resolved item path
+    published: bool
+
+
+def is_entity_file(path: Path, root: Path) -> bool:
+    rel = path.relative_to(root)
+    return rel.parts[0] not in SKIP_DIRS and not path.name.startswith("_")
+
+
+def entity_names(meta: dict) -> list[str]:
+    names: list[str] = []
+    title = meta.get("title")
+    if isinstance(title, str):
+        names.append(title)
+    aliases = meta.get("aliases")
+    if isinstance(aliases, list):
+        names += [str(a) for a in aliases if a not in (None, "")]
+    elif aliases not in (None, ""):
+        names.append(str(aliases))
+    return [n for n in (" ".join(n.split()) for n in names) if n]
+
+
+# Maps each folded name to the item it names. Names shared by several items are
+# ambiguous and dropped (returned separately so they can be reported).
+def collect_entities(root: Path, min_length: int) -> tuple[dict[str, Entity], dict[str, list[str]], list[str]]:
+    owners: dict[str, list[Entity]] = {}
+    errors: list[str] = []
+    for path in corpus.markdown_files(root):
+        if not is_entity_file(path, root):
+            continue
+        front, _ = split_front_matter(corpus.read_text(path))
+        if not front.strip():
+            continue
+        try:
+            meta = parse_front_matter(front, source=path.as_posix())
+        except ValueError as exc:
+            errors.append(str(exc))
+            continue
+        entity = Entity(path=path.resolve(), published=meta.get("status") == "published")
+        for name in entity_names(meta):
+            if len(name) < min_length:
+                continue
+            claimed = owners.setdefault(fold(name), [])
+            if entity not in claimed:
+                claimed.append(entity)
+    entities = {name: found[0] for name, found in owners.items() if len(found) == 1}
+    ambiguous = {
+        name: sorted(e.path.relative_to(root.resolve().parent).as_posix() for e in found)
+        for name, found in owners.items()
+        if len(found) > 1
+    }
+    return entities, ambiguous, errors
+
+
+def build_automaton(entities: dict[str, Entity]) -> Automaton[str]:
+    automaton: Automaton[str] = Automaton()
+    for name in sorted(entities):
+        automaton.add(name, name)
+    return automaton.build()
+
+
+def _rel_link(from_file: Path, target: Path) -> str:
+    rel = os.path.relpath(target.as_posix(), start=from_file.parent.as_posix())
+    return rel.replace(os.sep, "/")
+
+
+def _covering(starts: list[int], ends: list[int], start: int, end: int) -> bool:
+    # True if [start, end) overlaps any of the sorted, disjoint spans.
+    i = bisect.bisect_right(starts, start) - 1
+    if i >= 0 and ends[i] > start:
+        return True
+    return i + 1 < len(starts) and starts[i + 1] < end
+
+
+# Links the first mention of each entity per section (text between headings). The
+# body is scanned once by the automaton and once by SKIP_RE; everything else is
+# bisect lookups. PUBLIC text only links to published items, so exported pages never
+# point at files the public repo does not have. Returns None if the text is unchanged.
+def linkify_text(
+    path: Path,
+    text: str,
+    entities: dict[str, Entity],
+    automaton: Automaton[str],
+) -> str | None:
+    front, body = split_front_matter(text)
+    base = len(text) - len(body)
+    here = path.resolve()
+
+    skip_starts: list[int] = []
+    skip_ends: list[int] = []
+    headings: list[int] = []
+    linked: set[tuple[int, Path]] = set()
+    for m in SKIP_RE.finditer(body):
+        skip_starts.append(m.start())
+        skip_ends.append(m.end())
+        if m.group("heading"):
+            headings.append(m.start())
+        elif m.group("link") and m.group("href"):
+            # Already linked in this section: the entity counts as mentioned.
+            href = m.group("href").split("#", 1)[0]
+            if href and "://" not in href:
+                section = bisect.bisect_right(headings, m.start())
+                linked.add((section, (path.parent / href).resolve()))
+
+    # Visibility at an offset: the kind opened by the last marker before it.
+    marks: list[int] = []
+    kinds: list[str] = []
+    for m in MARKER_RE.finditer(body):
+        marks.append(m.start())
+        kinds.append(m.group("kind").lower() if m.group("edge") == "START" else PLAIN)
+
+    # Leftmost-longest, non-overlapping: "Banking Guild Vault" beats "Banking Guild".
+    matches = sorted(automaton.iter(body), key=lambda m: (m.start, m.start - m.end))
+    out: list[str] = []
+    pos = 0
+    for match in matches:
+        if match.start < pos or _covering(skip_starts, skip_ends, match.start, match.end):
+            continue
+        entity = entities[match.value]
+        if entity.path == here:
+            continue
+        k = bisect.bisect_right(marks, match.start) - 1
+        if k >= 0 and kinds[k] == PUBLIC and not entity.published:
+            continue
+        section = bisect.bisect_right(headings, match.start)
+        if (section, entity.path) in linked:
+            continue
+        linked.add((section, entity.path))
+        out.append(body[pos : match.start])
+        out.append(f"[{body[match.start : match.end]}]({_rel_link(path, entity.path)})")
+        pos = match.end
+
+    if not out:
+        return None
+    out.append(body[pos:])
+    return text[:base] + "".join(out)
+
+
+def main() -> int:
+    forwarded = forward("linkify_entities")
+    if forwarded is not None:
+        return forwarded
+
+    parser = argparse.ArgumentParser(
+        description="Link the first mention of each item's title (or `aliases:`) per section in items/*.md."
+    )
+    parser.add_argument(
+        "--root",
+        default="items",
+        help="Directory containing content items (default: items).",
+    )
+    parser.add_argument(
+        "--min-length",
+        type=int,
+        default=4,
+        help="Ignore titles/aliases shorter than this many characters (default: 4).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print files that would change, without writing.",
+    )
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    if not root.exists():
+        raise SystemExit(f"Root not found: {root.as_posix()}")
+
+    entities, ambiguous, errors = collect_entities(root, args.min_length)
+    for err in errors:
+        print(f"ERROR: {err}", file=sys.stderr)
+    for name, paths in sorted(ambiguous.items()):
+        print(f"Skipping ambiguous name \"{name}\": {', '.join(paths)}", file=sys.stderr)
+
+    key = tuple(sorted((name, e.path.as_posix()) for name, e in entities.items()))
+    automaton = corpus.remember("entity-automaton", key, lambda: build_automaton(entities))
+
+    changed: list[Path] = []
+    for md in corpus.markdown_files(root):
+        if not is_entity_file(md, root):
+            continue
+        text = corpus.read_text(md)
+        body = split_front_matter(text)[1]
+        try:
+            # Malformed markers would make the visibility lookup guess; lint reports them.
+            corpus.tokenize(body, source=md.as_posix(), line_offset=line_offset_of(text, body))
+        except MarkerError as exc:
+            print(f"ERROR: {exc}", file=sys.stderr)
+            continue
+        updated = linkify_text(md, text, entities, automaton)
+        if updated is None:
+            continue
+        if not args.dry_run:
+            md.write_text(updated, encoding="utf-8")
+        changed.append(md)
+
+    for p in changed:
+        print(p.as_posix())
+    return 2 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -6,6 +6,9 @@ import os
 import re
 from pathlib import Path
 
+import corpus
+from daemon_client import forward
+
 
 CODE_ITEM_REF_RE = re.compile(r"`(?P<path>items/[A-Za-z0-9_./-]+\.md)`")
 BARE_ITEM_REF_RE = re.compile(
@@ -43,7 +46,7 @@ def _process_line(from_file: Path, line: str) -> str:
 
 
 def linkify_file(path: Path) -> bool:
-    original = path.read_text(encoding="utf-8")
+    original = corpus.read_text(path)
     lines = original.splitlines(keepends=True)
 
     in_front_matter = False
@@ -85,6 +88,10 @@ def linkify_file(path: Path) -> bool:
 
 
 def main() -> int:
+    forwarded = forward("linkify_item_references")
+    if forwarded is not None:
+        return forwarded
+
     parser = argparse.ArgumentParser(
         description="Convert `items/...md` references in items/*.md into relative markdown links."
     )
@@ -105,8 +112,8 @@ def main() -> int:
         raise SystemExit(f"Root not found: {root.as_posix()}")
 
     changed: list[Path] = []
-    for md in sorted(root.rglob("*.md")):
-        original = md.read_text(encoding="utf-8")
+    for md in corpus.markdown_files(root):
+        original = corpus.read_text(md)
         if args.dry_run:
             updated = []
             lines = original.splitlines(keepends=True)
@@ -6,6 +6,9 @@ import os
 import re
 from pathlib import Path
 
+import corpus
+from daemon_client import forward
+
 
 REF_CODE_RE = re.compile(r"(?<!\[)`(?P<path>references/[^`]+)`")
 
@@ -24,7 +27,7 @@ def _linkify(from_file: Path, ref_text: str) -> str | None:
 
 
 def linkify_file(path: Path) -> bool:
-    original = path.read_text(encoding="utf-8")
+    original = corpus.read_text(path)
     lines = original.splitlines(keepends=True)
 
     in_front_matter = False
@@ -87,6 +90,10 @@ def linkify_file(path: Path) -> bool:
 
 
 def main() -> int:
+    forwarded = forward("linkify_reference_sources")
+    if forwarded is not None:
+        return forwarded
+
     parser = argparse.ArgumentParser(
         description="Convert backticked `references/...` paths in items/*.md into relative markdown links."
     )
@@ -107,13 +114,13 @@ def main() -> int:
         raise SystemExit(f"Root not found: {root.as_posix()}")
 
     changed: list[Path] = []
-    for md in sorted(root.rglob("*.md")):
+    for md in corpus.markdown_files(root):
         if args.dry_run:
-            original = md.read_text(encoding="utf-8")
+            original = corpus.read_text(md)
             would_change = REF_CODE_RE.search(original) is not None
             if would_change:
                 # Cheap filter; verify by running full transform in-memory
-                temp = md.read_text(encoding="utf-8")
+                temp = corpus.read_text(md)
                 before = temp
                 # Reuse linkify_file logic by simulating write
                 # (duplicated minimal work to keep dry-run cheap and safe)
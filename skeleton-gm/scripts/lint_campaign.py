@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import re
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import corpus
+from daemon_client import forward
+from frontmatter import parse_front_matter, split_front_matter
+from visibility import MarkerError, line_offset_of, tokenize
+
+
+# Bump when checks change so cached results from older rules are discarded.
+LINT_VERSION = "2"
+DEFAULT_STATUSES = "draft,canon,published"
+# Below this many uncached files, a worker pool costs more to start than it saves.
+POOL_THRESHOLD = 64
+
+ID_RE = re.compile(r"^[a-z0-9][a-z0-9-]*$")
+ITEM_REF_RE = re.compile(r"(?<![\w/])(?P<path>items/\w[\w.-]*(?:/\w[\w.-]*)*\.md)(?![\w/])", re.A)
+MD_LINK_RE = re.compile(r"\]\((?P<href>[^)\s]+\.md)(?:#[^)\s]*)?\)")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+# The ingest log is an audit trail; it legitimately names items that were later renamed.
+REF_CHECK_EXEMPT = {"items/meta/_reference_ingest_log.md"}
+
+
+@dataclass(frozen=True)
+class FileResult:
+    errors: list[tuple[int, str]]
+    item_id: str | None
+    refs: list[tuple[int, str]]
+
+
+def blob_id(data: bytes) -> str:
+    # Same id git uses for the blob, so cache entries are shared between staged and
+    # working-tree runs.
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def check_file(rel: str, text: str, statuses: frozenset[str]) -> FileResult:
+    errors: list[tuple[int, str]] = []
+    front, body = split_front_matter(text)
+    item_id = None
+
+    if not front.strip():
+        errors.append((1, "missing front matter"))
+    else:
+        try:
+            meta = parse_front_matter(front, source=rel)
+        except ValueError as exc:
+            errors.append((_line_of(str(exc)), str(exc).split(": ", 1)[-1]))
+            meta = {}
+        for key in ("id", "type", "status"):
+            value = meta.get(key)
+            if value is None or value == "" or isinstance(value, list):
+                errors.append((1, f"front matter `{key}` is missing or empty"))
+        if meta.get("id") not in (None, "") and not isinstance(meta["id"], list):
+            item_id = str(meta["id"])
+            if not ID_RE.match(item_id):
+                errors.append((1, f"id `{item_id}` must be lowercase letters, digits and hyphens"))
+        status = meta.get("status")
+        if isinstance(status, str) and status and status.lower() not in statuses:
+            errors.append((1, f"status `{status}` is not one of: {', '.join(sorted(statuses))}"))
+
+    try:
+        tokenize(body, source=rel, line_offset=line_offset_of(text, body))
+    except MarkerError as exc:
+        errors.append((_line_of(str(exc)), str(exc).split(": ", 1)[-1]))
+
+    refs: list[tuple[int, str]] = []
+    in_fence = False
+    for n, line in enumerate(text.split("\n"), start=1):
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            continue
+        for m in ITEM_REF_RE.finditer(line):
+            refs.append((n, m.group("path")))
+        for m in MD_LINK_RE.finditer(line):
+            href = m.group("href")
+            if "://" in href or href.startswith("items/"):
+                continue
+            refs.append((n, posixpath.normpath(posixpath.join(posixpath.dirname(rel), href))))
+    return FileResult(errors=errors, item_id=item_id, refs=refs)
+
+
+def _line_of(message: str) -> int:
+    m = re.match(r"^.*?:(\d+):", message)
+    return int(m.group(1)) if m else 1
+
+
+def _check_batch(batch: list[tuple[str, bytes]], statuses: frozenset[str]) -> list[FileResult]:
+    return [check_file(rel, data.decode("utf-8", errors="replace"), statuses) for rel, data in batch]
+
+
+# --- Sources: the git index (pre-commit) or the working tree -----------------------
+
+
+def _git(root: Path, *args: str, stdin: bytes | None = None) -> bytes:
+    return subprocess.run(["git", *args], cwd=root, input=stdin, capture_output=True, check=True).stdout
+
+
+def index_entries(root: Path) -> dict[str, str]:
+    out = _git(root, "ls-files", "-s", "-z", "--", "items")
+    entries: dict[str, str] = {}
+    for record in out.split(b"\0"):
+        if not record:
+            continue
+        meta, _, path = record.partition(b"\t")
+        _, sha, stage = meta.split()
+        if stage in {b"0", b"2"}:
+            entries[path.decode("utf-8")] = sha.decode("ascii")
+    return entries
+
+
+def read_blobs(root: Path, shas: list[str]) -> dict[str, bytes]:
+    if not shas:
+        return {}
+    out = _git(root, "cat-file", "--batch", stdin=("\n".join(shas) + "\n").encode("ascii"))
+    blobs: dict[str, bytes] = {}
+    pos = 0
+    for sha in shas:
+        header_end = out.index(b"\n", pos)
+        size = int(out[pos:header_end].split()[2])
+        blobs[sha] = out[header_end + 1 : header_end + 1 + size]
+        pos = header_end + 1 + size + 1
+    return blobs
+
+
+def worktree_entries(root: Path) -> tuple[dict[str, str], dict[str, bytes]]:
+    entries: dict[str, str] = {}
+    contents: dict[str, bytes] = {}
+    for path in corpus.markdown_files(root / "items"):
+        rel = path.relative_to(root).as_posix()
+        data = corpus.read_bytes(path)
+        entries[rel] = blob_id(data)
+        contents[entries[rel]] = data
+    return entries, contents
+
+
+# --- Cache --------------------------------------------------------------------------
+
+
+def load_cache(path: Path | None) -> dict[str, dict]:
+    if path is None or not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data.get("results", {}) if data.get("version") == LINT_VERSION else {}
+
+
+def save_cache(path: Path, results: dict[str, dict]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"version": LINT_VERSION, "results": results}), encoding="utf-8")
+    tmp.replace(path)
+
+
+def lint(
+    root: Path,
+    *,
+    entries: dict[str, str],
+    targets: list[str],
+    contents: dict[str, bytes] | None,
+    statuses: frozenset[str],
+    cache_path: Path | None,
+    jobs: int,
+) -> list[str]:
+    cache = load_cache(cache_path)
+    # Cache keys include the path: the same content under another path can differ
+    # (relative links) and must report its own file name.
+    keys = {rel: f"{sha}:{rel}:{','.join(sorted(statuses))}" for rel, sha in entries.items()}
+    misses = [rel for rel in entries if keys[rel] not in cache]
+
+    if misses:
+        if contents is None:
+            blobs = read_blobs(root, sorted({entries[rel] for rel in misses}))
+        else:
+            blobs = contents
+        batch = [(rel, blobs[entries[rel]]) for rel in misses]
+        if len(batch) >= POOL_THRESHOLD and jobs > 1:
+            size = max(16, len(batch) // (jobs * 4))
+            chunks = [batch[i : i + size] for i in range(0, len(batch), size)]
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = [r for chunk in pool.map(_check_batch, chunks, [statuses] * len(chunks)) for r in chunk]
+        else:
+            results = _check_batch(batch, statuses)
+        for rel, result in zip(misses, results):
+            cache[keys[rel]] = {"errors": result.errors, "id": result.item_id, "refs": result.refs}
+
+    if cache_path is not None and misses:
+        save_cache(cache_path, {keys[rel]: cache[keys[rel]] for rel in entries})
+
+    ids: dict[str, list[str]] = {}
+    for rel in entries:
+        item_id = cache[keys[rel]]["id"]
+        if item_id:
+            ids.setdefault(item_id, []).append(rel)
+
+    problems: list[str] = []
+    for rel in sorted(targets):
+        if rel not in entries:
+            continue
+        result = cache[keys[rel]]
+        for line, message in result["errors"]:
+            problems.append(f"{rel}:{line}: {message}")
+        if result["id"] and len(ids[result["id"]]) > 1:
+            others = ", ".join(p for p in sorted(ids[result["id"]]) if p != rel)
+            problems.append(f"{rel}:1: duplicate id `{result['id']}` (also in {others})")
+        if rel in REF_CHECK_EXEMPT:
+            continue
+        for line, target in result["refs"]:
+            known = target in entries if target.startswith("items/") else (root / target).exists()
+            if not known:
+                problems.append(f"{rel}:{line}: reference to missing file `{target}`")
+    return problems
+
+
+def main() -> int:
+    forwarded = forward("lint_campaign")
+    if forwarded is not None:
+        return forwarded
+
+    parser = argparse.ArgumentParser(
+        description="Check visibility markers, item front matter, duplicate ids and item references."
+    )
+    parser.add_argument("paths", nargs="*", help="Item files to check (default: all items, or staged with --staged).")
+    parser.add_argument("--root", default=".", help="Repo root directory (default: .).")
+    parser.add_argument(
+        "--staged",
+        action="store_true",
+        help="Check staged item files as they are in the git index (for the pre-commit hook).",
+    )
+    parser.add_argument(
+        "--statuses",
+        default=DEFAULT_STATUSES,
+        help=f"Comma-separated allowed status values (default: {DEFAULT_STATUSES}).",
+    )
+    parser.add_argument(
+        "--cache",
+        default=".cache/lint-campaign.json",
+        help="Result cache path, relative to --root (default: .cache/lint-campaign.json).",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Check every file without reading/writing the cache.")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes for uncached files (default: CPU count).",
+    )
+    args = parser.parse_args()
+
+    root = Path(args.root).resolve()
+    statuses = frozenset(s.strip().lower() for s in args.statuses.split(",") if s.strip())
+    cache_path = None if args.no_cache else root / args.cache
+
+    if args.staged:
+        entries = index_entries(root)
+        contents = None
+        staged = _git(root, "diff", "--cached", "--name-only", "--diff-filter=ACMR", "-z").decode("utf-8")
+        targets = [p for p in staged.split("\0") if p.startswith("items/") and p.endswith(".md")]
+    else:
+        entries, contents = worktree_entries(root)
+        targets = [Path(p).resolve().relative_to(root).as_posix() for p in args.paths] if args.paths else list(entries)
+
+    problems = lint(
+        root,
+        entries=entries,
+        targets=targets,
+        contents=contents,
+        statuses=statuses,
+        cache_path=cache_path,
+        jobs=max(1, args.jobs),
+    )
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    if problems:
+        print(f"Campaign lint: {len(problems)} problem(s).", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
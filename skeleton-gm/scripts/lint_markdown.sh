@@ -8,6 +8,10 @@ if [[ "${SKIP_MD_LINT:-}" == "1" ]]; then
   exit 0
 fi
 
+# Campaign rules (markers, front matter, duplicate ids, item references) on the staged
+# versions of items/ files. Results are cached per blob in .cache/.
+python3 "$REPO_ROOT/scripts/lint_campaign.py" --root "$REPO_ROOT" --staged
+
 if ! command -v markdownlint >/dev/null 2>&1; then
   echo "markdownlint-cli is required. Install with: npm install -g markdownlint-cli" >&2
   exit 1
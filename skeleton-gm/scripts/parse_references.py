@@ -3,13 +3,26 @@ from __future__ import annotations
 
 import argparse
 import datetime as dt
+import json
 import os
 import re
+import sys
 from dataclasses import dataclass
 from pathlib import Path
 
 import fitz  # PyMuPDF
 
+from dedupe_references import DEFAULT_THRESHOLD, DuplicatePair, SketchIndex, build_index, sketch_text
+from ingest_ledger import DEFAULT_CACHE, DEFAULT_LEDGER, Ledger, file_sha256
+from stable_output import (
+    OutputTree,
+    deterministic_default,
+    replace_if_changed,
+    write_bytes_if_changed,
+    write_text_if_changed,
+)
+from visibility import escape_markers
+
 
 def _slugify(value: str) -> str:
     value = value.strip().lower()
@@ -18,13 +31,8 @@ def _slugify(value: str) -> str:
     return value.strip("-") or "document"
 
 
-def _escape_visibility_markers(text: str) -> str:
-    return (
-        text.replace("<!-- PUBLIC_START -->", "&lt;!-- PUBLIC_START --&gt;")
-        .replace("<!-- PUBLIC_END -->", "&lt;!-- PUBLIC_END --&gt;")
-        .replace("<!-- PRIVATE_START -->", "&lt;!-- PRIVATE_START --&gt;")
-        .replace("<!-- PRIVATE_END -->", "&lt;!-- PRIVATE_END --&gt;")
-    )
+# Blocks whose tops are within this many points share a row for reading order.
+ROW_TOLERANCE = 3.0
 
 
 @dataclass(frozen=True)
@@ -34,11 +42,6 @@ class ExtractedImage:
     page_number: int  # 1-based
 
 
-def _write_bytes(path: Path, data: bytes) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_bytes(data)
-
-
 def _extract_images_for_page(
     doc: fitz.Document,
     page: fitz.Page,
@@ -61,7 +64,7 @@ def _extract_images_for_page(
         image_counter[0] += 1
         filename = f"img-{image_counter[0]:03d}.{ext}"
         out_path = assets_dir / filename
-        _write_bytes(out_path, info["image"])
+        write_bytes_if_changed(out_path, info["image"])
 
         already_extracted[xref] = filename
         extracted.append(ExtractedImage(xref=xref, filename=filename, page_number=page_number))
@@ -71,19 +74,155 @@ def _extract_images_for_page(
 def _render_page_if_needed(page: fitz.Page, assets_dir: Path, page_number: int, dpi: int) -> str:
     pix = page.get_pixmap(dpi=dpi)
     filename = f"page-{page_number:03d}.png"
-    out_path = assets_dir / filename
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    pix.save(out_path.as_posix())
+    write_bytes_if_changed(assets_dir / filename, pix.tobytes("png"))
     return filename
 
 
-def convert_pdf_to_markdown(pdf_path: Path, out_dir: Path, dpi: int, force_render_pages: bool) -> Path:
+def _heading_level(size: float, body_size: float, text: str) -> int | None:
+    if body_size <= 0 or len(text) > 120 or "\n" in text.strip():
+        return None
+    ratio = size / body_size
+    if ratio >= 1.6:
+        return 1
+    if ratio >= 1.35:
+        return 2
+    if ratio >= 1.15:
+        return 3
+    return None
+
+
+def _page_block_records(page: fitz.Page, page_number: int) -> list[dict]:
+    blocks = []
+    chars_by_size: dict[float, int] = {}
+    for block in page.get_text("dict").get("blocks", []):
+        if block.get("type") != 0:
+            continue
+        lines = []
+        max_size = 0.0
+        for line in block.get("lines", []):
+            spans = line.get("spans", [])
+            lines.append("".join(s.get("text", "") for s in spans))
+            for s in spans:
+                size = round(float(s.get("size", 0.0)), 1)
+                chars_by_size[size] = chars_by_size.get(size, 0) + len(s.get("text", "").strip())
+                max_size = max(max_size, size)
+        text = "\n".join(lines).strip()
+        if text:
+            blocks.append((tuple(round(float(v), 1) for v in block["bbox"]), text, max_size))
+
+    # The page's dominant font size (by character count) stands in for body text.
+    body_size = max(chars_by_size, key=lambda s: chars_by_size[s]) if chars_by_size else 0.0
+    # Reading order: top to bottom, left to right within a row of near-equal tops.
+    ordered: list[tuple] = []
+    row: list[tuple] = []
+    for block in sorted(blocks, key=lambda b: b[0][1]):
+        if row and block[0][1] - row[0][0][1] > ROW_TOLERANCE:
+            ordered += sorted(row, key=lambda b: b[0][0])
+            row = []
+        row.append(block)
+    ordered += sorted(row, key=lambda b: b[0][0])
+    return [
+        {
+            "type": "block",
+            "page": page_number,
+            "order": order,
+            "bbox": list(bbox),
+            "font_size": size,
+            "heading": _heading_level(size, body_size, text),
+            "text": escape_markers(text),
+        }
+        for order, (bbox, text, size) in enumerate(ordered)
+    ]
+
+
+def _pdf_plain_text(pdf_path: Path) -> str:
+    doc = fitz.open(pdf_path.as_posix())
+    return "\n".join((doc.load_page(i).get_text("text") or "") for i in range(doc.page_count))
+
+
+def _page_anchor(page_number: int) -> str:
+    # Matches the `## Page N` headings as slugged by GitHub, mdBook and Obsidian.
+    return f"page-{page_number}"
+
+
+def _chunk_name(first: int, last: int) -> str:
+    return f"p{first:04d}.md" if first == last else f"p{first:04d}-{last:04d}.md"
+
+
+def _preview(text: str, limit: int = 80) -> str:
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if line:
+            line = line.replace("|", "\\|").replace("[", "\\[").replace("]", "\\]")
+            return line if len(line) <= limit else line[: limit - 1].rstrip() + "…"
+    return "_(no text)_"
+
+
+@dataclass(frozen=True)
+class PageSection:
+    number: int
+    lines: list[str]
+    preview: str
+    images: int
+
+
+# Splits the page sections into <slug>/pNNNN-MMMM.md files plus <slug>/index.md, and
+# turns <slug>.md into a short stub pointing at the index so existing links resolve.
+def _write_chunked(
+    out_dir: Path,
+    slug: str,
+    title: str,
+    header: list[str],
+    pages: list[PageSection],
+    pages_per_file: int,
+) -> bool:
+    chunk_dir = out_dir / slug
+    tree = OutputTree(chunk_dir)
+    chunk_of: dict[int, str] = {}
+    for start in range(0, len(pages), pages_per_file):
+        group = pages[start : start + pages_per_file]
+        name = _chunk_name(group[0].number, group[-1].number)
+        span = f"page {group[0].number}" if len(group) == 1 else f"pages {group[0].number}–{group[-1].number}"
+        lines = [f"# {title} ({span})", "", "<!-- PRIVATE_START -->"]
+        lines += ["[Index](index.md)", ""]
+        for page in group:
+            chunk_of[page.number] = name
+            lines += page.lines
+        lines += ["<!-- PRIVATE_END -->", ""]
+        tree.write_text(chunk_dir / name, "\n".join(lines))
+
+    index = [f"# {title}", "", *header, "| Page | Starts with | Images |", "| --- | --- | --- |"]
+    for page in pages:
+        link = f"[{page.number}]({chunk_of[page.number]}#{_page_anchor(page.number)})"
+        index.append(f"| {link} | {page.preview} | {page.images} |")
+    index += ["", "<!-- PRIVATE_END -->", ""]
+    tree.write_text(chunk_dir / "index.md", "\n".join(index))
+    tree.prune()
+
+    chunks = len(set(chunk_of.values()))
+    stub = [f"# {title}", "", *header, f"Split into {chunks} file(s); see [{slug}/index.md]({slug}/index.md).", ""]
+    stub += ["<!-- PRIVATE_END -->", ""]
+    return write_text_if_changed(out_dir / f"{slug}.md", "\n".join(stub)) or tree.changed > 0
+
+
+def convert_pdf_to_markdown(
+    pdf_path: Path,
+    out_dir: Path,
+    dpi: int,
+    force_render_pages: bool,
+    duplicate_of: list[DuplicatePair] | None = None,
+    jsonl: bool = False,
+    deterministic: bool = False,
+    pages_per_file: int = 0,
+) -> Path:
     doc = fitz.open(pdf_path.as_posix())
     title = pdf_path.stem
     slug = _slugify(title)
 
     md_path = out_dir / f"{slug}.md"
     assets_dir = out_dir / f"{slug}_assets"
+    # Chunk files live one directory down, next to their index.
+    asset_prefix = f"../{assets_dir.name}" if pages_per_file > 0 else f"./{assets_dir.name}"
 
     extracted_by_xref: dict[int, str] = {}
     image_counter = [0]
@@ -91,21 +230,47 @@ def convert_pdf_to_markdown(pdf_path: Path, out_dir: Path, dpi: int, force_rende
     converted_at = dt.datetime.now(dt.timezone.utc).replace(microsecond=0).isoformat()
     rel_pdf = pdf_path.as_posix()
 
-    lines: list[str] = []
-    lines.append(f"# {title}")
-    lines.append("")
-    lines.append("<!-- PRIVATE_START -->")
-    lines.append(f"Source: `{rel_pdf}`")
-    lines.append(f"Pages: {doc.page_count}")
-    lines.append(f"Converted (UTC): {converted_at}")
-    lines.append("")
+    header: list[str] = []
+    header.append("<!-- PRIVATE_START -->")
+    header.append(f"Source: `{rel_pdf}`")
+    header.append(f"Pages: {doc.page_count}")
+    if not deterministic:
+        header.append(f"Converted (UTC): {converted_at}")
+    for match in duplicate_of or []:
+        header.append(
+            f"Possible duplicate of: `{match.b}` ({match.kind}; resemblance {match.resemblance:.2f},"
+            f" covered {match.containment_a_in_b:.2f}, covers {match.containment_b_in_a:.2f})"
+        )
+    header.append("")
 
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # Records are written page by page, so consumers never need the whole document.
+    jsonl_path = out_dir / f"{slug}.jsonl"
+    jsonl_tmp = jsonl_path.with_suffix(f".jsonl.{os.getpid()}.tmp")
+    jsonl_file = jsonl_tmp.open("w", encoding="utf-8") if jsonl else None
+    if jsonl_file is not None:
+        document = {
+            "type": "document",
+            "source": rel_pdf,
+            "title": title,
+            "pages": doc.page_count,
+            "converted_at": converted_at,
+            "markdown": md_path.name,
+            "duplicate_of": [m.b for m in duplicate_of or []],
+        }
+        if deterministic:
+            del document["converted_at"]
+        jsonl_file.write(json.dumps(document, ensure_ascii=False) + "\n")
+
+    pages: list[PageSection] = []
     for i in range(doc.page_count):
         page_number = i + 1
         page = doc.load_page(i)
         text = page.get_text("text") or ""
         text = text.strip()
+        page_refs: list[str] = []
 
+        lines: list[str] = []
         lines.append(f"## Page {page_number}")
         lines.append("")
 
@@ -119,7 +284,7 @@ def convert_pdf_to_markdown(pdf_path: Path, out_dir: Path, dpi: int, force_rende
         )
 
         if text:
-            lines.append(_escape_visibility_markers(text))
+            lines.append(escape_markers(text))
             lines.append("")
         else:
             lines.append("_No extractable text on this page._")
@@ -127,18 +292,55 @@ def convert_pdf_to_markdown(pdf_path: Path, out_dir: Path, dpi: int, force_rende
 
         if page_images:
             for extracted in page_images:
-                lines.append(f"![Page {page_number} image](./{assets_dir.name}/{extracted.filename})")
+                lines.append(f"![Page {page_number} image]({asset_prefix}/{extracted.filename})")
+                page_refs.append(f"{assets_dir.name}/{extracted.filename}")
             lines.append("")
         elif force_render_pages or not text:
             rendered = _render_page_if_needed(page, assets_dir=assets_dir, page_number=page_number, dpi=dpi)
-            lines.append(f"![Rendered page {page_number}](./{assets_dir.name}/{rendered})")
+            lines.append(f"![Rendered page {page_number}]({asset_prefix}/{rendered})")
             lines.append("")
+            page_refs.append(f"{assets_dir.name}/{rendered}")
 
-    lines.append("<!-- PRIVATE_END -->")
-    lines.append("")
+        pages.append(
+            PageSection(number=page_number, lines=lines, preview=_preview(escape_markers(text)), images=len(page_refs))
+        )
 
-    out_dir.mkdir(parents=True, exist_ok=True)
-    md_path.write_text("\n".join(lines), encoding="utf-8")
+        if jsonl_file is not None:
+            records = _page_block_records(page, page_number)
+            page_record = {
+                "type": "page",
+                "page": page_number,
+                "blocks": len(records),
+                "images": page_refs,
+                "rendered": bool(page_refs) and not page_images,
+            }
+            jsonl_file.write(json.dumps(page_record, ensure_ascii=False) + "\n")
+            for record in records:
+                jsonl_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            jsonl_file.flush()
+
+    changed = False
+    if jsonl_file is not None:
+        jsonl_file.close()
+        changed |= replace_if_changed(jsonl_tmp, jsonl_path)
+
+    if pages_per_file > 0 and pages:
+        changed |= _write_chunked(out_dir, slug, title, header, pages, pages_per_file)
+    else:
+        lines = [f"# {title}", "", *header]
+        for page in pages:
+            lines += page.lines
+        lines += ["<!-- PRIVATE_END -->", ""]
+        changed |= write_text_if_changed(md_path, "\n".join(lines))
+        if (out_dir / slug / "index.md").exists():
+            # Converted unchunked after an earlier chunked run: drop the stale chunks.
+            OutputTree(out_dir / slug).prune()
+
+    meta_path = out_dir / f"{slug}.meta.json"
+    if deterministic and (changed or not meta_path.exists()):
+        # The conversion time lives here, so re-parsing an unchanged PDF changes nothing.
+        meta = {"source": rel_pdf, "source_sha256": file_sha256(pdf_path), "converted_at": converted_at}
+        write_text_if_changed(meta_path, json.dumps(meta, indent=2, sort_keys=True) + "\n")
 
     if assets_dir.exists():
         try:
@@ -172,6 +374,43 @@ def main() -> int:
         action="store_true",
         help="Render every PDF page to a PNG (can be large).",
     )
+    parser.add_argument(
+        "--on-duplicate",
+        choices=["keep", "flag", "skip"],
+        default="keep",
+        help="What to do when a PDF near-duplicates or is contained in an already parsed reference "
+        "(default: keep).",
+    )
+    parser.add_argument(
+        "--duplicate-threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"Resemblance/containment at which a PDF counts as a duplicate (default: {DEFAULT_THRESHOLD}).",
+    )
+    parser.add_argument(
+        "--jsonl",
+        action="store_true",
+        help="Also write <slug>.jsonl: one record per page and per text block (reading order, heading guess).",
+    )
+    parser.add_argument(
+        "--deterministic",
+        action=argparse.BooleanOptionalAction,
+        default=deterministic_default(),
+        help="Keep the conversion time out of the Markdown/JSONL (it goes to <slug>.meta.json), so unchanged "
+        "PDFs produce identical files (default: on when CAMPAIGN_DETERMINISTIC=1).",
+    )
+    parser.add_argument(
+        "--pages-per-file",
+        type=int,
+        default=0,
+        help="Split the Markdown into <slug>/pNNNN-MMMM.md files of this many pages, with <slug>/index.md "
+        "listing every page; <slug>.md becomes a pointer to the index (default: 0, one file).",
+    )
+    parser.add_argument(
+        "--skip-ingested",
+        action="store_true",
+        help=f"Skip PDFs that (or whose parsed Markdown) are already recorded in {DEFAULT_LEDGER}.",
+    )
 
     args = parser.parse_args()
     out_dir = Path(args.out_dir)
@@ -185,18 +424,54 @@ def main() -> int:
     if not pdf_paths:
         raise SystemExit("No PDFs found. Pass paths or add PDFs under references/.")
 
+    index = None
+    if args.on_duplicate != "keep":
+        index = build_index(out_dir) if out_dir.exists() else SketchIndex()
+
+    ledger = Ledger(Path(DEFAULT_LEDGER), cache_path=Path(DEFAULT_CACHE)) if args.skip_ingested else None
+
     written: list[Path] = []
     for pdf in pdf_paths:
         if os.path.basename(pdf.as_posix()).startswith("~$"):
             continue
+        if ledger is not None and (
+            ledger.is_recorded(pdf) or ledger.is_recorded(out_dir / f"{_slugify(pdf.stem)}.md")
+        ):
+            print(f"Skipping {pdf.as_posix()}: already in the ingest ledger", file=sys.stderr)
+            continue
+
+        duplicate_of: list[DuplicatePair] = []
+        sketch = None
+        if index is not None:
+            # Re-converting the same PDF overwrites its own output, so never match against it.
+            own_md = (out_dir / f"{_slugify(pdf.stem)}.md").as_posix()
+            sketch = sketch_text(own_md, _pdf_plain_text(pdf))
+            duplicate_of = index.query(sketch, args.duplicate_threshold)
+            # Only skip when this PDF adds nothing; an extended export of an older thread
+            # still gets converted (and flagged) so the new material isn't lost.
+            covered = [m for m in duplicate_of if m.containment_a_in_b >= args.duplicate_threshold]
+            if covered and args.on_duplicate == "skip":
+                print(
+                    f"Skipping {pdf.as_posix()}: already covered by {covered[0].b}"
+                    f" ({covered[0].containment_a_in_b:.2f})",
+                    file=sys.stderr,
+                )
+                continue
+
         written.append(
             convert_pdf_to_markdown(
                 pdf_path=pdf,
                 out_dir=out_dir,
                 dpi=args.dpi,
                 force_render_pages=args.force_render_pages,
+                duplicate_of=duplicate_of,
+                jsonl=args.jsonl,
+                deterministic=args.deterministic,
+                pages_per_file=max(0, args.pages_per_file),
             )
         )
+        if index is not None and sketch is not None:
+            index.add(sketch)
 
     for p in written:
         print(p.as_posix())
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import hashlib
+import html
+import mimetypes
+import posixpath
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import quote, unquote, urlsplit
+
+from build_obsidian_vault import get_status, parse_markdown, render_public, tokenize_markdown
+from frontmatter import parse_front_matter
+from query_items import load_index
+from visibility import MarkerError
+
+
+DEFAULT_CACHE_SIZE = 256
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+LIST_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(.*)$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+LINK_RE = re.compile(r"(?P<image>!)?\[(?P<text>[^\]]*)\]\((?P<href>[^)\s]+)\)")
+CODE_RE = re.compile(r"`([^`]+)`")
+STRONG_RE = re.compile(r"\*\*(.+?)\*\*")
+EM_RE = re.compile(r"(?<![*\w])[*_](?![*_\s])(.+?)(?<![*_\s])[*_](?![*\w])")
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>
+  body {{ max-width: 46rem; margin: 2rem auto; padding: 0 1rem; font: 17px/1.55 Georgia, serif; color: #222; }}
+  nav {{ font: 14px system-ui, sans-serif; margin-bottom: 1.5rem; }}
+  img {{ max-width: 100%; }}
+  pre {{ background: #f4f4f4; padding: .75rem; overflow-x: auto; }}
+  .meta {{ color: #666; font: 14px system-ui, sans-serif; }}
+  .dead {{ color: #999; }}
+</style>
+</head>
+<body>
+<nav><a href="/">Player preview index</a></nav>
+{body}
+</body>
+</html>
+"""
+
+
+@dataclass(frozen=True)
+class RenderedPage:
+    mtime_ns: int
+    size: int
+    etag: str
+    body: bytes
+    images: frozenset[str]
+    # Stats of the items this page links to. Whether a link renders depends on the
+    # target's status, so a cached page is stale once any of them changes.
+    targets: tuple[tuple[str, tuple[int, int] | None], ...] = ()
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+# --- Markdown (the subset our items use) -------------------------------------------
+
+
+def _inline(text: str, link_href) -> str:
+    out: list[str] = []
+    pos = 0
+    # Images and links are cut out first so their URLs are never touched by emphasis rules.
+    for m in LINK_RE.finditer(text):
+        out.append(_emphasis(html.escape(text[pos : m.start()])))
+        if m.group("image"):
+            src = link_href(m.group("href"), image=True)
+            if src:
+                out.append(f'<img src="{html.escape(src)}" alt="{html.escape(m.group("text"))}">')
+        else:
+            href = link_href(m.group("href"), image=False)
+            label = _emphasis(html.escape(m.group("text")))
+            out.append(f'<a href="{html.escape(href)}">{label}</a>' if href else f'<span class="dead">{label}</span>')
+        pos = m.end()
+    out.append(_emphasis(html.escape(text[pos:])))
+    return "".join(out)
+
+
+def _emphasis(text: str) -> str:
+    text = CODE_RE.sub(r"<code>\1</code>", text)
+    text = STRONG_RE.sub(r"<strong>\1</strong>", text)
+    return EM_RE.sub(r"<em>\1</em>", text)
+
+
+def render_markdown(body: str, link_href) -> str:
+    out: list[str] = []
+    para: list[str] = []
+    items: list[str] = []
+    fence: list[str] | None = None
+
+    def flush() -> None:
+        if para:
+            out.append("<p>" + _inline(" ".join(para), link_href) + "</p>")
+            para.clear()
+        if items:
+            out.append("<ul>" + "".join(f"<li>{_inline(i, link_href)}</li>" for i in items) + "</ul>")
+            items.clear()
+
+    for line in body.splitlines():
+        if fence is not None:
+            if FENCE_RE.match(line):
+                out.append("<pre><code>" + html.escape("\n".join(fence)) + "</code></pre>")
+                fence = None
+            else:
+                fence.append(line)
+            continue
+        if FENCE_RE.match(line):
+            flush()
+            fence = []
+            continue
+        if not line.strip():
+            flush()
+            continue
+        m = HEADING_RE.match(line)
+        if m:
+            flush()
+            level = len(m.group(1))
+            out.append(f"<h{level}>{_inline(m.group(2), link_href)}</h{level}>")
+            continue
+        if line.strip() in {"---", "***"}:
+            flush()
+            out.append("<hr>")
+            continue
+        m = LIST_RE.match(line)
+        if m:
+            if para:
+                flush()
+            items.append(m.group(1))
+            continue
+        if line.startswith(">"):
+            flush()
+            out.append("<blockquote>" + _inline(line.lstrip("> "), link_href) + "</blockquote>")
+            continue
+        if items:
+            items[-1] += " " + line.strip()
+        else:
+            para.append(line.strip())
+    if fence is not None:
+        out.append("<pre><code>" + html.escape("\n".join(fence)) + "</code></pre>")
+    flush()
+    return "\n".join(out)
+
+
+# --- Rendering + cache -------------------------------------------------------------
+
+
+class PreviewSite:
+    def __init__(self, root: Path, *, include_drafts: bool, cache_size: int) -> None:
+        self.root = root
+        self.items_dir = root / "items"
+        self.include_drafts = include_drafts
+        self.cache_size = cache_size
+        self.pages: OrderedDict[str, RenderedPage] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def visible(self, rel: str) -> Path | None:
+        if not rel.startswith("items/") or not rel.endswith(".md"):
+            return None
+        path = (self.root / rel).resolve()
+        if self.items_dir.resolve() not in path.parents or not path.is_file():
+            return None
+        return path
+
+    def _stat(self, rel: str) -> tuple[int, int] | None:
+        try:
+            st = (self.root / rel).stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    # One cached render per item, keyed by path and revalidated against its own
+    # (mtime, size) and those of the items it links to.
+    def page(self, rel: str) -> RenderedPage | None:
+        path = self.visible(rel)
+        if path is None:
+            return None
+        st = path.stat()
+        with self.lock:
+            cached = self.pages.get(rel)
+        if (
+            cached
+            and (cached.mtime_ns, cached.size) == (st.st_mtime_ns, st.st_size)
+            and all(self._stat(target) == stat for target, stat in cached.targets)
+        ):
+            with self.lock:
+                if rel in self.pages:
+                    self.pages.move_to_end(rel)
+            return cached
+
+        rendered = self._render(rel, path, st.st_mtime_ns, st.st_size)
+        with self.lock:
+            if rendered is None:
+                self.pages.pop(rel, None)
+                return None
+            self.pages[rel] = rendered
+            self.pages.move_to_end(rel)
+            while len(self.pages) > self.cache_size:
+                self.pages.popitem(last=False)
+        return rendered
+
+    def _render(self, rel: str, path: Path, mtime_ns: int, size: int) -> RenderedPage | None:
+        text = path.read_text(encoding="utf-8")
+        parsed, blocks = tokenize_markdown(Path(rel), text)
+        if not self.include_drafts and get_status(parsed.front_matter) != "published":
+            return None
+
+        # Same filtering as extract_public, but errors name the item file.
+        public = parse_markdown(render_public(parsed.front_matter, blocks))
+        try:
+            meta = parse_front_matter(public.front_matter, source=rel)
+        except ValueError:
+            meta = {}
+        title = str(meta.get("title") or path.stem)
+        images: set[str] = set()
+        targets: dict[str, tuple[int, int] | None] = {}
+
+        def link_href(href: str, *, image: bool) -> str:
+            if "://" in href or href.startswith(("mailto:", "#")):
+                return href
+            target, _, anchor = href.partition("#")
+            resolved = posixpath.normpath(posixpath.join(posixpath.dirname(rel), unquote(target)))
+            if image:
+                if not resolved.startswith("items/") or not (self.root / resolved).is_file():
+                    return ""
+                images.add(resolved)
+                return f"/asset/{quote(resolved)}?from={quote(rel)}"
+            if resolved.endswith(".md"):
+                # Links to pages that would not render are shown as plain text.
+                targets[resolved] = self._stat(resolved)
+                return f"/{quote(resolved)}" + (f"#{anchor}" if anchor else "") if self._linkable(resolved) else ""
+            return ""
+
+        meta_line = " · ".join(str(meta[k]) for k in ("type", "status") if meta.get(k))
+        body = render_markdown(public.body.strip(), link_href)
+        if meta_line:
+            body = f'<p class="meta">{html.escape(meta_line)}</p>\n' + body
+        data = PAGE_TEMPLATE.format(title=html.escape(title), body=body).encode("utf-8")
+        return RenderedPage(
+            mtime_ns=mtime_ns,
+            size=size,
+            etag=_etag(data),
+            body=data,
+            images=frozenset(images),
+            targets=tuple(sorted(targets.items())),
+        )
+
+    def _linkable(self, rel: str) -> bool:
+        path = self.visible(rel)
+        if path is None:
+            return False
+        if self.include_drafts:
+            return True
+        with path.open(encoding="utf-8") as fh:
+            head = fh.read(4096)
+        return get_status(parse_markdown(head).front_matter) == "published"
+
+    # The index reuses the query_items column index (and its cache), so it only
+    # re-reads front matter of files that changed. Loading may rewrite the cache file,
+    # so concurrent requests take turns.
+    def index(self) -> bytes:
+        with self.lock:
+            idx = load_index(self.root, self.items_dir, self.root / ".cache" / "item-index.pickle")
+        rows = idx.rows if self.include_drafts else idx.select(where=[("status", "published")], has=[], missing=[])
+        sections: dict[str, list[dict]] = {}
+        for row in rows:
+            sections.setdefault(str(row.get("_section") or "(top level)"), []).append(row)
+
+        out = ["<h1>Player preview</h1>", f'<p class="meta">{len(rows)} item(s), PUBLIC blocks only.</p>']
+        for section in sorted(sections):
+            out.append(f"<h2>{html.escape(section)}</h2><ul>")
+            for row in sorted(sections[section], key=lambda r: str(r.get("title") or r["_path"]).casefold()):
+                title = html.escape(str(row.get("title") or Path(str(row["_path"])).stem))
+                kind = f' <span class="meta">{html.escape(str(row["type"]))}</span>' if row.get("type") else ""
+                out.append(f'<li><a href="/{quote(str(row["_path"]))}">{title}</a>{kind}</li>')
+            out.append("</ul>")
+        return PAGE_TEMPLATE.format(title="Player preview", body="\n".join(out)).encode("utf-8")
+
+
+class PreviewHandler(BaseHTTPRequestHandler):
+    site: PreviewSite
+
+    def do_GET(self) -> None:
+        self._serve(head_only=False)
+
+    def do_HEAD(self) -> None:
+        self._serve(head_only=True)
+
+    def log_message(self, fmt: str, *args: object) -> None:
+        if not self.server.quiet:  # type: ignore[attr-defined]
+            super().log_message(fmt, *args)
+
+    def _serve(self, *, head_only: bool) -> None:
+        url = urlsplit(self.path)
+        rel = unquote(url.path).lstrip("/")
+
+        if rel in {"", "index.html"}:
+            body = self.site.index()
+            self._send(body, "text/html; charset=utf-8", _etag(body), head_only)
+        elif rel.startswith("asset/"):
+            self._asset(rel[len("asset/") :], url.query, head_only)
+        else:
+            try:
+                page = self.site.page(rel)
+            except MarkerError as exc:
+                self.send_error(500, explain=str(exc))
+                return
+            if page is None:
+                self.send_error(404)
+                return
+            self._send(page.body, "text/html; charset=utf-8", page.etag, head_only)
+
+    # Images are served only to the page whose PUBLIC blocks reference them.
+    def _asset(self, rel: str, query: str, head_only: bool) -> None:
+        source = unquote(query[len("from=") :]) if query.startswith("from=") else ""
+        try:
+            page = self.site.page(source)
+        except MarkerError as exc:
+            self.send_error(500, explain=str(exc))
+            return
+        if page is None or rel not in page.images:
+            self.send_error(404)
+            return
+        data = (self.site.root / rel).read_bytes()
+        self._send(data, mimetypes.guess_type(rel)[0] or "application/octet-stream", _etag(data), head_only)
+
+    def _send(self, body: bytes, ctype: str, etag: str, head_only: bool) -> None:
+        if _etag_matches(self.headers.get("If-None-Match", ""), etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Strong comparison: weak validators (W/"...") never match.
+    candidates = [c.strip() for c in header.split(",") if c.strip()]
+    return "*" in candidates or etag in candidates
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve player-safe (PUBLIC-only) previews of items on demand.")
+    parser.add_argument("--root", default=".", help="GM repo root (default: .).")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8000, help="Port (default: 8000).")
+    parser.add_argument(
+        "--include-drafts",
+        action="store_true",
+        help="Preview all item statuses (still PUBLIC-only).",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help=f"Rendered pages kept in memory (default: {DEFAULT_CACHE_SIZE}).",
+    )
+    parser.add_argument("--quiet", action="store_true", help="Do not log requests.")
+    args = parser.parse_args()
+
+    root = Path(args.root).resolve()
+    if not (root / "items").is_dir():
+        raise SystemExit(f"Items dir not found: {(root / 'items').as_posix()}")
+
+    PreviewHandler.site = PreviewSite(root, include_drafts=bool(args.include_drafts), cache_size=args.cache_size)
+    server = ThreadingHTTPServer((args.host, args.port), PreviewHandler)
+    server.quiet = bool(args.quiet)  # type: ignore[attr-defined]
+    print(f"Player preview: http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
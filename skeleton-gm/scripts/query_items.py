@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pickle
+import re
+from pathlib import Path
+
+import corpus
+from daemon_client import forward
+from frontmatter import Value, parse_front_matter, parse_scalar, split_front_matter
+
+
+CACHE_VERSION = 2
+DEFAULT_FIELDS = "_path,id,type,status,title"
+
+PUBLIC_START_RE = re.compile(r"<!--\s*PUBLIC_START\s*-->")
+PRIVATE_START_RE = re.compile(r"<!--\s*PRIVATE_START\s*-->")
+# Commas split list values in --where; a backslash keeps one literal.
+LIST_SEP_RE = re.compile(r"(?<!\\),")
+
+
+def _norm(value: object) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    # "Banking Guild", "banking_guild" and "banking-guild" all name the same thing.
+    return re.sub(r"[\s_-]+", "-", str(value).strip().casefold())
+
+
+def _is_empty(value: Value) -> bool:
+    return value is None or value == "" or value == []
+
+
+def _scan_files(items_dir: Path) -> dict[str, tuple[int, int]]:
+    stats: dict[str, tuple[int, int]] = {}
+    stack = [items_dir]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif entry.name.endswith(".md") and entry.is_file():
+                    st = entry.stat()
+                    stats[entry.path] = (st.st_mtime_ns, st.st_size)
+    return stats
+
+
+def load_record(path: Path, root: Path) -> dict[str, Value]:
+    text = corpus.read_text(path)
+    front, body = split_front_matter(text)
+    rel = path.relative_to(root).as_posix()
+    try:
+        record = parse_front_matter(front, source=rel)
+    except ValueError as exc:
+        record = {"_error": str(exc)}
+
+    parts = rel.split("/")
+    # Derived columns are prefixed with `_` so they never shadow front matter keys.
+    record["_path"] = rel
+    record["_section"] = parts[1] if len(parts) > 2 and parts[0] == "items" else ""
+    record["_public_blocks"] = len(PUBLIC_START_RE.findall(body))
+    record["_private_blocks"] = len(PRIVATE_START_RE.findall(body))
+    return record
+
+
+class ColumnIndex:
+    def __init__(self, rows: list[dict[str, Value]]) -> None:
+        self.rows = rows
+        self.present: dict[str, set[int]] = {}
+        self.equals: dict[str, dict[str, set[int]]] = {}
+        self.members: dict[str, dict[str, set[int]]] = {}
+
+        for row_id, row in enumerate(rows):
+            for field, value in row.items():
+                if _is_empty(value):
+                    continue
+                self.present.setdefault(field, set()).add(row_id)
+                if isinstance(value, list):
+                    key = ",".join(sorted(_norm(v) for v in value))
+                    for v in value:
+                        self.members.setdefault(field, {}).setdefault(_norm(v), set()).add(row_id)
+                else:
+                    key = _norm(value)
+                self.equals.setdefault(field, {}).setdefault(key, set()).add(row_id)
+
+    # The cache stores plain dicts/sets rather than the instance, so it loads the same
+    # whether this module runs as a script or is imported by another tool.
+    def state(self) -> dict:
+        return {"present": self.present, "equals": self.equals, "members": self.members}
+
+    @classmethod
+    def restore(cls, rows: list[dict[str, Value]], state: dict) -> ColumnIndex:
+        index = cls.__new__(cls)
+        index.rows = rows
+        index.present = state["present"]
+        index.equals = state["equals"]
+        index.members = state["members"]
+        return index
+
+    # Only fields that hold a list somewhere compare as comma-separated lists, so a
+    # scalar such as `title=Smith, Jones` matches as written.
+    def where(self, field: str, value: str) -> set[int]:
+        if field in self.members and LIST_SEP_RE.search(value):
+            key = ",".join(sorted(_norm(v.replace("\\,", ",")) for v in LIST_SEP_RE.split(value)))
+        else:
+            key = _norm(parse_scalar(value.replace("\\,", ",")))
+        if key == "":
+            return self.missing(field)
+        return self.equals.get(field, {}).get(key, set())
+
+    def has(self, field: str, value: str) -> set[int]:
+        key = _norm(parse_scalar(value))
+        if field in self.members:
+            return self.members[field].get(key, set()) | self.equals.get(field, {}).get(key, set())
+        return self.equals.get(field, {}).get(key, set())
+
+    def missing(self, field: str) -> set[int]:
+        return set(range(len(self.rows))) - self.present.get(field, set())
+
+    def select(
+        self,
+        *,
+        where: list[tuple[str, str]],
+        has: list[tuple[str, str]],
+        missing: list[str],
+    ) -> list[dict[str, Value]]:
+        selections = (
+            [self.where(f, v) for f, v in where]
+            + [self.has(f, v) for f, v in has]
+            + [self.missing(f) for f in missing]
+        )
+        if not selections:
+            row_ids: set[int] = set(range(len(self.rows)))
+        else:
+            selections.sort(key=len)
+            row_ids = set(selections[0])
+            for other in selections[1:]:
+                row_ids &= other
+                if not row_ids:
+                    break
+        return sorted((self.rows[i] for i in row_ids), key=lambda r: str(r["_path"]))
+
+
+def load_index(root: Path, items_dir: Path, cache_path: Path | None) -> ColumnIndex:
+    stats = _scan_files(items_dir)
+    # Inside campaignd the built index stays in memory until any item's stat changes.
+    return corpus.remember(
+        f"query-index:{items_dir.as_posix()}",
+        stats,
+        lambda: _load_index(root, items_dir, cache_path, stats),
+    )
+
+
+def _load_index(
+    root: Path,
+    items_dir: Path,
+    cache_path: Path | None,
+    stats: dict[str, tuple[int, int]],
+) -> ColumnIndex:
+    cached: dict = {}
+    if cache_path is not None and cache_path.exists():
+        try:
+            with cache_path.open("rb") as fh:
+                cached = pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            cached = {}
+        if cached.get("version") != CACHE_VERSION or cached.get("items_dir") != items_dir.as_posix():
+            cached = {}
+
+    if cached and cached["stats"] == stats:
+        records = cached["records"]
+        return ColumnIndex.restore([records[p] for p in sorted(records)], cached["index"])
+
+    old_stats: dict[str, tuple[int, int]] = cached.get("stats", {})
+    old_records: dict[str, dict[str, Value]] = cached.get("records", {})
+    records: dict[str, dict[str, Value]] = {}
+    for path, stat in stats.items():
+        if old_stats.get(path) == stat and path in old_records:
+            records[path] = old_records[path]
+        else:
+            records[path] = load_record(Path(path), root)
+
+    index = ColumnIndex([records[p] for p in sorted(records)])
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_suffix(".tmp")
+        with tmp.open("wb") as fh:
+            pickle.dump(
+                {
+                    "version": CACHE_VERSION,
+                    "items_dir": items_dir.as_posix(),
+                    "stats": stats,
+                    "records": records,
+                    "index": index.state(),
+                },
+                fh,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        tmp.replace(cache_path)
+    return index
+
+
+def _format_cell(value: Value) -> str:
+    if isinstance(value, list):
+        return ", ".join("" if v is None else str(v) for v in value)
+    if value is None:
+        return ""
+    return str(value)
+
+
+def _print_table(rows: list[dict[str, Value]], fields: list[str]) -> None:
+    table = [fields] + [[_format_cell(row.get(f)) for f in fields] for row in rows]
+    widths = [max(len(r[i]) for r in table) for i in range(len(fields))]
+    for n, r in enumerate(table):
+        print("  ".join(cell.ljust(w) for cell, w in zip(r, widths)).rstrip())
+        if n == 0:
+            print("  ".join("-" * w for w in widths))
+
+
+def _split_filter(spec: str) -> tuple[str, str]:
+    if "=" not in spec:
+        raise SystemExit(f"Expected FIELD=VALUE, got: {spec}")
+    field, value = spec.split("=", 1)
+    return field.strip(), value.strip()
+
+
+def main() -> int:
+    forwarded = forward("query_items")
+    if forwarded is not None:
+        return forwarded
+
+    parser = argparse.ArgumentParser(
+        description="Query item front matter (plus derived _path/_section/_public_blocks/_private_blocks columns)."
+    )
+    parser.add_argument("--root", default=".", help="Repo root directory (default: .).")
+    parser.add_argument("--items-dir", default="items", help="Items directory (default: items).")
+    parser.add_argument(
+        "--where",
+        action="append",
+        default=[],
+        metavar="FIELD=VALUE",
+        help="Equality filter. List fields compare as a whole (comma-separated VALUE; \\, for a literal comma).",
+    )
+    parser.add_argument(
+        "--has",
+        action="append",
+        default=[],
+        metavar="FIELD=VALUE",
+        help="Membership filter for list fields (equality for scalars).",
+    )
+    parser.add_argument(
+        "--missing",
+        action="append",
+        default=[],
+        metavar="FIELD",
+        help="Field is absent, empty or an empty list.",
+    )
+    parser.add_argument(
+        "--fields",
+        default=DEFAULT_FIELDS,
+        help=f"Comma-separated columns to print (default: {DEFAULT_FIELDS}).",
+    )
+    parser.add_argument("--format", choices=["table", "jsonl"], default="table", help="Output format.")
+    parser.add_argument("--count", action="store_true", help="Print only the number of matches.")
+    parser.add_argument(
+        "--cache",
+        default=".cache/item-index.pickle",
+        help="Index cache path, relative to --root (default: .cache/item-index.pickle).",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Rebuild the index without reading/writing the cache.")
+    args = parser.parse_args()
+
+    root = Path(args.root).resolve()
+    items_dir = (root / args.items_dir).resolve()
+    if not items_dir.exists():
+        raise SystemExit(f"Items dir not found: {items_dir.as_posix()}")
+
+    cache_path = None if args.no_cache else root / args.cache
+    index = load_index(root, items_dir, cache_path)
+
+    rows = index.select(
+        where=[_split_filter(s) for s in args.where],
+        has=[_split_filter(s) for s in args.has],
+        missing=[s.strip() for s in args.missing],
+    )
+
+    if args.count:
+        print(len(rows))
+        return 0
+
+    if args.format == "jsonl":
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        return 0
+
+    _print_table(rows, [f.strip() for f in args.fields.split(",") if f.strip()])
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import hashlib
+import heapq
+import math
+import pickle
+import posixpath
+import re
+from collections import Counter
+from pathlib import Path
+
+
+CACHE_VERSION = 2
+DEFAULT_RELATED = 5
+# Below this cosine the pages share little more than common vocabulary.
+MIN_SCORE = 0.05
+# Each page keeps only its highest-weighted terms. This bounds the work per page and
+# leaves out the long tail that rarely decides what is related.
+TERMS_PER_PAGE = 20
+# Terms in more than this share of pages (in corpora of at least MIN_DOCS_FOR_MAX_DF)
+# are treated as stop words.
+MAX_DF = 0.5
+MIN_DOCS_FOR_MAX_DF = 20
+# Terms in more pages than this (a share of the corpus, but at least SCAN_MIN_DF)
+# still count towards each page's norm but are not walked when looking for
+# neighbours. Their posting lists are the longest and their weights the lowest, so
+# they cost most of the scan while rarely changing the top k.
+SCAN_MAX_DF = 0.005
+SCAN_MIN_DF = 50
+
+WORD_RE = re.compile(r"[^\W\d_]{3,}")
+LINK_TARGET_RE = re.compile(r"\]\([^)\s]*\)")
+COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+STOP_WORDS = frozenset(
+    """
+    about above after again against all also and any are because been before being below between both but can
+    could did does doing down during each few for from further had has have having her here hers herself him
+    himself his how into its itself just more most much must not now off once only other our ours ourselves out
+    over own same she should some such than that the their theirs them themselves then there these they this
+    those through too under until very was were what when where which while who whom why will with would you
+    your yours yourself yourselves page pages source
+    """.split()
+)
+LOG_TF = [0.0] + [1.0 + math.log(tf) for tf in range(1, 256)]
+
+
+def term_counts(text: str) -> Counter[str]:
+    text = COMMENT_RE.sub(" ", LINK_TARGET_RE.sub("]", text)).lower()
+    return Counter(w for w in WORD_RE.findall(text) if w not in STOP_WORDS)
+
+
+def _max_df(n: int) -> int:
+    return int(MAX_DF * n) if n >= MIN_DOCS_FOR_MAX_DF else n
+
+
+# Smoothed idf, or None for terms that cannot relate two pages: found in a single
+# page, or common enough to be a stop word.
+def _idf(d: int, n: int, max_df: int) -> float | None:
+    return math.log((1 + n) / (1 + d)) + 1.0 if 2 <= d <= max_df else None
+
+
+def idf_weights(df: Counter[str], n: int) -> dict[str, float]:
+    max_df = _max_df(n)
+    return {t: w for t, d in df.items() if (w := _idf(d, n, max_df)) is not None}
+
+
+# L2-normalised TF-IDF vector (sublinear tf) as a sparse {term: weight} dict. Terms
+# without an idf are dropped first, so they do not crowd out shared terms.
+def page_vector(
+    counts: Counter[str], idf: dict[str, float], terms_per_page: int = TERMS_PER_PAGE
+) -> dict[str, float]:
+    weighted = [
+        ((LOG_TF[tf] if tf < 256 else 1.0 + math.log(tf)) * idf[t], t) for t, tf in counts.items() if t in idf
+    ]
+    top = heapq.nlargest(terms_per_page, weighted) if len(weighted) > terms_per_page else weighted
+    norm = math.sqrt(sum(w * w for w, _ in top))
+    return {t: w / norm for w, t in top} if norm else {}
+
+
+def tfidf_vectors(
+    counts: dict[str, Counter[str]], terms_per_page: int = TERMS_PER_PAGE
+) -> dict[str, dict[str, float]]:
+    df: Counter[str] = Counter()
+    for c in counts.values():
+        df.update(c.keys())
+    idf = idf_weights(df, len(counts))
+    return {key: page_vector(c, idf, terms_per_page) for key, c in counts.items()}
+
+
+# Top-k cosine neighbours per page through an inverted index: each page only meets
+# pages it shares a term with, so cost follows posting-list lengths, not pages².
+# Posting lists longer than the scan ceiling are skipped (see SCAN_MAX_DF).
+def top_related(
+    vectors: dict[str, dict[str, float]], k: int = DEFAULT_RELATED, min_score: float = MIN_SCORE
+) -> dict[str, list[tuple[str, float]]]:
+    keys = sorted(vectors)
+    postings: dict[str, list[tuple[int, float]]] = {}
+    for i, key in enumerate(keys):
+        for t, w in vectors[key].items():
+            postings.setdefault(t, []).append((i, w))
+    ceiling = max(SCAN_MIN_DF, int(SCAN_MAX_DF * len(keys)))
+    scanned = {t: p for t, p in postings.items() if len(p) <= ceiling}
+
+    related: dict[str, list[tuple[str, float]]] = {}
+    for i, key in enumerate(keys):
+        scores: dict[int, float] = {}
+        get = scores.get
+        for t, w in vectors[key].items():
+            for j, wj in scanned.get(t, ()):
+                scores[j] = get(j, 0.0) + w * wj
+        scores.pop(i, None)
+        # Rounded so ties break by path rather than by float noise.
+        best = heapq.nsmallest(k, ((-round(s, 6), j) for j, s in scores.items() if s >= min_score))
+        related[key] = [(keys[j], -s) for s, j in best]
+    return related
+
+
+def _corpus_digest(digests: dict[str, str]) -> str:
+    h = hashlib.sha1()
+    for key in sorted(digests):
+        h.update(f"{key}\0{digests[key]}\0".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _load(cache_path: Path | None) -> dict:
+    if cache_path is None or not cache_path.exists():
+        return {}
+    try:
+        with cache_path.open("rb") as fh:
+            cached = pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+    return cached if cached.get("version") == CACHE_VERSION else {}
+
+
+def _save(cache_path: Path, payload: dict) -> None:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_suffix(".tmp")
+    with tmp.open("wb") as fh:
+        pickle.dump(payload, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(cache_path)
+
+
+# The cache keeps the last result keyed by a digest of every page's text hash, so an
+# unchanged corpus costs one hash per page and one small unpickle. The working state
+# (term counts, document frequencies, vectors) sits in the same file as a nested
+# pickle that is only loaded when something changed. Then only changed pages are
+# re-counted, document frequencies are adjusted by their difference, and vectors are
+# recomputed only for pages that changed or use a term whose idf moved (all of them
+# when the page count changes, since that moves every idf).
+def related_pages(
+    texts: dict[str, str], *, k: int = DEFAULT_RELATED, cache_path: Path | None = None
+) -> dict[str, list[tuple[str, float]]]:
+    if k <= 0 or len(texts) < 2:
+        return {key: [] for key in texts}
+    digests = {key: hashlib.sha1(text.encode("utf-8")).hexdigest() for key, text in texts.items()}
+    corpus = _corpus_digest(digests)
+    params = (k, MIN_SCORE, TERMS_PER_PAGE, MAX_DF, MIN_DOCS_FOR_MAX_DF, SCAN_MAX_DF, SCAN_MIN_DF)
+    cached = _load(cache_path)
+    if cached.get("corpus") == corpus and cached.get("params") == params:
+        return cached["related"]
+
+    state: dict = pickle.loads(cached["state"]) if cached else {}
+    old_digests: dict[str, str] = state.get("digests", {})
+    counts: dict[str, Counter[str]] = state.get("counts", {})
+    df: Counter[str] = state.get("df", Counter())
+    vectors: dict[str, dict[str, float]] = state.get("vectors", {})
+    old_n = len(old_digests)
+
+    delta: Counter[str] = Counter()
+    dirty: set[str] = set()
+    for key in old_digests.keys() - digests.keys():
+        delta.subtract(counts.pop(key).keys())
+        vectors.pop(key, None)
+    for key, digest in digests.items():
+        if old_digests.get(key) == digest and key in counts:
+            continue
+        if key in counts:
+            delta.subtract(counts[key].keys())
+        counts[key] = term_counts(texts[key])
+        delta.update(counts[key].keys())
+        dirty.add(key)
+    df.update(delta)
+    for t, d in delta.items():
+        if d and df[t] <= 0:
+            del df[t]
+
+    n = len(digests)
+    idf = idf_weights(df, n)
+    if n != old_n or not vectors or cached.get("params") != params:
+        dirty = set(digests)
+    else:
+        max_df = _max_df(n)
+        moved = {t for t, d in delta.items() if d and _idf(df.get(t, 0) - d, n, max_df) != idf.get(t)}
+        if moved:
+            dirty |= {key for key, c in counts.items() if not c.keys().isdisjoint(moved)}
+    for key in dirty:
+        vectors[key] = page_vector(counts[key], idf)
+
+    related = top_related(vectors, k=k)
+    if cache_path is not None:
+        state = {"digests": digests, "counts": counts, "df": df, "vectors": vectors}
+        _save(
+            cache_path,
+            {
+                "version": CACHE_VERSION,
+                "corpus": corpus,
+                "params": params,
+                "related": related,
+                "state": pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL),
+            },
+        )
+    return related
+
+
+# Markdown "Related" list for the page at `rel`; `titles` maps page paths to titles.
+def related_section(rel: str, related: list[tuple[str, float]], titles: dict[str, str]) -> str:
+    if not related:
+        return ""
+    base = posixpath.dirname(rel) or "."
+    lines = ["## Related", ""]
+    lines += [f"- [{titles[other]}]({posixpath.relpath(other, base)})" for other, _ in related]
+    return "\n".join(lines) + "\n"
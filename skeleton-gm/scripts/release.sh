@@ -7,6 +7,31 @@ GM_ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 EXPORT_SCRIPT="$GM_ROOT/scripts/export_public_entries.sh"
 
 COMPILE_SCRIPT="$PUBLIC_REPO_PATH/scripts/compile_guides.sh"
+LEAK_SCRIPT="$GM_ROOT/scripts/check_public_leaks.py"
+
+# Deterministic mode: identical inputs give byte-identical outputs, so the public
+# repo only sees real changes. Tools keep run timestamps out of generated files, and
+# pandoc/LaTeX date PDFs from the GM repo's last commit instead of the clock.
+export CAMPAIGN_DETERMINISTIC="${CAMPAIGN_DETERMINISTIC:-1}"
+if [[ "$CAMPAIGN_DETERMINISTIC" != "0" && -z "${SOURCE_DATE_EPOCH:-}" ]]; then
+  SOURCE_DATE_EPOCH="$(git -C "$GM_ROOT" log -1 --format=%ct 2>/dev/null || true)"
+  if [[ -n "$SOURCE_DATE_EPOCH" ]]; then
+    export SOURCE_DATE_EPOCH
+  else
+    unset SOURCE_DATE_EPOCH
+  fi
+fi
+
+# Modules the public repo's scripts share with this repo. Both copies must be
+# byte-identical, so the public book is built with the same code the GM book is.
+SHARED_SCRIPTS=(related_pages.py)
+for script in "${SHARED_SCRIPTS[@]}"; do
+  if ! cmp -s "$GM_ROOT/scripts/$script" "$PUBLIC_REPO_PATH/scripts/$script"; then
+    echo "ERROR: scripts/$script differs from $PUBLIC_REPO_PATH/scripts/$script." >&2
+    echo "Copy the GM version into the public repo, then release again." >&2
+    exit 1
+  fi
+done
 
 echo "== Exporting player-safe entries =="
 (
@@ -21,6 +46,15 @@ echo "== Compiling guides in public repo =="
   "$COMPILE_SCRIPT"
 )
 
+echo
+echo "== Checking public output for secrets =="
+# Fails the release (before anything is committed) if a term from a PRIVATE
+# `Secrets` list or `secrets:` front matter appears in content/ or docs/.
+(
+  cd "$GM_ROOT"
+  python3 "$LEAK_SCRIPT" "$PUBLIC_REPO_PATH"
+)
+
 echo
 echo "== Committing and pushing public repo =="
 (
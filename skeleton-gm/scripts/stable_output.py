@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import filecmp
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+
+# CAMPAIGN_DETERMINISTIC=1 (set by release.sh) keeps run-specific data such as
+# conversion timestamps out of generated files; tools put it in sidecars instead.
+def deterministic_default() -> bool:
+    return os.environ.get("CAMPAIGN_DETERMINISTIC", "") not in ("", "0")
+
+
+def write_bytes_if_changed(path: Path, data: bytes) -> bool:
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return True
+
+
+def write_text_if_changed(path: Path, text: str) -> bool:
+    return write_bytes_if_changed(path, text.encode("utf-8"))
+
+
+def copy_if_changed(src: Path, dst: Path) -> bool:
+    if dst.exists() and filecmp.cmp(src, dst, shallow=False):
+        return False
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(src, dst)
+    return True
+
+
+def replace_if_changed(tmp: Path, dst: Path) -> bool:
+    # For outputs streamed to a temp file: keep the old file (and its mtime) if identical.
+    if dst.exists() and filecmp.cmp(tmp, dst, shallow=False):
+        tmp.unlink()
+        return False
+    tmp.replace(dst)
+    return True
+
+
+# A generated directory that is updated in place instead of deleted and rebuilt:
+# files are rewritten only when their bytes change, and files this run did not
+# produce are removed by prune(). Identical inputs leave the tree untouched.
+class OutputTree:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.digests: dict[Path, str] = {}
+        self.changed = 0
+
+    def _record(self, path: Path, data: bytes) -> None:
+        self.digests[path.resolve()] = hashlib.sha256(data).hexdigest()
+
+    def write_text(self, path: Path, text: str) -> None:
+        self.write_bytes(path, text.encode("utf-8"))
+
+    def write_bytes(self, path: Path, data: bytes) -> None:
+        self._record(path, data)
+        self.changed += write_bytes_if_changed(path, data)
+
+    def copy(self, src: Path, dst: Path) -> None:
+        self._record(dst, src.read_bytes())
+        self.changed += copy_if_changed(src, dst)
+
+    # A file this run produces but did not regenerate, because its inputs (summarised
+    # by the caller) are the same as when `digest` was recorded.
+    def keep(self, path: Path, digest: str) -> None:
+        self.digests[path.resolve()] = digest
+
+    def files(self, under: Path | None = None) -> list[Path]:
+        base = (under or self.root).resolve()
+        return sorted((p for p in self.digests if p == base or base in p.parents), key=lambda p: p.as_posix())
+
+    # Digest of what this run wrote under `under` (paths relative to it, sorted).
+    def digest(self, under: Path) -> str:
+        base = under.resolve()
+        h = hashlib.sha256()
+        for p in self.files(base):
+            h.update(p.relative_to(base).as_posix().encode("utf-8") + b"\0")
+            h.update(self.digests[p].encode("ascii") + b"\0")
+        return h.hexdigest()
+
+    def prune(self) -> int:
+        if not self.root.exists():
+            return 0
+        removed = 0
+        for path in sorted(self.root.rglob("*"), key=lambda p: len(p.parts), reverse=True):
+            if path.is_dir():
+                try:
+                    path.rmdir()  # only succeeds once empty
+                except OSError:
+                    pass
+            elif path.resolve() not in self.digests:
+                path.unlink()
+                removed += 1
+        return removed
@@ -0,0 +1,774 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import copy
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import secrets
+import socket
+import sqlite3
+import struct
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from build_obsidian_vault import extract_public, get_status, parse_markdown
+from frontmatter import parse_front_matter
+
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_MESSAGE_BYTES = 1 << 20
+MAX_PENDING_PINGS = 8
+SNAPSHOT_EVERY = 200
+SEND_TIMEOUT = 10.0
+
+IMAGE_RE = re.compile(r"!\[[^\]]*\]\((?P<href>[^)\s]+)\)")
+
+DEFAULT_STATE: dict = {
+    "scene": {"item": "", "title": ""},
+    "map": {"item": "", "grid": [24, 16], "revealed": {}},
+    "encounter": {"active": False, "posture": "", "participants": {}},
+    "clocks": {},
+}
+
+
+# --- JSON merge patches (RFC 7386) -------------------------------------------------
+# State changes travel as merge patches: objects merge, `null` deletes, anything else
+# replaces. Fog cells are stored as {"x,y": true} so revealing one cell is a one-key
+# patch instead of a new mask.
+
+
+def apply_patch(target: object, patch: object) -> object:
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_patch(result.get(key), value)
+    return result
+
+
+def diff(old: dict, new: dict) -> dict:
+    patch: dict = {}
+    for key in old.keys() - new.keys():
+        patch[key] = None
+    for key, value in new.items():
+        before = old.get(key)
+        if before == value and key in old:
+            continue
+        if isinstance(value, dict) and isinstance(before, dict):
+            patch[key] = diff(before, value)
+        else:
+            patch[key] = copy.deepcopy(value)
+    return patch
+
+
+# Combines two patches into one that has the same effect as applying them in order,
+# so a slow client gets one catch-up message instead of a backlog. Returns None when
+# no single merge patch can: an object written over a key the first patch deleted or
+# set to a scalar must replace the old value, but in a merge patch it would be merged
+# into whatever object the client still holds there.
+def compose(first: dict, second: dict) -> dict | None:
+    result = dict(first)
+    for key, value in second.items():
+        prior = result.get(key)
+        if isinstance(value, dict) and isinstance(prior, dict):
+            merged = compose(prior, value)
+            if merged is None:
+                return None
+            result[key] = merged
+        elif isinstance(value, dict) and key in result:
+            return None
+        else:
+            result[key] = value
+    return result
+
+
+# --- Persistence -------------------------------------------------------------------
+
+
+class StateStore:
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path.as_posix(), isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot (id INTEGER PRIMARY KEY CHECK (id = 1), rev INTEGER, state TEXT)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS patches (rev INTEGER PRIMARY KEY, ts REAL, patch TEXT)")
+        self.since_snapshot = 0
+
+    def load(self) -> tuple[int, dict]:
+        row = self.db.execute("SELECT rev, state FROM snapshot WHERE id = 1").fetchone()
+        rev, state = (row[0], json.loads(row[1])) if row else (0, copy.deepcopy(DEFAULT_STATE))
+        for patch_rev, patch in self.db.execute("SELECT rev, patch FROM patches WHERE rev > ? ORDER BY rev", (rev,)):
+            state = apply_patch(state, json.loads(patch))
+            rev = patch_rev
+            self.since_snapshot += 1
+        return rev, state
+
+    def append(self, rev: int, patch: dict, state: dict) -> None:
+        self.db.execute("INSERT INTO patches (rev, ts, patch) VALUES (?, ?, ?)", (rev, time.time(), json.dumps(patch)))
+        self.since_snapshot += 1
+        if self.since_snapshot >= SNAPSHOT_EVERY:
+            self.db.execute("BEGIN")
+            self.db.execute("INSERT OR REPLACE INTO snapshot (id, rev, state) VALUES (1, ?, ?)", (rev, json.dumps(state)))
+            self.db.execute("DELETE FROM patches WHERE rev <= ?", (rev,))
+            self.db.execute("COMMIT")
+            self.since_snapshot = 0
+
+
+# --- Player-safe content -----------------------------------------------------------
+
+
+@dataclass
+class PublicPage:
+    mtime_ns: int
+    title: str
+    body: str
+    images: list[str]
+
+
+class PublicContent:
+    def __init__(self, root: Path, *, include_drafts: bool) -> None:
+        self.root = root
+        self.include_drafts = include_drafts
+        self.cache: dict[str, PublicPage] = {}
+        # rel -> mtime_ns of pages whose markers do not parse, so each is reported once.
+        self.broken: dict[str, int] = {}
+
+    def _resolve(self, rel: str) -> Path | None:
+        if not rel or not rel.endswith(".md"):
+            return None
+        path = (self.root / rel).resolve()
+        items = (self.root / "items").resolve()
+        if items not in path.parents or not path.is_file():
+            return None
+        return path
+
+    # The only way item text reaches /display: through extract_public, exactly as the
+    # exporter and the player-preview vault see it.
+    def page(self, rel: str) -> PublicPage | None:
+        path = self._resolve(rel)
+        if path is None:
+            return None
+        mtime_ns = path.stat().st_mtime_ns
+        cached = self.cache.get(rel)
+        if cached and cached.mtime_ns == mtime_ns:
+            return cached
+
+        text = path.read_text(encoding="utf-8")
+        front = parse_markdown(text).front_matter
+        if not self.include_drafts and get_status(front) != "published":
+            return None
+        # A malformed page is not public: it must not take down the flusher or a request.
+        try:
+            public = parse_markdown(extract_public(text, Path(rel)))
+        except ValueError as exc:
+            if self.broken.get(rel) != mtime_ns:
+                self.broken[rel] = mtime_ns
+                print(f"table_server: not shown: {exc}", file=sys.stderr)
+            return None
+        try:
+            title = str(parse_front_matter(public.front_matter).get("title") or path.stem)
+        except ValueError:
+            title = path.stem
+        images = []
+        for m in IMAGE_RE.finditer(public.body):
+            href = m.group("href").split("#", 1)[0]
+            if "://" in href:
+                continue
+            target = (path.parent / unquote(href)).resolve()
+            if self.root.resolve() in target.parents and target.is_file():
+                images.append(target.relative_to(self.root.resolve()).as_posix())
+        page = PublicPage(mtime_ns=mtime_ns, title=title, body=public.body.strip(), images=images)
+        self.cache[rel] = page
+        return page
+
+
+def project_display(state: dict, content: PublicContent) -> dict:
+    scene = state.get("scene", {})
+    page = content.page(scene.get("item", ""))
+    game_map = state.get("map", {})
+    map_page = content.page(game_map.get("item", ""))
+    return {
+        "scene": {"title": page.title, "body": page.body} if page else {"title": "", "body": ""},
+        "map": {
+            "image": f"/asset/{map_page.images[0]}" if map_page and map_page.images else "",
+            "grid": game_map.get("grid", [24, 16]),
+            "revealed": game_map.get("revealed", {}),
+        },
+        "clocks": {
+            name: {"label": c.get("label", name), "value": c.get("value", 0), "size": c.get("size", 4)}
+            for name, c in state.get("clocks", {}).items()
+            if isinstance(c, dict) and c.get("visible")
+        },
+    }
+
+
+# --- WebSocket framing (RFC 6455, server side) -------------------------------------
+
+
+class WebSocketClosed(Exception):
+    pass
+
+
+async def ws_read_message(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> str:
+    parts: list[bytes] = []
+    size = 0
+    while True:
+        head = await reader.readexactly(2)
+        fin, opcode = head[0] & 0x80, head[0] & 0x0F
+        masked, length = head[1] & 0x80, head[1] & 0x7F
+        if length == 126:
+            (length,) = struct.unpack("!H", await reader.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack("!Q", await reader.readexactly(8))
+        if not masked or length > MAX_MESSAGE_BYTES:
+            raise WebSocketClosed()
+        mask = await reader.readexactly(4)
+        data = bytearray(await reader.readexactly(length))
+        for i in range(length):
+            data[i] ^= mask[i & 3]
+
+        if opcode == 0x8:
+            raise WebSocketClosed()
+        if opcode == 0x9:
+            writer.write(ws_frame(bytes(data), opcode=0xA))
+            continue
+        if opcode == 0xA:
+            continue
+
+        size += length
+        if size > MAX_MESSAGE_BYTES:
+            raise WebSocketClosed()
+        parts.append(bytes(data))
+        if fin:
+            return b"".join(parts).decode("utf-8")
+
+
+def ws_frame(payload: bytes, *, opcode: int = 0x1) -> bytes:
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+# --- Clients and broadcast ---------------------------------------------------------
+
+
+@dataclass(eq=False)
+class Client:
+    role: str
+    writer: asyncio.StreamWriter
+    wake: asyncio.Event = field(default_factory=asyncio.Event)
+    snapshot: dict | None = None
+    pending: dict | None = None
+    rev: int = 0
+    pings: deque = field(default_factory=lambda: deque(maxlen=MAX_PENDING_PINGS))
+
+    @property
+    def audience(self) -> str:
+        return "display" if self.role == "display" else "dm"
+
+    # Updates are merged into whatever has not been sent yet, so a tablet on weak
+    # Wi-Fi always receives one up-to-date patch rather than a queue of stale ones.
+    # `view` is the audience's state after `patch`; it is sent as a snapshot when the
+    # unsent patches cannot be composed into one.
+    def queue_patch(self, rev: int, patch: dict, view: dict) -> None:
+        self.rev = rev
+        if self.snapshot is not None:
+            self.snapshot = apply_patch(self.snapshot, patch)
+        elif self.pending is None:
+            self.pending = patch
+        elif (composed := compose(self.pending, patch)) is not None:
+            self.pending = composed
+        else:
+            self.snapshot = copy.deepcopy(view)
+            self.pending = None
+        self.wake.set()
+
+    def queue_ping(self, ping: dict) -> None:
+        self.pings.append(ping)
+        self.wake.set()
+
+    async def run_sender(self) -> None:
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            frames: list[bytes] = []
+            if self.snapshot is not None:
+                msg = {"type": "snapshot", "rev": self.rev, "state": self.snapshot}
+                self.snapshot = None
+                self.pending = None
+                frames.append(ws_frame(json.dumps(msg, separators=(",", ":")).encode("utf-8")))
+            if self.pending is not None:
+                msg = {"type": "patch", "rev": self.rev, "patch": self.pending}
+                self.pending = None
+                frames.append(ws_frame(json.dumps(msg, separators=(",", ":")).encode("utf-8")))
+            while self.pings:
+                frames.append(ws_frame(json.dumps(self.pings.popleft(), separators=(",", ":")).encode("utf-8")))
+            if frames:
+                self.writer.write(b"".join(frames))
+                await asyncio.wait_for(self.writer.drain(), SEND_TIMEOUT)
+
+
+class TableHub:
+    def __init__(self, store: StateStore, content: PublicContent, *, tick: float) -> None:
+        self.store = store
+        self.content = content
+        self.tick = tick
+        self.rev, self.state = store.load()
+        self.sent: dict[str, dict] = {"dm": self.view("dm"), "display": self.view("display")}
+        self.clients: set[Client] = set()
+        self.dirty = asyncio.Event()
+
+    def view(self, audience: str) -> dict:
+        if audience == "display":
+            return project_display(self.state, self.content)
+        return self.state
+
+    def attach(self, client: Client) -> None:
+        client.rev = self.rev
+        client.snapshot = copy.deepcopy(self.sent[client.audience])
+        client.wake.set()
+        self.clients.add(client)
+
+    def apply(self, patch: dict) -> None:
+        self.state = apply_patch(self.state, patch)
+        self.dirty.set()
+
+    def ping(self, ping: dict) -> None:
+        for client in self.clients:
+            client.queue_ping(ping)
+
+    # Changes are flushed at most once per tick: a fog-painting drag that produces
+    # dozens of patches per second goes out as one diff per audience per tick.
+    async def run_flusher(self) -> None:
+        while True:
+            await self.dirty.wait()
+            await asyncio.sleep(self.tick)
+            self.dirty.clear()
+
+            dm_patch = diff(self.sent["dm"], self.state)
+            if not dm_patch:
+                continue
+            self.rev += 1
+            self.store.append(self.rev, dm_patch, self.state)
+            self.sent["dm"] = copy.deepcopy(self.state)
+
+            display_view = self.view("display")
+            display_patch = diff(self.sent["display"], display_view)
+            self.sent["display"] = display_view
+
+            for client in self.clients:
+                patch = dm_patch if client.audience == "dm" else display_patch
+                if patch:
+                    client.queue_patch(self.rev, patch, self.sent[client.audience])
+
+
+# --- HTTP --------------------------------------------------------------------------
+
+
+class TableServer:
+    def __init__(self, hub: TableHub, root: Path, *, dm_token: str, public_token: str) -> None:
+        self.hub = hub
+        self.root = root
+        self.tokens = {"dm": dm_token, "remote": dm_token, "display": public_token}
+
+    def _authorized(self, role: str, query: dict[str, list[str]]) -> bool:
+        token = (query.get("token") or [""])[0]
+        if role == "display":
+            return secrets.compare_digest(token, self.tokens["display"]) or secrets.compare_digest(
+                token, self.tokens["dm"]
+            )
+        return secrets.compare_digest(token, self.tokens.get(role, ""))
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            writer.close()
+            return
+        headers = {k.strip().lower(): v.strip() for k, _, v in (ln.partition(":") for ln in lines[1:] if ln)}
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+
+        try:
+            if url.path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self._websocket(reader, writer, headers, query)
+                return
+            if method != "GET":
+                self._respond(writer, 405, b"Method Not Allowed", "text/plain")
+            elif url.path in {"/dm", "/remote", "/display"}:
+                self._respond(writer, 200, PAGE_HTML.replace("__ROLE__", url.path[1:]).encode("utf-8"), "text/html")
+            elif url.path == "/api/items" and self._authorized("dm", query):
+                self._respond(writer, 200, json.dumps(self._items()).encode("utf-8"), "application/json")
+            elif url.path.startswith("/asset/") and self._authorized("display", query):
+                self._asset(writer, unquote(url.path[len("/asset/") :]))
+            else:
+                self._respond(writer, 404, b"Not Found", "text/plain")
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if not writer.is_closing():
+                writer.close()
+
+    def _respond(self, writer: asyncio.StreamWriter, status: int, body: bytes, ctype: str) -> None:
+        reason = {200: "OK", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed"}.get(status, "")
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: {ctype}; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nCache-Control: no-store\r\nConnection: close\r\n\r\n".encode("latin-1")
+            + body
+        )
+
+    def _items(self) -> list[dict]:
+        items_dir = self.root / "items"
+        out = []
+        for path in sorted(items_dir.rglob("*.md")):
+            rel = path.relative_to(self.root).as_posix()
+            page = self.hub.content.page(rel)
+            out.append({"path": rel, "title": page.title if page else path.stem, "public": page is not None})
+        return out
+
+    # Assets are only served when a PUBLIC block currently on the display links them.
+    def _asset(self, writer: asyncio.StreamWriter, rel: str) -> None:
+        allowed: set[str] = set()
+        for key in ("scene", "map"):
+            page = self.hub.content.page(self.hub.state.get(key, {}).get("item", ""))
+            if page:
+                allowed.update(page.images)
+        if rel not in allowed:
+            self._respond(writer, 403, b"Forbidden", "text/plain")
+            return
+        ctype = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        self._respond(writer, 200, (self.root / rel).read_bytes(), ctype)
+
+    async def _websocket(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        headers: dict[str, str],
+        query: dict[str, list[str]],
+    ) -> None:
+        role = (query.get("role") or ["display"])[0]
+        if role not in self.tokens or not self._authorized(role, query):
+            self._respond(writer, 403, b"Forbidden", "text/plain")
+            await writer.drain()
+            return
+
+        accept = base64.b64encode(hashlib.sha1((headers.get("sec-websocket-key", "") + WS_GUID).encode()).digest())
+        writer.write(
+            b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+        )
+
+        client = Client(role=role, writer=writer)
+        self.hub.attach(client)
+        sender = asyncio.create_task(client.run_sender())
+        try:
+            while not sender.done():
+                raw = await ws_read_message(reader, writer)
+                self._on_message(client, raw)
+        except (WebSocketClosed, asyncio.IncompleteReadError, ConnectionError, UnicodeDecodeError):
+            pass
+        finally:
+            self.hub.clients.discard(client)
+            sender.cancel()
+
+    def _on_message(self, client: Client, raw: str) -> None:
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            return
+        if not isinstance(msg, dict):
+            return
+        op = msg.get("op")
+        if op == "ping":
+            try:
+                x, y = float(msg["x"]), float(msg["y"])
+            except (KeyError, TypeError, ValueError):
+                return
+            self.hub.ping({"type": "ping", "x": x, "y": y, "from": client.role})
+        elif op == "patch" and client.role in {"dm", "remote"} and isinstance(msg.get("patch"), dict):
+            # Proposals from other tools go through the DM UI; only DM-token clients mutate state.
+            self.hub.apply(msg["patch"])
+
+
+PAGE_HTML = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Table: __ROLE__</title>
+<style>
+  body { margin: 0; font: 16px system-ui, sans-serif; background: #111; color: #eee; }
+  header { padding: .5rem 1rem; background: #222; display: flex; gap: .5rem; align-items: center; flex-wrap: wrap; }
+  main { display: grid; grid-template-columns: minmax(0, 2fr) minmax(0, 1fr); gap: 1rem; padding: 1rem; }
+  body.remote main, body.display main { grid-template-columns: 1fr; }
+  canvas { width: 100%; background: #333; touch-action: none; border-radius: 4px; }
+  #scene-body { white-space: pre-wrap; line-height: 1.4; }
+  button { font-size: 1rem; padding: .5rem .8rem; border-radius: 6px; border: 0; background: #445; color: #eee; }
+  body.remote button { font-size: 1.4rem; padding: 1rem 1.4rem; }
+  .clock { display: flex; gap: .5rem; align-items: center; margin: .3rem 0; }
+  #status { margin-left: auto; font-size: .8rem; opacity: .7; }
+  textarea, input, select { width: 100%; box-sizing: border-box; background: #222; color: #eee; border: 1px solid #444; }
+  .dm-only { display: none; }
+  body.dm .dm-only, body.remote .remote-ok { display: block; }
+</style>
+</head>
+<body class="__ROLE__">
+<header><strong id="scene-title">…</strong><span id="status">connecting</span></header>
+<main>
+  <section>
+    <canvas id="map" width="960" height="640"></canvas>
+    <div id="scene-body"></div>
+  </section>
+  <aside>
+    <div id="clocks"></div>
+    <div class="dm-only remote-ok">
+      <p><button id="paint-reveal">Reveal</button> <button id="paint-hide">Hide</button>
+         <button id="reveal-all">Reveal all</button> <button id="hide-all">Hide all</button></p>
+    </div>
+    <div class="dm-only">
+      <label>Scene item <select id="scene-item"></select></label>
+      <label>Map item <select id="map-item"></select></label>
+      <label>Raw patch <textarea id="raw" rows="6">{"clocks": {"alarm": {"label": "Alarm", "value": 0, "size": 6, "visible": true}}}</textarea></label>
+      <button id="send-raw">Apply patch</button>
+      <pre id="state"></pre>
+    </div>
+  </aside>
+</main>
+<script>
+const ROLE = "__ROLE__";
+const params = new URLSearchParams(location.search);
+const TOKEN = params.get("token") || "";
+let state = null, ws = null, backoff = 250, paint = true, pings = [];
+
+function applyPatch(target, patch) {
+  if (patch === null || typeof patch !== "object" || Array.isArray(patch)) return patch;
+  const out = (target && typeof target === "object" && !Array.isArray(target)) ? {...target} : {};
+  for (const [k, v] of Object.entries(patch)) {
+    if (v === null) delete out[k]; else out[k] = applyPatch(out[k], v);
+  }
+  return out;
+}
+
+// Local edits are batched per animation frame so dragging across the fog sends one patch.
+let outbox = null;
+function propose(patch) {
+  if (ROLE === "display") return;
+  outbox = outbox ? mergeProposal(outbox, patch) : patch;
+  requestAnimationFrame(() => {
+    if (outbox && ws && ws.readyState === 1) ws.send(JSON.stringify({op: "patch", patch: outbox}));
+    outbox = null;
+  });
+}
+function mergeProposal(a, b) {
+  const out = {...a};
+  for (const [k, v] of Object.entries(b)) {
+    out[k] = (v && typeof v === "object" && out[k] && typeof out[k] === "object") ? mergeProposal(out[k], v) : v;
+  }
+  return out;
+}
+
+function connect() {
+  const proto = location.protocol === "https:" ? "wss" : "ws";
+  ws = new WebSocket(`${proto}://${location.host}/ws?role=${ROLE}&token=${encodeURIComponent(TOKEN)}`);
+  ws.onopen = () => { backoff = 250; document.getElementById("status").textContent = "live"; };
+  ws.onclose = () => {
+    document.getElementById("status").textContent = "reconnecting";
+    setTimeout(connect, backoff); backoff = Math.min(backoff * 2, 5000);
+  };
+  ws.onmessage = (ev) => {
+    const msg = JSON.parse(ev.data);
+    if (msg.type === "snapshot") state = msg.state;
+    else if (msg.type === "patch") state = applyPatch(state, msg.patch);
+    else if (msg.type === "ping") { pings.push({...msg, t: performance.now()}); }
+    schedule();
+  };
+}
+
+let scheduled = false;
+function schedule() { if (!scheduled) { scheduled = true; requestAnimationFrame(render); } }
+
+const canvas = document.getElementById("map"), ctx = canvas.getContext("2d");
+const mapImage = new Image(); let mapImageSrc = "";
+mapImage.onload = schedule;
+
+function render() {
+  scheduled = false;
+  if (!state) return;
+  const scene = state.scene || {};
+  document.getElementById("scene-title").textContent = scene.title || scene.item || "";
+  document.getElementById("scene-body").textContent = ROLE === "display" ? (scene.body || "") : "";
+  const m = state.map || {}, [gw, gh] = m.grid || [24, 16], revealed = m.revealed || {};
+  const src = ROLE === "display" ? m.image : "";
+  if (src && src !== mapImageSrc) { mapImageSrc = src; mapImage.src = src + "?token=" + encodeURIComponent(TOKEN); }
+  ctx.clearRect(0, 0, canvas.width, canvas.height);
+  if (mapImageSrc && mapImage.complete) ctx.drawImage(mapImage, 0, 0, canvas.width, canvas.height);
+  const cw = canvas.width / gw, ch = canvas.height / gh;
+  ctx.fillStyle = ROLE === "display" ? "#000" : "rgba(0,0,0,.55)";
+  for (let y = 0; y < gh; y++) for (let x = 0; x < gw; x++) {
+    if (!revealed[`${x},${y}`]) ctx.fillRect(x * cw, y * ch, cw + .5, ch + .5);
+  }
+  const now = performance.now();
+  pings = pings.filter(p => now - p.t < 1500);
+  for (const p of pings) {
+    const age = (now - p.t) / 1500;
+    ctx.strokeStyle = `rgba(255,200,0,${1 - age})`; ctx.lineWidth = 4;
+    ctx.beginPath(); ctx.arc(p.x * canvas.width, p.y * canvas.height, 10 + 40 * age, 0, 2 * Math.PI); ctx.stroke();
+  }
+  if (pings.length) schedule();
+  const clocks = document.getElementById("clocks"); clocks.innerHTML = "";
+  for (const [name, c] of Object.entries(state.clocks || {})) {
+    const row = document.createElement("div"); row.className = "clock";
+    const label = document.createElement("span");
+    label.textContent = `${c.label || name}: ${c.value || 0}/${c.size || 4}` + (ROLE !== "display" && !c.visible ? " (hidden)" : "");
+    row.appendChild(label);
+    if (ROLE !== "display") {
+      for (const [text, d] of [["−", -1], ["+", 1]]) {
+        const b = document.createElement("button"); b.textContent = text;
+        b.onclick = () => propose({clocks: {[name]: {value: Math.max(0, Math.min(c.size || 4, (c.value || 0) + d))}}});
+        row.appendChild(b);
+      }
+    }
+    clocks.appendChild(row);
+  }
+  if (ROLE === "dm") document.getElementById("state").textContent = JSON.stringify(state, null, 2);
+}
+
+function cellAt(ev) {
+  const r = canvas.getBoundingClientRect(), [gw, gh] = (state.map || {}).grid || [24, 16];
+  const fx = (ev.clientX - r.left) / r.width, fy = (ev.clientY - r.top) / r.height;
+  return {fx, fy, key: `${Math.floor(fx * gw)},${Math.floor(fy * gh)}`};
+}
+let dragging = false;
+canvas.addEventListener("pointerdown", (ev) => {
+  if (!state) return;
+  const c = cellAt(ev);
+  if (ROLE === "display" || ev.shiftKey) { ws.send(JSON.stringify({op: "ping", x: c.fx, y: c.fy})); return; }
+  dragging = true; propose({map: {revealed: {[c.key]: paint ? true : null}}});
+});
+canvas.addEventListener("pointermove", (ev) => {
+  if (dragging) propose({map: {revealed: {[cellAt(ev).key]: paint ? true : null}}});
+});
+addEventListener("pointerup", () => { dragging = false; });
+
+if (ROLE !== "display") {
+  document.getElementById("paint-reveal").onclick = () => { paint = true; };
+  document.getElementById("paint-hide").onclick = () => { paint = false; };
+  document.getElementById("reveal-all").onclick = () => {
+    const [gw, gh] = state.map.grid, cells = {};
+    for (let y = 0; y < gh; y++) for (let x = 0; x < gw; x++) cells[`${x},${y}`] = true;
+    propose({map: {revealed: cells}});
+  };
+  document.getElementById("hide-all").onclick = () => {
+    const cells = {}; for (const k of Object.keys(state.map.revealed || {})) cells[k] = null;
+    propose({map: {revealed: cells}});
+  };
+}
+if (ROLE === "dm") {
+  fetch(`/api/items?token=${encodeURIComponent(TOKEN)}`).then(r => r.json()).then(items => {
+    for (const id of ["scene-item", "map-item"]) {
+      const sel = document.getElementById(id);
+      sel.add(new Option("(none)", ""));
+      for (const it of items) sel.add(new Option(`${it.title}${it.public ? "" : " (not public)"}`, it.path));
+      sel.onchange = () => propose(id === "scene-item" ? {scene: {item: sel.value}} : {map: {item: sel.value}});
+    }
+  });
+  document.getElementById("send-raw").onclick = () => propose(JSON.parse(document.getElementById("raw").value));
+}
+connect();
+</script>
+</body>
+</html>
+"""
+
+
+async def serve(args: argparse.Namespace) -> None:
+    root = Path(args.root).resolve()
+    content = PublicContent(root, include_drafts=bool(args.include_drafts))
+    store = StateStore(root / args.db)
+    hub = TableHub(store, content, tick=args.tick_ms / 1000.0)
+
+    dm_token = args.dm_token or os.environ.get("TABLE_DM_TOKEN") or secrets.token_urlsafe(12)
+    public_token = args.public_token or os.environ.get("TABLE_PUBLIC_TOKEN") or secrets.token_urlsafe(8)
+    server = TableServer(hub, root, dm_token=dm_token, public_token=public_token)
+
+    srv = await asyncio.start_server(server.handle, host=args.host, port=args.port)
+    base = f"http://{args.host if args.host != '0.0.0.0' else socket.gethostname()}:{args.port}"
+    print(f"DM:      {base}/dm?token={dm_token}")
+    print(f"Remote:  {base}/remote?token={dm_token}")
+    print(f"Display: {base}/display?token={public_token}")
+    sys.stdout.flush()
+
+    flusher = asyncio.create_task(hub.run_flusher())
+    try:
+        async with srv:
+            await srv.serve_forever()
+    finally:
+        flusher.cancel()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve the DM table app (/dm, /remote, /display) on the local network.")
+    parser.add_argument("--root", default=".", help="GM repo root (default: .).")
+    parser.add_argument("--host", default="0.0.0.0", help="Bind address (default: 0.0.0.0).")
+    parser.add_argument("--port", type=int, default=8765, help="Port (default: 8765).")
+    parser.add_argument(
+        "--db",
+        default=".cache/table-state.sqlite3",
+        help="SQLite state file, relative to --root (default: .cache/table-state.sqlite3).",
+    )
+    parser.add_argument("--dm-token", help="Token for /dm and /remote (default: $TABLE_DM_TOKEN or random).")
+    parser.add_argument("--public-token", help="Token for /display (default: $TABLE_PUBLIC_TOKEN or random).")
+    parser.add_argument(
+        "--include-drafts",
+        action="store_true",
+        help="Allow any item status on /display (still PUBLIC-only).",
+    )
+    parser.add_argument(
+        "--tick-ms",
+        type=int,
+        default=33,
+        help="Coalescing window for broadcasts in milliseconds (default: 33).",
+    )
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+
+MARKER_RE = re.compile(r"<!--\s*(?P<kind>PUBLIC|PRIVATE)_(?P<edge>START|END)\s*-->")
+
+PLAIN = "plain"
+PUBLIC = "public"
+PRIVATE = "private"
+
+
+class MarkerError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Block:
+    kind: str  # plain | public | private
+    start_line: int  # 1-based; the opening marker line for public/private blocks
+    lines: tuple[str, ...]
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+# Splits a body into plain/public/private blocks with one regex scan over the whole
+# text. Lines that carry a marker are dropped, as every consumer did before.
+# Nested, crossed, stray or unclosed markers raise MarkerError as "source:line: ...".
+# `line_offset` is the number of lines before `body` in the file (front matter).
+def tokenize(body: str, *, source: str = "<body>", line_offset: int = 0) -> list[Block]:
+    blocks: list[Block] = []
+    open_kind = PLAIN
+    open_line = 0
+
+    content_start = 0  # offset of the first line after the previous marker line
+    content_line = line_offset + 1  # line number at content_start
+
+    for m in MARKER_RE.finditer(body):
+        line_start = body.rfind("\n", 0, m.start()) + 1
+        if line_start >= content_start:
+            marker_line = content_line + body.count("\n", content_start, line_start)
+            chunk = body[content_start:line_start]
+        else:
+            # Another marker on a line that has already been consumed.
+            marker_line = content_line - 1
+            chunk = ""
+        lines = tuple(chunk[:-1].split("\n")) if chunk else ()
+
+        kind = m.group("kind").lower()
+        where = f"{source}:{marker_line}"
+        if m.group("edge") == "START":
+            if open_kind != PLAIN:
+                raise MarkerError(
+                    f"{where}: {kind.upper()}_START inside {open_kind.upper()} block opened at line {open_line}"
+                )
+            if lines:
+                blocks.append(Block(kind=PLAIN, start_line=content_line, lines=lines))
+            open_kind, open_line = kind, marker_line
+        else:
+            if open_kind == PLAIN:
+                raise MarkerError(f"{where}: {kind.upper()}_END without a matching {kind.upper()}_START")
+            if open_kind != kind:
+                raise MarkerError(
+                    f"{where}: {kind.upper()}_END closes {open_kind.upper()} block opened at line {open_line}"
+                )
+            blocks.append(Block(kind=open_kind, start_line=open_line, lines=lines))
+            open_kind = PLAIN
+
+        line_end = body.find("\n", m.end())
+        content_start = max(content_start, len(body) if line_end == -1 else line_end + 1)
+        content_line = marker_line + 1
+
+    if open_kind != PLAIN:
+        raise MarkerError(f"{source}:{open_line}: unclosed {open_kind.upper()} block")
+
+    tail = body[content_start:]
+    if tail:
+        if tail.endswith("\n"):
+            tail = tail[:-1]
+        blocks.append(Block(kind=PLAIN, start_line=content_line, lines=tuple(tail.split("\n"))))
+
+    return blocks
+
+
+# Neutralises markers inside imported text (reference PDFs, conversation exports) so it
+# can never open or close a block. Anything `tokenize` would treat as a marker is escaped.
+def escape_markers(text: str) -> str:
+    return MARKER_RE.sub(lambda m: m.group(0).replace("<", "&lt;").replace(">", "&gt;"), text)
+
+
+def line_offset_of(text: str, body: str) -> int:
+    return text.count("\n", 0, len(text) - len(body))
+
+
+def public_body(blocks: list[Block]) -> str:
+    return "\n".join(line for b in blocks if b.kind == PUBLIC for line in b.lines).strip()
+
+
+def count_blocks(blocks: list[Block], kind: str) -> int:
+    return sum(1 for b in blocks if b.kind == kind)
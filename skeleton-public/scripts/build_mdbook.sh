@@ -6,6 +6,9 @@ ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 MANIFEST="${1:-$ROOT_DIR/manifests/theplayerguide.manifest}"
 OUT_SRC_DIR="${OUT_SRC_DIR:-$ROOT_DIR/.mdbook-src}"
 OUT_SITE_DIR="${OUT_SITE_DIR:-$ROOT_DIR/site}"
+# Post-build pass: downscale content images, hash asset names, write .gz/.br siblings.
+SITE_OPTIMIZE="${SITE_OPTIMIZE:-1}"
+SITE_CACHE_DIR="${SITE_CACHE_DIR:-$ROOT_DIR/.cache/site-optimize}"
 
 python3 "$ROOT_DIR/scripts/generate_mdbook.py" \
   --root "$ROOT_DIR" \
@@ -16,6 +19,15 @@ python3 "$ROOT_DIR/scripts/generate_mdbook.py" \
 if command -v mdbook >/dev/null 2>&1; then
   rm -rf "$OUT_SITE_DIR"
   mdbook build "$OUT_SRC_DIR" -d "$OUT_SITE_DIR"
+  # Publish the GM export's single-file bundle next to the site, if there is one.
+  for bundle in "$ROOT_DIR"/content.json "$ROOT_DIR"/content.json.gz; do
+    if [[ -f "$bundle" ]]; then
+      cp "$bundle" "$OUT_SITE_DIR/"
+    fi
+  done
+  if [[ "$SITE_OPTIMIZE" != "0" ]]; then
+    python3 "$ROOT_DIR/scripts/optimize_site.py" "$OUT_SITE_DIR" --cache-dir "$SITE_CACHE_DIR"
+  fi
   echo "Wrote site: $OUT_SITE_DIR/index.html"
 else
   echo "mdbook is not installed; generated sources only: $OUT_SRC_DIR"
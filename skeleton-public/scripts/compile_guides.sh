@@ -11,45 +11,11 @@ fi
 
 trim() { sed -E 's/^[[:space:]]+//; s/[[:space:]]+$//'; }
 
-slugify() {
-  echo "$1" \
-    | tr '[:upper:]' '[:lower:]' \
-    | sed -E 's/[^a-z0-9[:space:]-]//g; s/[[:space:]]+/-/g; s/-+/-/g; s/^-|-$//g'
-}
-
 has_pandoc() { command -v pandoc >/dev/null 2>&1; }
 
-extract_title() {
-  local file="$1"
-  python3 - <<PY
-from pathlib import Path
-import re
-p = Path("$file")
-text = p.read_text(encoding="utf-8")
-m = re.match(r"^---\\s*\\n(.*?)\\n---\\s*\\n(.*)$", text, re.S)
-front = m.group(1) if m else ""
-body = m.group(2) if m else text
-m_title = re.search(r"^title:\\s*(.+)\\s*$", front, re.M)
-if m_title:
-    print(m_title.group(1).strip()); raise SystemExit(0)
-m_h1 = re.search(r"^#\\s+(.+)$", body, re.M)
-print(m_h1.group(1).strip() if m_h1 else p.stem)
-PY
-}
-
-strip_frontmatter_and_h1() {
-  local file="$1"
-  python3 - <<PY
-from pathlib import Path
-import re
-text = Path("$file").read_text(encoding="utf-8")
-m = re.match(r"^---\\s*\\n(.*?)\\n---\\s*\\n(.*)$", text, re.S)
-if m:
-    text = m.group(2)
-text = re.sub(r"^#\\s+.*\\n", "", text, count=1)
-print(text.strip())
-PY
-}
+FRAGMENT_CACHE_DIR="${FRAGMENT_CACHE_DIR:-$ROOT_DIR/.cache/guide-fragments}"
+USED_FRAGMENTS="$(mktemp "${TMPDIR:-/tmp}/guide-fragments.XXXXXX")"
+trap 'rm -f "$USED_FRAGMENTS"' EXIT
 
 expand_include() {
   local path="$1"
@@ -144,50 +110,21 @@ compile_manifest() {
     return 0
   fi
 
-  {
-    echo "# $TITLE"
-    echo
-    echo "> This document reflects common knowledge in the world. Rumors, myths, and errors may be present."
-    echo
-    echo "## Table of Contents"
-    echo
-  } > "$OUT_MD"
-
-  for f in "${files[@]}"; do
-    t="$(extract_title "$f")"
-    slug="$(slugify "$t")"
-    rel="${f#$ROOT_DIR/}"
-    echo "- [$t](#$slug)  \`$rel\`" >> "$OUT_MD"
-  done
-
-  {
-    echo
-    echo "---"
-    echo
-  } >> "$OUT_MD"
-
-  local last_idx=$(( ${#files[@]} - 1 ))
-  for idx in "${!files[@]}"; do
-    f="${files[$idx]}"
-    t="$(extract_title "$f")"
-    rel="${f#$ROOT_DIR/}"
-    body="$(strip_frontmatter_and_h1 "$f")"
-    {
-      echo "## $t"
-      echo
-      echo "_Source: \`$rel\`_"
-      echo
-      if [[ -n "$body" ]]; then
-        echo "$body"
-        echo
-      fi
-      echo "---"
-    } >> "$OUT_MD"
-
-    if [[ "$idx" -lt "$last_idx" ]]; then
-      echo >> "$OUT_MD"
-    fi
-  done
+  # Each file's TOC line and body section are cached by content hash, so after an
+  # edit only that file is re-rendered; the guide itself is a concatenation.
+  local status
+  status="$(python3 "$ROOT_DIR/scripts/guide_fragments.py" assemble \
+    --root "$ROOT_DIR" \
+    --cache-dir "$FRAGMENT_CACHE_DIR" \
+    --record-used "$USED_FRAGMENTS" \
+    --title "$TITLE" \
+    --out "$OUT_MD" \
+    "${files[@]}")"
+
+  if [[ "$status" == "unchanged" ]] && { [[ -f "$OUT_PDF" ]] || ! has_pandoc; }; then
+    echo "Unchanged: $OUT_MD"
+    return 0
+  fi
 
   echo "Wrote: $OUT_MD"
   if has_pandoc; then
@@ -208,5 +145,9 @@ for m in "${manifests[@]}"; do
   compile_manifest "$m"
 done
 
+python3 "$ROOT_DIR/scripts/guide_fragments.py" prune \
+  --cache-dir "$FRAGMENT_CACHE_DIR" \
+  --used "$USED_FRAGMENTS"
+
 echo
 echo "All guides compiled."
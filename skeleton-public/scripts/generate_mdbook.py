@@ -4,18 +4,35 @@ from __future__ import annotations
 import argparse
 import fnmatch
 import re
-import shutil
 from dataclasses import dataclass
 from pathlib import Path
 
+from related_pages import DEFAULT_RELATED, related_pages, related_section
+
 
 def _read_text(path: Path) -> str:
     return path.read_text(encoding="utf-8")
 
 
-def _write_text(path: Path, text: str) -> None:
+# Sources are updated in place: a file is rewritten only when its bytes change, so
+# identical inputs leave the tree (and mdBook's view of it) untouched.
+def _write_text(path: Path, text: str, written: set[Path]) -> None:
+    written.add(path.resolve())
+    data = text.encode("utf-8")
+    if path.exists() and path.read_bytes() == data:
+        return
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(text, encoding="utf-8")
+    path.write_bytes(data)
+
+
+def _prune(out_src: Path, written: set[Path]) -> None:
+    # Drop files from earlier runs that this run did not produce, then empty dirs.
+    for path in sorted(out_src.rglob("*"), key=lambda p: len(p.parts), reverse=True):
+        if path.is_dir():
+            if not any(path.iterdir()):
+                path.rmdir()
+        elif path.resolve() not in written:
+            path.unlink()
 
 
 def _strip_frontmatter(md: str) -> tuple[str, str]:
@@ -96,6 +113,12 @@ def main() -> int:
     ap.add_argument("--manifest", required=True, help="Path to a .manifest file.")
     ap.add_argument("--out-src", required=True, help="Output directory for mdBook sources.")
     ap.add_argument("--title", required=True, help="Book title.")
+    ap.add_argument(
+        "--related",
+        type=int,
+        default=DEFAULT_RELATED,
+        help=f"Related pages listed at the end of each page (default: {DEFAULT_RELATED}; 0 disables).",
+    )
     args = ap.parse_args()
 
     root = Path(args.root).resolve()
@@ -105,9 +128,7 @@ def main() -> int:
     manifest = _parse_manifest(manifest_path)
 
     src_dir = out_src / "src"
-    if out_src.exists():
-        shutil.rmtree(out_src)
-    src_dir.mkdir(parents=True, exist_ok=True)
+    written: set[Path] = set()
 
     book_toml = "\n".join(
         [
@@ -121,7 +142,7 @@ def main() -> int:
             "",
         ]
     )
-    _write_text(out_src / "book.toml", book_toml)
+    _write_text(out_src / "book.toml", book_toml, written)
 
     files: list[Path] = []
     for inc in manifest.includes:
@@ -135,9 +156,10 @@ def main() -> int:
     filtered = [f for f in files if not _is_excluded(root, f, manifest.excludes)]
 
     pages: list[tuple[str, str]] = []
+    texts: dict[str, str] = {}
+    plain: dict[str, str] = {}
     for f in filtered:
         rel = f.relative_to(root).as_posix()
-        dest = src_dir / rel
 
         raw = _read_text(f)
         front, body = _strip_frontmatter(raw)
@@ -155,9 +177,19 @@ def main() -> int:
             ]
         ).rstrip() + "\n"
 
-        _write_text(dest, page)
+        texts[rel] = page
+        plain[rel] = f"{title}\n{body}"
         pages.append((rel, title))
 
+    # Content here is already player-safe (the GM export writes PUBLIC blocks only), so
+    # the similarity never sees GM text. Counts are cached per manifest.
+    titles = dict(pages)
+    cache_path = root / ".cache" / "related-pages" / f"{manifest_path.stem}.pickle"
+    related = related_pages(plain, k=args.related, cache_path=cache_path)
+    for rel, _ in pages:
+        section = related_section(rel, related[rel], titles)
+        _write_text(src_dir / rel, f"{texts[rel]}\n{section}" if section else texts[rel], written)
+
     _write_text(
         src_dir / "index.md",
         "\n".join(
@@ -170,6 +202,7 @@ def main() -> int:
                 "",
             ]
         ),
+        written,
     )
 
     by_section: dict[str, list[tuple[str, str]]] = {}
@@ -197,9 +230,11 @@ def main() -> int:
             + [f"- [{title}](../{rel})" for rel, title in section_items]
             + [""]
         )
-        _write_text(sections_dir / f"{section}.md", section_md)
+        _write_text(sections_dir / f"{section}.md", section_md, written)
+
+    _write_text(src_dir / "SUMMARY.md", "\n".join(summary_lines).rstrip() + "\n", written)
 
-    _write_text(src_dir / "SUMMARY.md", "\n".join(summary_lines).rstrip() + "\n")
+    _prune(out_src, written)
 
     print(f"Wrote mdBook sources: {out_src}")
     return 0
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+
+# Bump when the fragment format changes so old cache entries are ignored.
+FRAGMENT_VERSION = "1"
+
+FRONT_MATTER_RE = re.compile(r"^---\s*\n(.*?)\n---\s*\n(.*)$", re.S)
+TITLE_RE = re.compile(r"^title:\s*(.+)\s*$", re.M)
+H1_RE = re.compile(r"^#\s+(.+)$", re.M)
+
+GUIDE_NOTE = "> This document reflects common knowledge in the world. Rumors, myths, and errors may be present."
+
+
+@dataclass(frozen=True)
+class Fragment:
+    toc: str
+    section: str
+
+
+def _slugify(title: str) -> str:
+    # Mirrors the shell slugify (ASCII tr + sed) so TOC anchors stay identical.
+    value = "".join(chr(ord(c) + 32) if "A" <= c <= "Z" else c for c in title)
+    value = re.sub(r"[^a-z0-9 \t\n\r\f\v-]", "", value)
+    value = re.sub(r"[ \t\n\r\f\v]+", "-", value)
+    value = re.sub(r"-+", "-", value)
+    return re.sub(r"^-|-$", "", value)
+
+
+def render_fragment(path: Path, rel: str) -> Fragment:
+    text = path.read_text(encoding="utf-8")
+    m = FRONT_MATTER_RE.match(text)
+    front = m.group(1) if m else ""
+    body = m.group(2) if m else text
+
+    m_title = TITLE_RE.search(front)
+    if m_title:
+        title = m_title.group(1).strip()
+    else:
+        m_h1 = H1_RE.search(body)
+        title = m_h1.group(1).strip() if m_h1 else path.stem
+
+    stripped = re.sub(r"^#\s+.*\n", "", body, count=1).strip()
+
+    section = [f"## {title}", "", f"_Source: `{rel}`_", ""]
+    if stripped:
+        section += [stripped, ""]
+    section.append("---")
+
+    return Fragment(toc=f"- [{title}](#{_slugify(title)})  `{rel}`", section="\n".join(section))
+
+
+def _cache_key(rel: str, data: bytes) -> str:
+    h = hashlib.sha256()
+    h.update(FRAGMENT_VERSION.encode("utf-8") + b"\0" + rel.encode("utf-8") + b"\0")
+    h.update(data)
+    return h.hexdigest()
+
+
+def load_fragment(path: Path, rel: str, cache_dir: Path, used: list[str]) -> Fragment:
+    key = _cache_key(rel, path.read_bytes())
+    used.append(key)
+    entry = cache_dir / key[:2] / f"{key}.json"
+    if entry.exists():
+        try:
+            data = json.loads(entry.read_text(encoding="utf-8"))
+            return Fragment(toc=data["toc"], section=data["section"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    fragment = render_fragment(path, rel)
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"toc": fragment.toc, "section": fragment.section}), encoding="utf-8")
+    tmp.replace(entry)
+    return fragment
+
+
+def assemble(title: str, fragments: list[Fragment]) -> str:
+    lines = [f"# {title}", "", GUIDE_NOTE, "", "## Table of Contents", ""]
+    lines += [f.toc for f in fragments]
+    lines += ["", "---", ""]
+    return "\n".join(lines) + "\n" + "\n\n".join(f.section for f in fragments) + "\n"
+
+
+def cmd_assemble(args: argparse.Namespace) -> int:
+    root = Path(args.root).resolve()
+    cache_dir = Path(args.cache_dir)
+    out_md = Path(args.out)
+
+    used: list[str] = []
+    fragments = []
+    for f in args.files:
+        path = Path(f)
+        rel = path.resolve().relative_to(root).as_posix()
+        fragments.append(load_fragment(path, rel, cache_dir, used))
+
+    text = assemble(args.title, fragments)
+
+    if args.record_used:
+        with open(args.record_used, "a", encoding="utf-8") as fh:
+            fh.write("".join(f"{k}\n" for k in used))
+
+    if out_md.exists() and out_md.read_text(encoding="utf-8") == text:
+        print("unchanged")
+        return 0
+    out_md.parent.mkdir(parents=True, exist_ok=True)
+    out_md.write_text(text, encoding="utf-8")
+    print("changed")
+    return 0
+
+
+def cmd_prune(args: argparse.Namespace) -> int:
+    cache_dir = Path(args.cache_dir)
+    if not cache_dir.exists():
+        return 0
+    keep = set(Path(args.used).read_text(encoding="utf-8").split())
+    removed = 0
+    for entry in cache_dir.glob("*/*.json"):
+        if entry.stem not in keep:
+            entry.unlink()
+            removed += 1
+    if removed:
+        print(f"Pruned {removed} stale guide fragment(s).")
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Assemble guides from cached per-file fragments.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    ap_asm = sub.add_parser("assemble", help="Write one guide from its (already filtered, sorted) files.")
+    ap_asm.add_argument("--root", required=True, help="Repo root directory.")
+    ap_asm.add_argument("--cache-dir", required=True, help="Fragment cache directory.")
+    ap_asm.add_argument("--title", required=True, help="Guide title.")
+    ap_asm.add_argument("--out", required=True, help="Output Markdown path.")
+    ap_asm.add_argument("--record-used", help="Append the cache keys used to this file (for prune).")
+    ap_asm.add_argument("files", nargs="+", help="Content files, in guide order.")
+    ap_asm.set_defaults(func=cmd_assemble)
+
+    ap_prune = sub.add_parser("prune", help="Delete cache entries not listed in --used.")
+    ap_prune.add_argument("--cache-dir", required=True, help="Fragment cache directory.")
+    ap_prune.add_argument("--used", required=True, help="File of cache keys to keep (one per line).")
+    ap_prune.set_defaults(func=cmd_prune)
+
+    args = ap.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
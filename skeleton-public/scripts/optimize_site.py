@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import io
+import os
+import posixpath
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz siblings are written
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without it images are left at full size
+    Image = None
+
+
+# Bump when the output of a cached step changes so old cache entries are ignored.
+OPTIMIZE_VERSION = "1"
+
+COMPRESSIBLE = {".html", ".css", ".js", ".json", ".svg", ".txt", ".xml", ".map", ".ico", ".ttf", ".eot"}
+# Static assets that get content-hashed names (HTML is the entry point and keeps its name).
+HASHABLE = {".css", ".js", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".woff", ".woff2", ".ttf", ".eot"}
+RESIZABLE = {".png", ".jpg", ".jpeg", ".webp"}
+# Loaded by name from mdBook's JS rather than via a tag we can rewrite.
+DYNAMIC = {"searchindex.js", "searchindex.json"}
+MIN_COMPRESS_SIZE = 512
+
+HTML_REF_RE = re.compile(r"""(?P<attr>\b(?:src|href))=(?P<q>["'])(?P<url>[^"']+)(?P=q)""")
+CSS_REF_RE = re.compile(r"""url\(\s*(?P<q>["']?)(?P<url>[^"')]+)(?P=q)\s*\)""")
+IMG_SRC_RE = re.compile(r"""<img\b[^>]*?\bsrc=(?P<q>["'])(?P<url>[^"']+)(?P=q)""", re.I)
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{10}$")
+
+
+def _cache_entry(cache_dir: Path, key: str, suffix: str) -> Path:
+    return cache_dir / key[:2] / f"{key}{suffix}"
+
+
+def _store(entry: Path, data: bytes) -> None:
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    tmp = entry.with_suffix(f"{entry.suffix}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    tmp.replace(entry)
+
+
+def _key(step: str, data: bytes) -> str:
+    h = hashlib.sha256()
+    h.update(f"{OPTIMIZE_VERSION}\0{step}\0".encode("utf-8"))
+    h.update(data)
+    return h.hexdigest()
+
+
+def _write_if_changed(path: Path, data: bytes) -> bool:
+    if path.exists() and path.read_bytes() == data:
+        return False
+    path.write_bytes(data)
+    return True
+
+
+def _resolve(page: str, url: str) -> tuple[str, str] | None:
+    # Site-relative path for a local reference, plus the query/fragment to keep.
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path or url.startswith(("#", "data:")):
+        return None
+    base = "" if parts.path.startswith("/") else posixpath.dirname(page)
+    rel = posixpath.normpath(posixpath.join(base, parts.path.lstrip("/")))
+    if rel.startswith("../"):
+        return None
+    tail = (f"?{parts.query}" if parts.query else "") + (f"#{parts.fragment}" if parts.fragment else "")
+    return rel, tail
+
+
+def _relative(page: str, target: str) -> str:
+    return posixpath.relpath(target, posixpath.dirname(page) or ".")
+
+
+# --- Per-file workers (run in a process pool) ----------------------------------------
+
+
+# Returns (cache entry name, whether the file was replaced). Images already within
+# the limit are cached as-is so they are not decoded again on the next build.
+def resize_image(args: tuple[str, str, int]) -> tuple[str, bool]:
+    path, cache_dir, max_width = Path(args[0]), Path(args[1]), args[2]
+    data = path.read_bytes()
+    entry = _cache_entry(cache_dir, _key(f"resize:{max_width}", data), path.suffix.lower())
+    if entry.exists():
+        out = entry.read_bytes()
+    else:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.width <= max_width:
+                _store(entry, data)
+                return entry.name, False
+            height = round(img.height * max_width / img.width)
+            resized = img.resize((max_width, height), Image.LANCZOS)
+            buf = io.BytesIO()
+            fmt = img.format or path.suffix.lstrip(".").upper()
+            options = {"quality": 85, "optimize": True} if fmt in {"JPEG", "WEBP"} else {"optimize": True}
+            resized.save(buf, format=fmt, **options)
+        out = buf.getvalue()
+        if len(out) >= len(data):
+            out = data
+        _store(entry, out)
+    if out == data:
+        return entry.name, False
+    path.write_bytes(out)
+    return entry.name, True
+
+
+# Returns (siblings rewritten, cache entry names used).
+def compress_file(args: tuple[str, str]) -> tuple[int, list[str]]:
+    path, cache_dir = Path(args[0]), Path(args[1])
+    data = path.read_bytes()
+    written = 0
+    used: list[str] = []
+    encoders = [(".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        encoders.append((".br", lambda d: brotli.compress(d, quality=11)))
+    for suffix, encode in encoders:
+        entry = _cache_entry(cache_dir, _key(f"compress{suffix}", data), suffix)
+        used.append(entry.name)
+        if entry.exists():
+            out = entry.read_bytes()
+        else:
+            out = encode(data)
+            _store(entry, out)
+        sibling = path.with_name(path.name + suffix)
+        if len(out) < len(data):
+            written += _write_if_changed(sibling, out)
+        else:
+            sibling.unlink(missing_ok=True)
+    return written, used
+
+
+# --- Site passes ---------------------------------------------------------------------
+
+
+def _files(site: Path) -> list[str]:
+    return sorted(
+        p.relative_to(site).as_posix()
+        for p in site.rglob("*")
+        if p.is_file() and p.suffix not in {".gz", ".br"} and not HASHED_NAME_RE.search(p.stem)
+    )
+
+
+def content_images(site: Path, pages: list[str]) -> list[str]:
+    found: set[str] = set()
+    for page in pages:
+        for m in IMG_SRC_RE.finditer((site / page).read_text(encoding="utf-8", errors="replace")):
+            resolved = _resolve(page, m.group("url"))
+            if resolved and Path(resolved[0]).suffix.lower() in RESIZABLE and (site / resolved[0]).is_file():
+                found.add(resolved[0])
+    return sorted(found)
+
+
+def _rewrite(text: str, page: str, pattern: re.Pattern[str], names: dict[str, str]) -> str:
+    def repl(m: re.Match[str]) -> str:
+        resolved = _resolve(page, m.group("url"))
+        if resolved is None or resolved[0] not in names:
+            return m.group(0)
+        new_url = _relative(page, names[resolved[0]]) + resolved[1]
+        return m.group(0).replace(m.group("url"), new_url, 1)
+
+    return pattern.sub(repl, text)
+
+
+# Writes `name.<hash>.ext` copies of static assets and points HTML/CSS at them. Files
+# other than CSS are hashed as-is; CSS is hashed after its own url() references are
+# rewritten, so a changed font or image also changes the stylesheet's name. Originals
+# stay in place for anything that loads them by name.
+def hash_assets(site: Path, files: list[str]) -> dict[str, str]:
+    names: dict[str, str] = {}
+
+    def hashed(rel: str, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()[:10]
+        stem, ext = posixpath.splitext(rel)
+        target = f"{stem}.{digest}{ext}"
+        _write_if_changed(site / target, data)
+        return target
+
+    assets = [
+        r for r in files if posixpath.splitext(r)[1].lower() in HASHABLE and posixpath.basename(r) not in DYNAMIC
+    ]
+    for rel in assets:
+        if not rel.endswith(".css"):
+            names[rel] = hashed(rel, (site / rel).read_bytes())
+    for rel in assets:
+        if rel.endswith(".css"):
+            text = (site / rel).read_text(encoding="utf-8", errors="surrogateescape")
+            text = _rewrite(text, rel, CSS_REF_RE, names)
+            names[rel] = hashed(rel, text.encode("utf-8", errors="surrogateescape"))
+
+    for page in (r for r in files if r.endswith(".html")):
+        text = (site / page).read_text(encoding="utf-8")
+        new = _rewrite(text, page, HTML_REF_RE, names)
+        if new != text:
+            (site / page).write_text(new, encoding="utf-8")
+    return names
+
+
+def prune_cache(cache_dir: Path, keep: set[str]) -> int:
+    removed = 0
+    for entry in cache_dir.glob("*/*"):
+        if entry.name not in keep:
+            entry.unlink()
+            removed += 1
+    return removed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Post-process a built mdBook site: downscale content images, hash asset names, precompress."
+    )
+    parser.add_argument("site", help="Built site directory (mdbook build output).")
+    parser.add_argument("--cache-dir", default=".cache/site-optimize", help="Cache for resized/compressed outputs.")
+    parser.add_argument("--max-image-width", type=int, default=1600, help="Downscale wider images (0 disables).")
+    parser.add_argument("--no-hash", action="store_true", help="Keep asset names as they are.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count).")
+    args = parser.parse_args()
+
+    site = Path(args.site).resolve()
+    if not site.is_dir():
+        raise SystemExit(f"Site directory not found: {site.as_posix()}")
+    cache_dir = Path(args.cache_dir).resolve()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    jobs = max(1, args.jobs)
+
+    files = _files(site)
+    pages = [r for r in files if r.endswith(".html")]
+
+    used: set[str] = set()
+    resized = written = 0
+    # Cached outputs are keyed by input content, so a rebuild only re-encodes files
+    # whose bytes changed; mdBook rewrites site/ from scratch either way.
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        if args.max_image_width > 0:
+            images = content_images(site, pages)
+            if images and Image is None:
+                print("Pillow is not installed; leaving images at full size (pip install Pillow).")
+            elif images:
+                work = [((site / r).as_posix(), cache_dir.as_posix(), args.max_image_width) for r in images]
+                for name, changed in pool.map(resize_image, work):
+                    used.add(name)
+                    resized += changed
+
+        names = {} if args.no_hash else hash_assets(site, files)
+
+        compressible = [
+            p
+            for p in sorted(site.rglob("*"))
+            if p.is_file() and p.suffix.lower() in COMPRESSIBLE and p.stat().st_size >= MIN_COMPRESS_SIZE
+        ]
+        work = [(p.as_posix(), cache_dir.as_posix()) for p in compressible]
+        for count, names_used in pool.map(compress_file, work, chunksize=16):
+            written += count
+            used.update(names_used)
+
+    pruned = prune_cache(cache_dir, used)
+
+    encodings = "gzip+brotli" if brotli is not None else "gzip (pip install brotli for .br)"
+    print(
+        f"Optimized {site.as_posix()}: {resized} image(s) downscaled, {len(names)} asset(s) hashed, "
+        f"{len(compressible)} file(s) precompressed [{encodings}], {written} sibling(s) rewritten"
+        + (f", pruned {pruned} cache entr{'y' if pruned == 1 else 'ies'}" if pruned else "")
+        + "."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
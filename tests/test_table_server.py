@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "skeleton-gm" / "scripts"))
+
+from table_server import Client, apply_patch, compose  # noqa: E402
+
+
+class ComposeTest(unittest.TestCase):
+    def test_nested_patches_compose(self) -> None:
+        state = {"map": {"revealed": {"1,1": True}}, "clocks": {"doom": {"value": 1}}}
+        first = {"map": {"revealed": {"2,2": True}}, "clocks": {"doom": {"value": 2}}}
+        second = {"map": {"revealed": {"1,1": None}}, "clocks": {"doom": {"label": "Doom"}}}
+        composed = compose(first, second)
+        self.assertEqual(apply_patch(state, composed), apply_patch(apply_patch(state, first), second))
+
+    def test_delete_then_recreate_does_not_compose(self) -> None:
+        self.assertIsNone(compose({"clocks": {"doom": None}}, {"clocks": {"doom": {"value": 0}}}))
+        self.assertIsNone(compose({"scene": "x"}, {"scene": {"item": "items/a.md"}}))
+
+    def test_delete_then_recreate_sends_snapshot(self) -> None:
+        state = {"clocks": {"doom": {"value": 3, "label": "Doom", "visible": True}}}
+        first = {"clocks": {"doom": None}}
+        after_first = apply_patch(state, first)
+        second = {"clocks": {"doom": {"value": 0}}}
+        after_second = apply_patch(after_first, second)
+
+        client = Client(role="dm", writer=None)  # type: ignore[arg-type]
+        client.queue_patch(1, first, after_first)
+        client.queue_patch(2, second, after_second)
+
+        self.assertIsNone(client.pending)
+        self.assertEqual(client.snapshot, {"clocks": {"doom": {"value": 0}}})
+        self.assertEqual(client.rev, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()